@@ -0,0 +1,48 @@
+"""Binary transport of numpy arrays as alternative to JSON lists.
+Clients that prefer application/octet-stream over application/json in their Accept
+header receive arrays as little-endian float32 bytes that can be viewed as typed arrays
+directly. The X-Array-Layout header describes the arrays in the body as JSON object
+mapping array names to their shape, dtype and byte offset, or to null for missing arrays.
+nan values are kept, +/- inf is converted to nan like in the JSON responses."""
+import json
+import numpy as np
+from flask import request, make_response
+
+BINARY_MIMETYPE = "application/octet-stream"
+LAYOUT_HEADER = "X-Array-Layout"
+
+
+def wants_binary_arrays():
+    """Returns whether the current request prefers binary arrays over JSON."""
+    return (
+        request.accept_mimetypes[BINARY_MIMETYPE]
+        > request.accept_mimetypes["application/json"]
+    )
+
+
+def make_array_response(arrays):
+    """Returns response with arrays, a dictionary mapping names to numpy arrays
+    or None, concatenated as float32 bytes in the body."""
+    layout = {}
+    buffers = []
+    offset = 0
+    for name, array in arrays.items():
+        if array is None:
+            layout[name] = None
+            continue
+        data = np.asarray(array, dtype=np.float32)
+        data = np.where(np.isinf(data), np.nan, data).astype("<f4", copy=False)
+        layout[name] = {
+            "shape": list(data.shape),
+            "dtype": "float32",
+            "offset": offset,
+        }
+        buffers.append(data.tobytes())
+        offset += data.nbytes
+    content = b"".join(buffers)
+    response = make_response(content)
+    response.headers["Content-Type"] = BINARY_MIMETYPE
+    response.headers["Content-length"] = len(content)
+    response.headers[LAYOUT_HEADER] = json.dumps(layout)
+    response.headers["Vary"] = "Accept"
+    return response
@@ -0,0 +1,125 @@
+"""Serving of processed artifacts with conditional caching.
+Processed artifacts (e.g. pileups or stackups) are not changed in place, pipeline steps
+write new files instead. A version of the artifacts behind a response is therefore derived
+from their paths, modification times and sizes, and sent as ETag and Last-Modified header.
+Clients revalidate their cached responses with these and get 304 Not Modified without
+the artifacts being read if they did not change. Precompressed payloads of artifacts
+(see response_payloads) are sent as they are to clients that accept gzip and decompressed
+otherwise. If ACCEL_REDIRECT_LOCATION is set, routes only authorize requests for payloads
+of clients that accept gzip and nginx sends the payload files from its internal location
+that maps onto UPLOAD_DIR."""
+import os
+import gzip
+import hashlib
+import datetime
+from flask import request, make_response, current_app
+from .array_transport import wants_binary_arrays
+from .. import response_payloads
+
+
+class ArtifactVersion:
+    """Version of the artifacts at file_paths in the representation requested
+    by the current request."""
+
+    def __init__(self, *file_paths):
+        file_paths = [file_path for file_path in file_paths if file_path is not None]
+        stats = [os.stat(file_path) for file_path in file_paths]
+        # binary, json and gzipped json responses are different representations
+        if wants_binary_arrays():
+            representation = "binary"
+        else:
+            representation = "json+gzip" if accepts_gzip() else "json"
+        key = "|".join(
+            [representation]
+            + [
+                f"{file_path}:{stat.st_mtime_ns}:{stat.st_size}"
+                for file_path, stat in zip(file_paths, stats)
+            ]
+        )
+        self.etag = hashlib.sha1(key.encode()).hexdigest()
+        # http dates have second precision -> truncate to compare with If-Modified-Since
+        self.last_modified = datetime.datetime.fromtimestamp(
+            max(stat.st_mtime for stat in stats), tz=datetime.timezone.utc
+        ).replace(microsecond=0)
+
+    def is_cached_by_client(self):
+        """Returns whether the current request is conditional on this version.
+        If-Modified-Since is only considered without If-None-Match."""
+        if request.if_none_match:
+            return request.if_none_match.contains(self.etag)
+        if request.if_modified_since is not None:
+            return self.last_modified <= _as_utc(request.if_modified_since)
+        return False
+
+    def add_headers(self, response):
+        """Adds validators of this version to response so that clients cache it
+        and revalidate it on every use. Returns the response."""
+        response.set_etag(self.etag)
+        response.last_modified = self.last_modified
+        response.headers["Cache-Control"] = "private, no-cache"
+        response.vary.add("Accept")
+        response.vary.add("Accept-Encoding")
+        return response
+
+    def make_not_modified_response(self):
+        """Returns empty 304 response for clients that cached this version."""
+        return self.add_headers(make_response("", 304))
+
+
+def _as_utc(date):
+    """Returns date as timezone-aware datetime, naive dates (as parsed by werkzeug < 2) are utc."""
+    if date.tzinfo is None:
+        return date.replace(tzinfo=datetime.timezone.utc)
+    return date
+
+
+def accepts_gzip():
+    """Returns whether the client of the current request accepts gzipped content."""
+    return request.accept_encodings["gzip"] > 0
+
+
+def make_compressed_response(content):
+    """Returns json response with the gzipped json content. content is decompressed
+    if the client does not accept gzipped content."""
+    compressed = accepts_gzip()
+    if not compressed:
+        content = gzip.decompress(content)
+    response = make_response(content)
+    response.headers["Content-Type"] = "application/json"
+    response.headers["Content-length"] = len(content)
+    if compressed:
+        response.headers["Content-Encoding"] = "gzip"
+    return response
+
+
+def make_accel_redirect_response(file_path):
+    """Returns empty json response that instructs nginx to send the gzipped json content
+    of the file at file_path. nginx sets Content-Encoding for its internal location and
+    passes on the ETag, Cache-Control and Vary headers of this response instead of
+    validators of the file. Returns None if file_path is not within UPLOAD_DIR."""
+    upload_dir = os.path.abspath(current_app.config["UPLOAD_DIR"])
+    relative_path = os.path.relpath(os.path.abspath(file_path), upload_dir)
+    if relative_path.startswith(os.pardir):
+        return None
+    location = current_app.config["ACCEL_REDIRECT_LOCATION"].rstrip("/")
+    response = make_response("")
+    response.headers["Content-Type"] = "application/json"
+    response.headers["X-Accel-Redirect"] = f"{location}/{relative_path}"
+    return response
+
+
+def make_payload_response(file_path, part=None):
+    """Returns response with the precompressed payload of the artifact at file_path
+    or None if it does not exist. The payload is sent by nginx if ACCEL_REDIRECT_LOCATION
+    is set and the client accepts gzipped content."""
+    if current_app.config["ACCEL_REDIRECT_LOCATION"] and accepts_gzip():
+        payload_path = response_payloads.get_payload_path(file_path, part)
+        if not os.path.exists(payload_path):
+            return None
+        response = make_accel_redirect_response(payload_path)
+        if response is not None:
+            return response
+    payload = response_payloads.read_payload(file_path, part)
+    if payload is None:
+        return None
+    return make_compressed_response(payload)
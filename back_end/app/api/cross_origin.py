@@ -9,4 +9,5 @@ def after_request(response):
     response.headers.add("Access-Control-Allow-Origin", "*")  # TODO finer control
     response.headers.add("Access-Control-Allow-Headers", "Content-Type,Authorization")
     response.headers.add("Access-Control-Allow-Methods", "GET,PUT,POST,DELETE,OPTIONS")
+    response.headers.add("Access-Control-Expose-Headers", "X-Array-Layout")
     return response
@@ -4,6 +4,7 @@ from flask import g, current_app
 from .. import lib as hicognition
 from . import api
 from .. import db
+from .. import enrichment_cache
 from ..models import Assembly, Collection, Dataset, Session
 from .authentication import auth, check_confirmed
 from .errors import forbidden, invalid, not_found
@@ -111,6 +112,7 @@ def delete_assembly_handler(assembly_id):
     # delete assembly
     hicognition.io_helpers.remove_safely(assembly.chrom_sizes, current_app.logger)
     hicognition.io_helpers.remove_safely(assembly.chrom_arms, current_app.logger)
+    enrichment_cache.remove_cached_universes(assembly.id)
     db.session.delete(assembly)
     db.session.commit()
     response = jsonify({"message": "success"})
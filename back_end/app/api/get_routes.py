@@ -1,11 +1,10 @@
 """GET API endpoints for hicognition"""
 import json
-import gzip
 import logging
 import pandas as pd
 from requests import HTTPError, RequestException
 import numpy as np
-from flask import g, make_response
+from flask import g
 from flask.json import jsonify
 from flask.globals import current_app
 from ..lib import data_structures
@@ -15,6 +14,7 @@ from ..lib.utils import (
 )
 from . import api
 from .. import db
+from .. import response_payloads
 from ..models import (
     BedFileMetadata,
     Repository,
@@ -30,6 +30,12 @@ from ..models import (
     Organism,
 )
 from .authentication import auth, check_confirmed
+from .array_transport import wants_binary_arrays, make_array_response
+from .artifacts import (
+    ArtifactVersion,
+    make_compressed_response,
+    make_payload_response,
+)
 from .errors import forbidden, not_found, invalid
 from ..download_utils import (
     DownloadUtilsException,
@@ -429,15 +435,21 @@ def get_pileup_data(entry_id):
         return forbidden(
             "Cooler dataset or bed dataset is not owned by logged in user!"
         )
-    # Dataset is owned, return the data
-    np_data = np.load(pileup.file_path)
+    # Dataset is owned, return the data if it is not cached by the client
+    version = ArtifactVersion(pileup.file_path)
+    if version.is_cached_by_client():
+        return version.make_not_modified_response()
+    if not wants_binary_arrays():
+        response = make_payload_response(pileup.file_path)
+        if response is not None:
+            return version.add_headers(response)
+    np_data = np.load(pileup.file_path, mmap_mode="r")
+    if wants_binary_arrays():
+        return version.add_headers(make_array_response({"data": np_data}))
     # Convert np.nan and np.isinf to None -> this is handeled by jsonify correctly
-    flat_data = [
-        entry if not (np.isnan(entry) or np.isinf(entry)) else None
-        for entry in np_data.flatten()
-    ]
+    flat_data = flatten_and_clean_array(np_data)
     json_data = {"data": flat_data, "shape": np_data.shape, "dtype": "float32"}
-    return jsonify(json_data)
+    return version.add_headers(jsonify(json_data))
 
 
 @api.route("/associationIntervalData/<entry_id>/", methods=["GET"])
@@ -455,15 +467,21 @@ def get_association_data(entry_id):
     bed_ds = association_data.source_intervals.source_dataset
     if collection.is_access_denied(g) or bed_ds.is_access_denied(g):
         return forbidden("Collection or bed dataset is not owned by logged in user!")
-    # Dataset is owned, return the data
-    np_data = np.load(association_data.file_path)
+    # Dataset is owned, return the data if it is not cached by the client
+    version = ArtifactVersion(association_data.file_path)
+    if version.is_cached_by_client():
+        return version.make_not_modified_response()
+    if not wants_binary_arrays():
+        response = make_payload_response(association_data.file_path)
+        if response is not None:
+            return version.add_headers(response)
+    np_data = np.load(association_data.file_path, mmap_mode="r")
+    if wants_binary_arrays():
+        return version.add_headers(make_array_response({"data": np_data}))
     # Convert np.nan and np.isinf to None -> this is handeled by jsonify correctly
-    flat_data = [
-        entry if not (np.isnan(entry) or np.isinf(entry)) else None
-        for entry in np_data.flatten()
-    ]
+    flat_data = flatten_and_clean_array(np_data)
     json_data = {"data": flat_data, "shape": np_data.shape, "dtype": "float32"}
-    return jsonify(json_data)
+    return version.add_headers(jsonify(json_data))
 
 
 @api.route("/embeddingIntervalData/<entry_id>/", methods=["GET"])
@@ -485,27 +503,6 @@ def get_embedding_data(entry_id):
             return forbidden(
                 "Feature dataset or region dataset is not owned by logged in user!"
             )
-        embedding = np.load(embedding_data.file_path).astype(float)
-        cluster_ids = np.load(embedding_data.cluster_id_path).astype(float)
-        thumbnails = np.load(embedding_data.thumbnail_path).astype(float)
-        # Convert np.nan and np.isinf to None -> this is handeled by jsonify correctly
-        json_data = {
-            "embedding": {
-                "data": flatten_and_clean_array(embedding),
-                "shape": embedding.shape,
-                "dtype": "float32",
-            },
-            "cluster_ids": {
-                "data": flatten_and_clean_array(cluster_ids),
-                "shape": cluster_ids.shape,
-                "dtype": "float32",
-            },
-            "thumbnails": {
-                "data": flatten_and_clean_array(thumbnails),
-                "shape": thumbnails.shape,
-                "dtype": "float32",
-            },
-        }
     else:
         # Check whether collections are owned
         collection = embedding_data.source_collection
@@ -514,51 +511,38 @@ def get_embedding_data(entry_id):
             return forbidden(
                 "Collection dataset or region dataset is not owned by logged in user!"
             )
-        embedding = np.load(embedding_data.file_path).astype(float)
-        if embedding_data.cluster_id_path is not None:
-            cluster_ids = np.load(embedding_data.cluster_id_path).astype(float)
-            average_data = np.load(embedding_data.thumbnail_path).astype(float)
-            json_data = {
-                "embedding": {
-                    "data": flatten_and_clean_array(embedding),
-                    "shape": embedding.shape,
-                    "dtype": "float32",
-                },
-                "cluster_ids": {
-                    "data": flatten_and_clean_array(cluster_ids),
-                    "shape": cluster_ids.shape,
-                    "dtype": "float32",
-                },
-                "thumbnails": {
-                    "data": flatten_and_clean_array(average_data),
-                    "shape": average_data.shape,
-                    "dtype": "float32",
-                },
-            }
-        else:
-            json_data = {
-                "embedding": {
-                    "data": flatten_and_clean_array(embedding),
-                    "shape": embedding.shape,
-                    "dtype": "float32",
-                },
-                "cluster_ids": {
-                    "data": None,
-                    "shape": None,
-                    "dtype": None,
-                },
-                "thumbnails": {
-                    "data": None,
-                    "shape": None,
-                    "dtype": None,
-                },
-            }
-    # compress
-    content = gzip.compress(json.dumps(json_data).encode("utf8"), 4)
-    response = make_response(content)
-    response.headers["Content-length"] = len(content)
-    response.headers["Content-Encoding"] = "gzip"
-    return response
+    version = ArtifactVersion(
+        embedding_data.file_path,
+        embedding_data.cluster_id_path,
+        embedding_data.thumbnail_path,
+    )
+    if version.is_cached_by_client():
+        return version.make_not_modified_response()
+    # payloads of embeddings are stored with the cluster ids of their cluster number
+    if not wants_binary_arrays() and embedding_data.cluster_id_path is not None:
+        response = make_payload_response(embedding_data.cluster_id_path)
+        if response is not None:
+            return version.add_headers(response)
+    embedding = np.load(embedding_data.file_path).astype(float)
+    cluster_ids = None
+    thumbnails = None
+    if embedding_data.cluster_id_path is not None:
+        cluster_ids = np.load(embedding_data.cluster_id_path).astype(float)
+        thumbnails = np.load(embedding_data.thumbnail_path).astype(float)
+    if wants_binary_arrays():
+        return version.add_headers(
+            make_array_response(
+                {
+                    "embedding": embedding,
+                    "cluster_ids": cluster_ids,
+                    "thumbnails": thumbnails,
+                }
+            )
+        )
+    payload = response_payloads.compress_payload(
+        response_payloads.get_embedding_payload(embedding, cluster_ids, thumbnails)
+    )
+    return version.add_headers(make_compressed_response(payload))
 
 
 @api.route("/embeddingIntervalData/<entry_id>/<feature_index>/", methods=["GET"])
@@ -575,20 +559,24 @@ def get_embedding_feature(entry_id, feature_index):
     bed_ds = embedding_data.source_intervals.source_dataset
     if collection.is_access_denied(g) or bed_ds.is_access_denied(g):
         return forbidden("Collection or bed dataset is not owned by logged in user!")
-    # return the feature data
+    # return the feature data if it is not cached by the client
+    version = ArtifactVersion(embedding_data.file_path_feature_values)
+    if version.is_cached_by_client():
+        return version.make_not_modified_response()
+    if not wants_binary_arrays():
+        response = make_payload_response(
+            embedding_data.file_path_feature_values, part=int(feature_index)
+        )
+        if response is not None:
+            return version.add_headers(response)
     feature_data = np.load(embedding_data.file_path_feature_values, mmap_mode="r")
     selected_row = np.array(feature_data[:, int(feature_index)]).astype(np.float64)
-    flat_data = [
-        entry if not (np.isnan(entry) or np.isinf(entry)) else None
-        for entry in selected_row.flatten()
-    ]
-    json_data = {"data": flat_data, "shape": selected_row.shape, "dtype": "float32"}
-    # compress
-    content = gzip.compress(json.dumps(json_data).encode("utf8"), 4)
-    response = make_response(content)
-    response.headers["Content-length"] = len(content)
-    response.headers["Content-Encoding"] = "gzip"
-    return response
+    if wants_binary_arrays():
+        return version.add_headers(make_array_response({"data": selected_row}))
+    payload = response_payloads.compress_payload(
+        response_payloads.get_array_payload(selected_row)
+    )
+    return version.add_headers(make_compressed_response(payload))
 
 
 @api.route("/individualIntervalData/<entry_id>/", methods=["GET"])
@@ -607,15 +595,21 @@ def get_stackup_data(entry_id):
         return forbidden(
             "Bigwig dataset or bed dataset is not owned by logged in user!"
         )
-    # dataset is owned, return the smalldata
-    np_data = np.load(stackup.file_path_small)
+    # dataset is owned, return the smalldata if it is not cached by the client
+    version = ArtifactVersion(stackup.file_path_small)
+    if version.is_cached_by_client():
+        return version.make_not_modified_response()
+    if not wants_binary_arrays():
+        response = make_payload_response(stackup.file_path_small)
+        if response is not None:
+            return version.add_headers(response)
+    np_data = np.load(stackup.file_path_small, mmap_mode="r")
+    if wants_binary_arrays():
+        return version.add_headers(make_array_response({"data": np_data}))
     # Convert np.nan and np.isinf to None -> this is handeled by jsonify correctly
-    flat_data = [
-        entry if not (np.isnan(entry) or np.isinf(entry)) else None
-        for entry in np_data.flatten()
-    ]
+    flat_data = flatten_and_clean_array(np_data)
     json_data = {"data": flat_data, "shape": np_data.shape, "dtype": "float32"}
-    return jsonify(json_data)
+    return version.add_headers(jsonify(json_data))
 
 
 @api.route("/individualIntervalData/<entry_id>/metadatasmall", methods=["GET"])
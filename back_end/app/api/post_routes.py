@@ -7,7 +7,7 @@ from werkzeug.utils import secure_filename
 from flask import g, request, current_app
 from flask.json import jsonify
 
-from ..lib.utils import get_all_interval_ids
+from ..lib.utils import get_all_interval_ids, get_pipeline_calls, get_stackup_calls
 from ..lib.format_checkers import FORMAT_CHECKERS
 from . import api
 from .. import db
@@ -216,32 +216,44 @@ def preprocess_dataset():
             )
     # get interval ids of selected regions
     interval_ids = get_all_interval_ids(region_datasets)
+    intervals = [
+        (entry.id, entry.dataset_id, entry.windowsize)
+        for entry in (Intervals.query.get(interval_id) for interval_id in interval_ids)
+    ]
     # dispatch appropriate pipelines
-    for interval_id in interval_ids:
-        windowsize = Intervals.query.get(interval_id).windowsize
-        if windowsize is None:
-            windowsize = "variable"
-        # check whether windowsize is in preprocessing map
-        if windowsize not in preprocessing_map:
-            continue
-        for binsize in preprocessing_map[windowsize][dataset.filetype]:
-            for dataset in feature_datasets:
-                current_user.launch_task(
-                    current_app.queues[
-                        current_app.config["PIPELINE_QUEUES"][dataset.filetype]
-                    ],
-                    *current_app.config["PIPELINE_NAMES"][dataset.filetype],
-                    dataset_id=dataset.id,
-                    intervals_id=interval_id,
-                    binsize=binsize,
-                )
-                if (
+    for dataset in feature_datasets:
+        if dataset.filetype == "bigwig":
+            # stackups at coarser binsizes and smaller windowsizes are derived
+            pipeline_calls = get_stackup_calls(intervals, preprocessing_map)
+            derived_argument = "derived_stackups"
+        else:
+            # pileups of smaller windowsizes are cropped from the largest windowsize
+            pipeline_calls = get_pipeline_calls(
+                intervals,
+                preprocessing_map,
+                dataset.filetype,
+                nest_windows=dataset.filetype == "cooler",
+            )
+            derived_argument = "nested_intervals_ids"
+        for interval_id, binsize, derived in pipeline_calls:
+            pipeline_kwargs = {derived_argument: derived} if derived else {}
+            current_user.launch_task(
+                current_app.queues[
+                    current_app.config["PIPELINE_QUEUES"][dataset.filetype]
+                ],
+                *current_app.config["PIPELINE_NAMES"][dataset.filetype],
+                dataset_id=dataset.id,
+                intervals_id=interval_id,
+                binsize=binsize,
+                **pipeline_kwargs,
+            )
+            if (
+                Intervals.query.get(interval_id).source_dataset
+                not in dataset.processing_regions
+            ):
+                dataset.processing_regions.append(
                     Intervals.query.get(interval_id).source_dataset
-                    not in dataset.processing_regions
-                ):
-                    dataset.processing_regions.append(
-                        Intervals.query.get(interval_id).source_dataset
-                    )
+                )
     db.session.commit()
     return jsonify({"message": "success! Preprocessing triggered."})
 
@@ -27,6 +27,8 @@ class Config:
     # mail accounts
     MAIL_DEFAULT_SENDER = os.environ.get("MAIL_DEFAULT_SENDER")
     UPLOAD_DIR = os.environ.get("UPLOAD_DIR") or os.path.join(basedir, "temp")
+    # internal nginx location that maps onto UPLOAD_DIR, payloads are sent by flask if unset
+    ACCEL_REDIRECT_LOCATION = os.environ.get("ACCEL_REDIRECT_LOCATION")
     CHROM_SIZES = os.environ.get("CHROM_SIZES") or os.path.join(
         basedir, "data/hg19.chrom.sizes"
     )
@@ -301,10 +303,37 @@ class Config:
         },
     }
     STACKUP_THRESHOLD = 500  # Threshold of when stackup is downsampled
+    STACKUP_CHUNK_SIZE = (
+        10000  # Number of regions whose stackup is held in memory at once
+    )
     OBS_EXP_PROCESSES = (
         10  # Number of processes/worker to calculate obs/exp matrix of pileups
     )
     PILEUP_PROCESSES = 5  # Number of processes/worker to do pileups
+    STACKUP_PROCESSES = (
+        5  # Number of processes/worker to do stackups of bigwigs of a collection
+    )
+    ENRICHMENT_PROCESSES = (
+        4  # Number of processes/worker to do enrichment analyses of chunks
+    )
+    FEATURE_EXTRACTION_THREADS = (
+        4  # Number of threads to extract image features of pileups for 2d-embeddings
+    )
+    PILEUP_CHUNK_PIXELS = (
+        2**24  # Number of pileup window pixels that are held in memory at once
+    )
+    EXPECTED_LOCK_TIMEOUT = (
+        2 * 60 * 60  # Seconds workers wait for/hold the lock on an expected calculation
+    )
+    EMBEDDING_TRANSFORM_FRACTION = (
+        0.1  # Maximum fraction of new regions for which cached models are reused
+    )
+    EMBEDDING_CACHE_SIZE = (
+        100  # Number of fitted embedding models that are kept in the embedding cache
+    )
+    ENRICHMENT_CACHE_LOCK_TIMEOUT = (
+        60 * 60  # Seconds workers wait for/hold the lock on enrichment targets
+    )
 
 
 class DevelopmentConfig(Config):
@@ -323,6 +352,7 @@ class TestingConfig(Config):
     DEBUG = True
     SQLALCHEMY_DATABASE_URI = "sqlite://"
     UPLOAD_DIR = "./tmp_test"
+    ACCEL_REDIRECT_LOCATION = None  # payloads are sent by flask in tests
     STACKUP_THRESHOLD = 10  # Threshold of when stackup is downsampled
 
 
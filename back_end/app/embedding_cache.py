@@ -0,0 +1,178 @@
+"""Cache for fitted embedding models.
+Embeddings are calculated by scaling a feature matrix, fitting umap on it and clustering
+the embedding. The fitted models of a scope (e.g. the 1d-embedding of a collection on intervals
+and binsize) are stored together with a hash of each row of the unscaled feature matrix they
+were fitted on. Reruns with identical features reuse the stored embedding and clusters without
+fitting, feature matrices with few new rows are scaled with the stored scaler and their new rows
+are transformed with the stored reducer. Models are stored as pickle files in the embedding
+cache directory, in one directory per kind, owner and intervals of their scopes."""
+import os
+import glob
+import shutil
+import pickle
+import logging
+import numpy as np
+import pandas as pd
+from flask.globals import current_app
+
+# get logger
+log = logging.getLogger("rq.worker")
+
+
+class EmbeddingModels:
+    """Fitted scaler, umap reducer and clustering hierarchy together with the cluster numbers
+    of each cluster size and the row hashes of the unscaled feature matrix they were fitted on.
+    The scaler is None if features are embedded without scaling. The embedding of the feature
+    matrix is not stored separately since the reducer keeps it."""
+
+    def __init__(
+        self, scaler, reducer, hierarchy, cluster_numbers, row_hashes, parameters
+    ):
+        self.scaler = scaler
+        self.reducer = reducer
+        self.hierarchy = hierarchy
+        self.cluster_numbers = cluster_numbers
+        self.row_hashes = row_hashes
+        self.parameters = parameters
+
+    @property
+    def embedding(self):
+        """Embedding of the feature matrix the models were fitted on."""
+        return self.reducer.embedding_
+
+    def scale(self, features):
+        """Returns features scaled with the fitted scaler."""
+        if self.scaler is None:
+            return features
+        return self.scaler.transform(features)
+
+    def get_new_rows(self, row_hashes):
+        """Returns boolean array that is True for rows that the models were not fitted on."""
+        return ~np.isin(row_hashes, self.row_hashes)
+
+    def embed(self, features, row_hashes):
+        """Returns embedding of the scaled features with row_hashes. Rows the models were
+        fitted on are taken from the stored embedding, new rows are transformed with the
+        fitted reducer."""
+        new_rows = self.get_new_rows(row_hashes)
+        if not new_rows.any() and np.array_equal(row_hashes, self.row_hashes):
+            return self.embedding
+        embedding = np.empty((len(features), self.embedding.shape[1]))
+        known_positions = pd.Series(
+            np.arange(len(self.row_hashes)), index=self.row_hashes
+        )
+        known_positions = known_positions[~known_positions.index.duplicated()]
+        embedding[~new_rows] = self.embedding[
+            known_positions.loc[row_hashes[~new_rows]].values
+        ]
+        if new_rows.any():
+            embedding[new_rows] = self.reducer.transform(features[new_rows])
+        return embedding
+
+    def cluster(self, embedding):
+        """Returns dictionary mapping cluster sizes to the cluster ids of embedding."""
+        return {
+            size: self.hierarchy.predict(embedding, cluster_number)
+            for size, cluster_number in self.cluster_numbers.items()
+        }
+
+
+def hash_rows(features):
+    """Returns uint64 array with a hash of each row of the features matrix. Rows need to be
+    hashed before scaling, which depends on all rows."""
+    return pd.util.hash_pandas_object(
+        pd.DataFrame(np.asarray(features)), index=False
+    ).values
+
+
+def load_models(scope, parameters, row_hashes):
+    """Returns EmbeddingModels cached for scope if they were fitted with parameters and
+    can be reused for a feature matrix with row_hashes, otherwise None. Models are reused
+    if the fraction of new rows does not exceed EMBEDDING_TRANSFORM_FRACTION."""
+    file_path = _get_model_path(scope)
+    if not os.path.exists(file_path):
+        return None
+    with open(file_path, "rb") as file_object:
+        models = pickle.load(file_object)
+    if models.parameters != parameters:
+        return None
+    new_row_number = models.get_new_rows(row_hashes).sum()
+    max_new_row_number = current_app.config["EMBEDDING_TRANSFORM_FRACTION"] * len(
+        row_hashes
+    )
+    if new_row_number > max_new_row_number:
+        return None
+    # mark models as recently used so that they are pruned last
+    os.utime(file_path)
+    return models
+
+
+def save_models(scope, models):
+    """Stores models for scope, replacing models that were stored before. Only the
+    EMBEDDING_CACHE_SIZE most recently used models are kept."""
+    file_path = _get_model_path(scope)
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    # write to temporary file first so that readers never see partial files
+    temp_path = f"{file_path}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as file_object:
+        pickle.dump(models, file_object)
+    os.replace(temp_path, file_path)
+    _prune_cache(current_app.config["EMBEDDING_CACHE_SIZE"])
+
+
+def get_scope(kind, owner_id, intervals_id, binsize, *args):
+    """Returns scope of models of kind (embedding1d or embedding2d) with owner_id (the
+    collection or the cooler dataset), intervals_id, binsize and additional args. Scopes
+    are relative paths with a directory for kind, owner_id and intervals_id each."""
+    return os.path.join(
+        *[_get_path_part(part) for part in [kind, owner_id, intervals_id]],
+        "_".join(_get_path_part(part).replace("_", "-") for part in [binsize, *args]),
+    )
+
+
+def remove_cached_models(kind=None, owner_id=None, intervals_id=None):
+    """Removes cached models of kind and owner_id or of intervals_id."""
+    cache_dir = _get_cache_dir()
+    if kind is not None:
+        shutil.rmtree(
+            os.path.join(cache_dir, _get_path_part(kind), _get_path_part(owner_id)),
+            ignore_errors=True,
+        )
+    if intervals_id is not None:
+        for directory in glob.glob(
+            os.path.join(glob.escape(cache_dir), "*", "*", _get_path_part(intervals_id))
+        ):
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+def _prune_cache(size):
+    """Removes all but the size most recently used models."""
+    file_paths = glob.glob(
+        os.path.join(glob.escape(_get_cache_dir()), "**", "*.pickle"), recursive=True
+    )
+    modification_times = {}
+    for file_path in file_paths:
+        try:
+            modification_times[file_path] = os.path.getmtime(file_path)
+        except FileNotFoundError:
+            # removed by another worker
+            continue
+    for file_path in sorted(
+        modification_times, key=modification_times.get, reverse=True
+    )[size:]:
+        try:
+            os.remove(file_path)
+        except FileNotFoundError:
+            continue
+
+
+def _get_path_part(part):
+    return str(part).replace(os.sep, "-")
+
+
+def _get_model_path(scope):
+    return os.path.join(_get_cache_dir(), f"{scope}.pickle")
+
+
+def _get_cache_dir():
+    return os.path.join(current_app.config["UPLOAD_DIR"], "embedding_cache")
@@ -0,0 +1,209 @@
+"""Cluster-wide cache for the inputs of enrichment analyses.
+The cleaned target sets of a collection and the universes of an assembly are prepared
+once and stored as parquet files in the enrichment cache directory. Targets as bitsets
+over the universe of a binsize are stored as npy files. File names of target
+sets contain a hash of the collection membership so that they are not reused if the
+datasets of a collection change. Target sets of previous memberships are removed once the
+target sets of the current membership are cached. Preparation is guarded by a redis lock so that workers
+that need the same target sets or universe wait for the result instead of preparing it again."""
+import os
+import glob
+import hashlib
+import logging
+import numpy as np
+import pandas as pd
+import bioframe as bf
+from flask.globals import current_app
+from redis.exceptions import LockError
+from .lib import enrichment_operations
+
+# get logger
+log = logging.getLogger("rq.worker")
+
+
+def get_targets(collection, assembly_id, chromsizes_regions):
+    """Returns list of target dataframes (chrom, start and end) of the datasets of collection.
+    Targets are restricted to regions in chromsizes_regions and deduplicated."""
+    file_path = _get_targets_path(collection, assembly_id)
+    targets = _get_cached(
+        file_path,
+        lambda: _prepare_targets(collection, chromsizes_regions),
+        cleanup=lambda: _remove_stale_targets(collection, assembly_id),
+    )
+    # targets without regions in chromsizes_regions are empty
+    return [
+        targets[targets["target"] == index]
+        .drop("target", axis="columns")
+        .reset_index(drop=True)
+        for index in range(len(collection.datasets))
+    ]
+
+
+def get_target_bitsets(
+    collection, assembly_id, chromsizes_regions, chromsizes, binsize
+):
+    """Returns the targets of collection as packed bitsets over the universe of assembly_id
+    at binsize (see enrichment_operations.pack_bins). Bitsets are prepared once per
+    collection, assembly and binsize."""
+    file_path = _get_targets_path(collection, assembly_id).replace(
+        ".parquet", f"_{binsize}.npy"
+    )
+    return _get_cached(
+        file_path,
+        lambda: _prepare_target_bitsets(
+            collection, assembly_id, chromsizes_regions, chromsizes, binsize
+        ),
+        load=_load_array,
+        save=_save_array,
+        cleanup=lambda: _remove_stale_targets(collection, assembly_id),
+    )
+
+
+def get_universe(assembly_id, chromsizes, binsize):
+    """Returns universe of assembly_id, which is the genome binned with equal binsize."""
+    file_path = os.path.join(
+        _get_cache_dir(), f"universe_{assembly_id}_{binsize}.parquet"
+    )
+    return _get_cached(file_path, lambda: bf.binnify(chromsizes, binsize))
+
+
+def remove_cached_targets(collection_id):
+    """Removes cached target sets and target bitsets of collection_id."""
+    for file_path in glob.glob(
+        os.path.join(_get_cache_dir(), f"targets_{collection_id}_*")
+    ):
+        os.remove(file_path)
+
+
+def remove_cached_universes(assembly_id):
+    """Removes cached universes of assembly_id."""
+    for file_path in glob.glob(
+        os.path.join(_get_cache_dir(), f"universe_{assembly_id}_*.parquet")
+    ):
+        os.remove(file_path)
+
+
+def _get_cached(file_path, prepare, load=pd.read_parquet, save=None, cleanup=None):
+    """Returns data cached at file_path. If it does not exist, it is prepared by calling
+    prepare while holding the lock for file_path and then cached. cleanup is called after
+    the data is cached if it is given. Defaults to dataframes that are stored as parquet files."""
+    if save is None:
+        save = _save_parquet
+    if os.path.exists(file_path):
+        return load(file_path)
+    lock = current_app.redis.lock(
+        _get_lock_name(file_path),
+        timeout=current_app.config["ENRICHMENT_CACHE_LOCK_TIMEOUT"],
+        blocking_timeout=current_app.config["ENRICHMENT_CACHE_LOCK_TIMEOUT"],
+    )
+    if not lock.acquire():
+        log.warning(
+            f"Could not acquire enrichment cache lock for {file_path}. Preparing without caching."
+        )
+        return prepare()
+    try:
+        if os.path.exists(file_path):
+            return load(file_path)
+        data = prepare()
+        # write to temporary file first so that readers never see partial files
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        temp_path = f"{file_path}.{os.getpid()}.tmp"
+        save(data, temp_path)
+        os.replace(temp_path, file_path)
+        if cleanup is not None:
+            cleanup()
+        return data
+    finally:
+        try:
+            lock.release()
+        except LockError:
+            log.warning(
+                f"Enrichment cache lock for {file_path} expired before release."
+            )
+
+
+def _prepare_targets(collection, chromsizes_regions):
+    """Reads the datasets of collection and returns them as single dataframe
+    with the index of the dataset in collection in column target."""
+    log.info("      Calculate target list...")
+    targets = []
+    for index, dataset in enumerate(collection.datasets):
+        target = (
+            pd.read_csv(dataset.file_path, sep="\t", header=None)
+            .iloc[:, [0, 1, 2]]
+            .rename(columns={0: "chrom", 1: "start", 2: "end"})
+        )
+        targets.append(
+            bf.count_overlaps(target, chromsizes_regions)
+            .query("count > 0")
+            .drop("count", axis="columns")
+            .drop_duplicates()
+            .assign(target=index)
+        )
+    return pd.concat(targets).reset_index(drop=True)
+
+
+def _prepare_target_bitsets(
+    collection, assembly_id, chromsizes_regions, chromsizes, binsize
+):
+    """Marks the universe bins that overlap each target of collection and packs them into bitsets."""
+    universe = get_universe(assembly_id, chromsizes, binsize)
+    universe_in_targets = [
+        enrichment_operations.IntervalIndex(target).overlaps(universe)
+        for target in get_targets(collection, assembly_id, chromsizes_regions)
+    ]
+    return np.packbits(np.stack(universe_in_targets), axis=1)
+
+
+def _remove_stale_targets(collection, assembly_id):
+    """Removes cached target sets and target bitsets of collection and assembly_id
+    that were prepared for a previous membership of collection."""
+    current_prefix = os.path.basename(
+        _get_targets_path(collection, assembly_id)
+    ).replace(".parquet", "")
+    for file_path in glob.glob(
+        os.path.join(_get_cache_dir(), f"targets_{collection.id}_{assembly_id}_*")
+    ):
+        file_name = os.path.basename(file_path)
+        # temporary files are still being written by other workers
+        if file_name.startswith(current_prefix) or file_name.endswith(".tmp"):
+            continue
+        try:
+            os.remove(file_path)
+        except FileNotFoundError:
+            # removed by another worker
+            pass
+
+
+def _save_parquet(frame, file_path):
+    frame.to_parquet(file_path, index=False)
+
+
+def _load_array(file_path):
+    # memory-mapped so that processes of an enrichment pool share the bitsets
+    return np.load(file_path, mmap_mode="r")
+
+
+def _save_array(array, file_path):
+    # file object prevents numpy from appending .npy to the temporary file path
+    with open(file_path, "wb") as file_object:
+        np.save(file_object, array)
+
+
+def _get_targets_path(collection, assembly_id):
+    membership = ",".join(
+        f"{dataset.id}:{dataset.file_path}" for dataset in collection.datasets
+    )
+    membership_hash = hashlib.sha1(membership.encode()).hexdigest()
+    return os.path.join(
+        _get_cache_dir(),
+        f"targets_{collection.id}_{assembly_id}_{membership_hash}.parquet",
+    )
+
+
+def _get_cache_dir():
+    return os.path.join(current_app.config["UPLOAD_DIR"], "enrichment_cache")
+
+
+def _get_lock_name(file_path):
+    return f"hicognition-enrichment-{os.path.basename(file_path)}"
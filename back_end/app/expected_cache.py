@@ -0,0 +1,95 @@
+"""Cluster-wide cache for expected dataframes of cooler datasets.
+Expected dataframes are calculated once per cooler dataset and binsize. Calculation
+is guarded by a redis lock so that workers that need the same expected dataframe
+wait for the result instead of calculating it again."""
+import os
+import uuid
+import logging
+import pandas as pd
+from flask.globals import current_app
+from ngs import HiCTools as HT
+from redis.exceptions import LockError
+from . import db
+from .models import ObsExp
+
+# get logger
+log = logging.getLogger("rq.worker")
+
+
+def get_expected(cooler_dataset, cooler_file, binsize, arms):
+    """Returns expected dataframe of cooler_dataset at binsize. Uses the cached
+    obs/exp dataset if it exists. Otherwise, the expected dataframe is calculated
+    while holding the lock for this dataset and binsize and then cached."""
+    if (expected := _load_cached_expected(cooler_dataset, binsize)) is not None:
+        return expected
+    lock = current_app.redis.lock(
+        _get_lock_name(cooler_dataset.id, binsize),
+        timeout=current_app.config["EXPECTED_LOCK_TIMEOUT"],
+        blocking_timeout=current_app.config["EXPECTED_LOCK_TIMEOUT"],
+    )
+    if not lock.acquire():
+        log.warning(
+            f"Could not acquire expected lock for dataset {cooler_dataset.id} at {binsize}. Calculating without caching."
+        )
+        return _calculate_expected(cooler_file, arms)
+    # separate session -> entries of other workers are visible and only the cache entry
+    # is committed, not the pending state of the session of the worker
+    session = db.create_scoped_session()
+    try:
+        if (
+            expected := _load_cached_expected(cooler_dataset, binsize, session)
+        ) is not None:
+            return expected
+        expected = _calculate_expected(cooler_file, arms)
+        file_path = os.path.join(
+            current_app.config["UPLOAD_DIR"], uuid.uuid4().hex + ".parquet"
+        )
+        expected.to_parquet(file_path, index=False)
+        new_obs_exp_ds = ObsExp(
+            dataset_id=cooler_dataset.id, binsize=binsize, filepath=file_path
+        )
+        session.add(new_obs_exp_ds)
+        session.commit()
+        return expected
+    finally:
+        session.remove()
+        try:
+            lock.release()
+        except LockError:
+            log.warning(
+                f"Expected lock for dataset {cooler_dataset.id} at {binsize} expired before release."
+            )
+
+
+def load_expected(file_path):
+    """Loads expected dataframe from file_path. Supports parquet files as well
+    as csv files that were written by earlier versions."""
+    if file_path.lower().endswith(".csv"):
+        return pd.read_csv(file_path)
+    return pd.read_parquet(file_path)
+
+
+def _load_cached_expected(cooler_dataset, binsize, session=None):
+    """Returns cached expected dataframe of cooler_dataset at binsize
+    or None if it does not exist. The cache entry is queried with session,
+    which defaults to the session of the app."""
+    if session is None:
+        session = db.session
+    obs_exp_entry = (
+        session.query(ObsExp)
+        .filter(ObsExp.dataset_id == cooler_dataset.id, ObsExp.binsize == binsize)
+        .first()
+    )
+    if obs_exp_entry is None:
+        return None
+    return load_expected(obs_exp_entry.filepath)
+
+
+def _calculate_expected(cooler_file, arms):
+    return HT.get_expected(
+        cooler_file, arms, proc=current_app.config["OBS_EXP_PROCESSES"]
+    )
+
+
+def _get_lock_name(dataset_id, binsize):
+    return f"hicognition-expected-{dataset_id}-{binsize}"
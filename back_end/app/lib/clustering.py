@@ -0,0 +1,39 @@
+"""Clustering of embeddings."""
+import numpy as np
+from scipy.cluster.hierarchy import linkage, cut_tree
+from sklearn.cluster import KMeans
+
+
+class CentroidHierarchy:
+    """Clusters data with kmeans into cluster_number clusters and merges the kmeans
+    centroids hierarchically with ward linkage. Clusterings with any number of clusters
+    up to cluster_number are cut from the hierarchy without clustering the data again,
+    so clusters of fewer clusters are unions of clusters of more clusters."""
+
+    def __init__(self, cluster_number, random_state=0):
+        self.cluster_number = cluster_number
+        self.kmeans = KMeans(n_clusters=cluster_number, random_state=random_state)
+        self.linkage = None
+
+    def fit(self, data):
+        """Fits kmeans on data and the hierarchy on its centroids."""
+        self.kmeans.fit(data)
+        if self.cluster_number > 1:
+            self.linkage = linkage(self.kmeans.cluster_centers_, method="ward")
+        return self
+
+    def get_centroid_clusters(self, cluster_number):
+        """Returns array with the cluster of each kmeans centroid if the hierarchy
+        is cut into cluster_number clusters."""
+        if cluster_number >= self.cluster_number:
+            return np.arange(self.cluster_number)
+        return cut_tree(self.linkage, n_clusters=cluster_number)[:, 0]
+
+    def get_labels(self, cluster_number):
+        """Returns cluster ids of the data the hierarchy was fitted on
+        for cluster_number clusters."""
+        return self.get_centroid_clusters(cluster_number)[self.kmeans.labels_]
+
+    def predict(self, data, cluster_number):
+        """Returns cluster ids of data for cluster_number clusters."""
+        return self.get_centroid_clusters(cluster_number)[self.kmeans.predict(data)]
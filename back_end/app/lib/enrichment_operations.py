@@ -0,0 +1,151 @@
+"""Operations for enrichment analysis of genomic intervals."""
+import numpy as np
+import pandas as pd
+
+# number of set bits of each byte
+_POPCOUNT = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint8)
+
+
+class IntervalIndex:
+    """Index over genomic intervals (dataframe with chrom, start and end) that holds
+    per chromosome the sorted start positions and the running maximum of the end positions.
+    This allows to answer whether intervals overlap any indexed interval with vectorized
+    searchsorted lookups."""
+
+    def __init__(self, intervals):
+        self.chromosomes = {}
+        for chrom, positions in intervals.groupby("chrom", sort=False).indices.items():
+            starts = intervals["start"].values[positions]
+            ends = intervals["end"].values[positions]
+            order = np.argsort(starts, kind="stable")
+            self.chromosomes[chrom] = (
+                starts[order],
+                np.maximum.accumulate(ends[order]),
+            )
+
+    def overlaps(self, intervals):
+        """Returns boolean array that is True for each of intervals that overlaps
+        at least one indexed interval. Intervals are half-open."""
+        result = np.zeros(len(intervals), dtype=bool)
+        for chrom, positions in intervals.groupby("chrom", sort=False).indices.items():
+            if chrom not in self.chromosomes:
+                continue
+            starts, running_ends = self.chromosomes[chrom]
+            # indexed intervals that start before the end of the query
+            candidate_number = np.searchsorted(
+                starts, intervals["end"].values[positions], side="left"
+            )
+            has_candidates = candidate_number > 0
+            result[positions[has_candidates]] = (
+                running_ends[candidate_number[has_candidates] - 1]
+                > intervals["start"].values[positions[has_candidates]]
+            )
+        return result
+
+
+def get_odds_ratios(universe_in_queries, universe_in_targets):
+    """Returns (targets, queries) array of odds ratios of the overlap between each query and
+    each target. Contingency tables are calculated over universe regions as in LOLA:
+    universe_in_queries is a boolean (universe regions, queries) array that is True for universe
+    regions that overlap the respective query and universe_in_targets is a boolean
+    (universe regions, targets) array that is True for universe regions that overlap the
+    respective target."""
+    # float matrix products use blas, counts are exact up to the size of the mantissa
+    dtype = np.float32 if len(universe_in_queries) < 2**24 else np.float64
+    support = np.rint(
+        universe_in_targets.T.astype(dtype) @ universe_in_queries.astype(dtype)
+    ).astype(np.int64)
+    return get_odds_ratios_from_counts(
+        support,
+        universe_in_queries.sum(axis=0),
+        universe_in_targets.sum(axis=0),
+        len(universe_in_queries),
+    )
+
+
+def get_bin_indices(intervals, chromsizes, binsize):
+    """Returns the index of the bin of the genome binned with binsize (as by bioframe.binnify
+    with chromosomes in the order of chromsizes) that contains the start of each of intervals.
+    Intervals need to be aligned with the bins, e.g. chunks returned by
+    interval_operations.chunk_intervals. Intervals outside of chromosomes get index -1."""
+    bin_numbers = _get_chromosome_bin_numbers(chromsizes, binsize)
+    offsets = pd.Series(
+        np.concatenate([[0], np.cumsum(bin_numbers)[:-1]]), index=chromsizes.index
+    )
+    sizes = pd.Series(chromsizes.values, index=chromsizes.index)
+    starts = intervals["start"].values
+    chrom_offsets = intervals["chrom"].map(offsets).values
+    chrom_sizes = intervals["chrom"].map(sizes).values
+    valid = ~pd.isnull(chrom_offsets) & (starts >= 0)
+    valid[valid] = starts[valid] < chrom_sizes[valid]
+    bin_indices = np.full(len(intervals), -1, dtype=np.int64)
+    bin_indices[valid] = (chrom_offsets[valid] + starts[valid] // binsize).astype(
+        np.int64
+    )
+    return bin_indices
+
+
+def get_bin_number(chromsizes, binsize):
+    """Returns number of bins of the genome binned with binsize."""
+    return int(_get_chromosome_bin_numbers(chromsizes, binsize).sum())
+
+
+def _get_chromosome_bin_numbers(chromsizes, binsize):
+    return -(-chromsizes.values // binsize)
+
+
+def pack_bins(bin_indices, bin_number):
+    """Returns (len(bin_indices), ceil(bin_number / 8)) array of packed bitsets over bin_number
+    bins. bin_indices is a list that holds the indices of the set bins of each bitset,
+    indices of -1 are ignored."""
+    bitsets = np.zeros((len(bin_indices), bin_number), dtype=bool)
+    for row, indices in enumerate(bin_indices):
+        indices = np.asarray(indices, dtype=np.int64)
+        bitsets[row, indices[indices >= 0]] = True
+    return np.packbits(bitsets, axis=1)
+
+
+def get_odds_ratios_from_bitsets(query_bitsets, target_bitsets, bin_number):
+    """Returns (targets, queries) array of odds ratios of the overlap between each query and
+    each target. Queries and targets are packed bitsets over the bin_number bins of the universe
+    as returned by pack_bins. Overlaps are counted by bitwise and and popcount."""
+    support = np.stack(
+        [
+            _POPCOUNT[np.bitwise_and(query_bitsets, target_bitset)].sum(
+                axis=1, dtype=np.int64
+            )
+            for target_bitset in target_bitsets
+        ]
+    )
+    return get_odds_ratios_from_counts(
+        support,
+        _POPCOUNT[query_bitsets].sum(axis=1, dtype=np.int64),
+        _POPCOUNT[target_bitsets].sum(axis=1, dtype=np.int64),
+        bin_number,
+    )
+
+
+def get_odds_ratios_from_counts(support, query_numbers, target_numbers, universe_size):
+    """Returns (targets, queries) array of odds ratios from the (targets, queries) array of the
+    number of universe regions that overlap both target and query, the number of universe
+    regions that overlap each query and each target and the number of universe regions.
+    Odds ratios follow scipy.stats.fisher_exact, i.e. they are nan if a margin of the
+    contingency table is zero and inf if the denominator is zero."""
+    query_only = np.asarray(query_numbers)[np.newaxis, :] - support
+    target_only = np.asarray(target_numbers)[:, np.newaxis] - support
+    rest = universe_size - support - query_only - target_only
+    denominator = query_only * target_only
+    with np.errstate(divide="ignore", invalid="ignore"):
+        odds_ratios = np.where(
+            denominator > 0,
+            (support * rest) / np.where(denominator > 0, denominator, 1),
+            np.inf,
+        )
+    empty_margin = (
+        (support + query_only == 0)
+        | (target_only + rest == 0)
+        | (support + target_only == 0)
+        | (query_only + rest == 0)
+    )
+    odds_ratios[empty_margin] = np.nan
+    return odds_ratios
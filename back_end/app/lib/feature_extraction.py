@@ -1,63 +1,119 @@
 """Module to extract features from genomic datasets"""
 
+from concurrent.futures import ThreadPoolExecutor
 import cv2
 from sklearn.preprocessing import StandardScaler
 from sklearn.impute import SimpleImputer
+from sklearn.pipeline import make_pipeline
 import numpy as np
 
 
-def _downscale_images(images, pixel_target):
+# opencv filters the channels of an image independently, stacks of images are therefore
+# processed as channels of a single image. Number of channels is limited to CV_CN_MAX.
+_MAX_CHANNELS = 512
+
+
+def _process_batched(images, function, threads=1):
+    """Applies function to the (regions, n, n) stack images in batches of up to
+    _MAX_CHANNELS images that are passed as channels of a single (n, n, batch) image.
+    Batches are processed by threads threads, opencv releases the GIL while filtering.
+    Returns (regions, pixels) array of the flattened results."""
+    batches = [
+        images[start : start + _MAX_CHANNELS]
+        for start in range(0, len(images), _MAX_CHANNELS)
+    ]
+
+    def process(batch):
+        result = function(np.ascontiguousarray(np.moveaxis(batch, 0, -1)))
+        # opencv drops the channel axis of single channel results
+        result = result.reshape(result.shape[0], result.shape[1], len(batch))
+        return np.moveaxis(result, -1, 0).reshape(len(batch), -1)
+
+    if threads > 1 and len(batches) > 1:
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            results = list(executor.map(process, batches))
+    else:
+        results = [process(batch) for batch in batches]
+    return np.concatenate(results)
+
+
+def _downscale_images(images, pixel_target, threads=1):
     # get parameters
-    downsampling_factor = images[0].shape[0] // pixel_target[0]
+    downsampling_factor = images.shape[1] // pixel_target[0]
     blurring_kernel_sigma = (downsampling_factor - 1) // 2
     blurring_kernel_size = (blurring_kernel_sigma * 4) + 1
-    pixel_features = []
-    for temp_image in images:
-        pixel_features.append(
-            cv2.resize(
-                cv2.GaussianBlur(
-                    temp_image,
-                    (blurring_kernel_size, blurring_kernel_size),
-                    blurring_kernel_sigma,
-                ),
-                pixel_target,
-            ).flatten()
-        )
-    return pixel_features
-
-
-def _upscale_images(images, pixel_target):
-    pixel_features = []
-    for temp_image in images:
-        pixel_features.append(cv2.resize(temp_image, pixel_target).flatten())
-    return pixel_features
-
-
-def extract_image_features(images, pixel_target=(10, 10)):
-    """Implementation of extract image features using opencv"""
-    if len(images) == 0:
-        return None
+    return _process_batched(
+        images,
+        lambda batch: cv2.resize(
+            cv2.GaussianBlur(
+                batch,
+                (blurring_kernel_size, blurring_kernel_size),
+                blurring_kernel_sigma,
+            ),
+            pixel_target,
+        ),
+        threads,
+    )
+
+
+def _upscale_images(images, pixel_target, threads=1):
+    # bilinear upscaling of multi-channel images does not treat channels independently
+    # -> resize each image on its own
+    def process(image):
+        return cv2.resize(image, pixel_target).flatten()
+
+    if threads > 1:
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            return np.stack(list(executor.map(process, images)))
+    return np.stack([process(image) for image in images])
+
+
+def extract_pixel_features(images, pixel_target=(10, 10), threads=1):
+    """Returns unscaled (images, pixels) feature matrix of images resized to
+    pixel_target. images is a (regions, n, n) array or a list of equally sized
+    images. Images are resized in batches that are processed by threads threads.
+    Can be called on chunks of images whose results are concatenated and passed
+    to scale_image_features."""
+    images = np.asarray(images, dtype=np.float64)
     # replace empty arrays and arrays with single element with nans
-    images = [
-        image if len(image) > 1 else np.full((10, 10), np.nan) for image in images
-    ]
+    if images.shape[1] <= 1:
+        images = np.full((len(images), 10, 10), np.nan)
     # check whether downsampling needs to be applied
-    if images[0].shape[0] < pixel_target[0]:
+    if images.shape[1] < pixel_target[0]:
         downsampling = False
     else:
         downsampling = True
     # calculate features
-    pixel_features = (
-        _downscale_images(images, pixel_target)
-        if downsampling
-        else _upscale_images(images, pixel_target)
-    )
-    X = np.stack(pixel_features)
+    if downsampling:
+        return _downscale_images(images, pixel_target, threads)
+    return _upscale_images(images, pixel_target, threads)
+
+
+def clean_image_features(X):
+    """Replaces inf in feature matrix X with nan. Returns None if X only contains nans."""
     # replace inf with nan
     X[np.isinf(X)] = np.nan
     # is all none return None
     if np.all(np.isnan(X)):
         return None
-    imputed = SimpleImputer().fit_transform(X)
-    scaled = StandardScaler().fit_transform(imputed)
-    return scaled
+    return X
+
+
+def get_image_feature_scaler():
+    """Returns unfitted imputer and scaler of feature matrices."""
+    return make_pipeline(SimpleImputer(), StandardScaler())
+
+
+def scale_image_features(X):
+    """Imputes and scales feature matrix X. Returns None if X only contains nans."""
+    X = clean_image_features(X)
+    if X is None:
+        return None
+    return get_image_feature_scaler().fit_transform(X)
+
+
+def extract_image_features(images, pixel_target=(10, 10), threads=1):
+    """Implementation of extract image features using opencv"""
+    if len(images) == 0:
+        return None
+    return scale_image_features(extract_pixel_features(images, pixel_target, threads))
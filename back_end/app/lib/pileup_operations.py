@@ -0,0 +1,137 @@
+"""Operations on pileup windows extracted from cooler files."""
+import numpy as np
+import pandas as pd
+
+
+def expected_to_lookup(expected):
+    """Converts an expected dataframe as returned by HiCTools.get_expected
+    into a dictionary mapping region names to an array of average balanced
+    contacts indexed by diagonal."""
+    lookup = {}
+    for region, frame in expected.groupby("region", sort=False):
+        diagonals = frame["diag"].values.astype(int)
+        averages = np.full(diagonals.max() + 1, np.nan)
+        averages[diagonals] = frame["balanced.avg"].values
+        lookup[region] = averages
+    return lookup
+
+
+def divide_by_expected(window, expected_averages, diagonal_offset=0):
+    """Divides a balanced window by the expected contacts at the respective
+    genomic distance. diagonal_offset is the distance in bins between the start
+    of the second and the first window anchor (0 for windows that are centered on
+    the main diagonal). Pixels at distances that are not covered by
+    expected_averages are set to nan."""
+    window = np.asarray(window, dtype=np.float64)
+    if window.ndim != 2 or window.size == 0:
+        return window.copy()
+    rows, columns = np.indices(window.shape)
+    diagonals = np.abs(diagonal_offset + columns - rows)
+    expected = np.full(window.shape, np.nan)
+    valid = diagonals < len(expected_averages)
+    expected[valid] = expected_averages[diagonals[valid]]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return window / expected
+
+
+def obs_exp_from_iccf(windows, regions, expected, diagonal_offsets=None):
+    """Derives Obs/Exp windows from balanced (ICCF) windows. windows is either a
+    (n, n, regions) stack or a list of 2d arrays, regions holds the region (chromosome arm)
+    each window was assigned to and expected is the expected dataframe. diagonal_offsets
+    holds the distance in bins between the two window anchors of each window and defaults to 0
+    (windows centered on the main diagonal). Windows whose region is not covered by expected are
+    filled with nan. Returns the same container type as windows."""
+    lookup = expected_to_lookup(expected)
+    regions = list(regions)
+    if diagonal_offsets is None:
+        diagonal_offsets = np.zeros(len(regions), dtype=int)
+    is_stack = isinstance(windows, np.ndarray) and windows.ndim == 3
+    window_list = (
+        [windows[..., index] for index in range(windows.shape[2])]
+        if is_stack
+        else windows
+    )
+    output = []
+    for window, region, offset in zip(window_list, regions, diagonal_offsets):
+        if pd.isnull(region) or region not in lookup:
+            output.append(np.full(np.shape(window), np.nan))
+            continue
+        output.append(divide_by_expected(window, lookup[region], int(offset)))
+    if is_stack:
+        if len(output) == 0:
+            return np.empty(windows.shape)
+        return np.stack(output, axis=2)
+    return output
+
+
+def grouped_nan_sums(values, group_ids, group_number):
+    """Returns nan-aware sums and counts of the rows of values per group. values is a
+    (regions, ...) array and group_ids holds the group of each row. All groups are
+    reduced in a single pass with bincount over the flattened values. Returns two
+    (group_number, ...) arrays with the sums and the number of non-nan values."""
+    values = np.asarray(values, dtype=np.float64)
+    value_shape = values.shape[1:]
+    pixel_number = int(np.prod(value_shape))
+    values = values.reshape(len(values), pixel_number)
+    valid = ~np.isnan(values)
+    # every pixel of every group gets its own bin
+    bins = (
+        np.asarray(group_ids, dtype=np.int64)[:, np.newaxis] * pixel_number
+        + np.arange(pixel_number)
+    ).ravel()
+    bin_number = group_number * pixel_number
+    sums = np.bincount(
+        bins, weights=np.where(valid, values, 0).ravel(), minlength=bin_number
+    )
+    counts = np.bincount(bins[valid.ravel()], minlength=bin_number)
+    return (
+        sums.reshape((group_number, *value_shape)),
+        counts.reshape((group_number, *value_shape)),
+    )
+
+
+def grouped_nanmean(values, group_ids, group_number):
+    """Returns (group_number, ...) array with the nan-aware mean of the rows of values
+    per group. Groups or pixels without any valid value are nan."""
+    return _divide_counts(*grouped_nan_sums(values, group_ids, group_number))
+
+
+def _divide_counts(sums, counts):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return sums / np.where(counts == 0, np.nan, counts)
+
+
+class PileupAccumulator:
+    """Accumulates nan-aware running sums and counts of pileup windows so that
+    averages can be calculated without holding all windows in memory. Windows can
+    be assigned to groups (e.g. clusters) to get one average per group."""
+
+    def __init__(self, window_shape, group_number=1):
+        self.sums = np.zeros((group_number, *window_shape))
+        self.counts = np.zeros((group_number, *window_shape), dtype=np.int64)
+
+    def add(self, windows, group_ids=None):
+        """Adds a (regions, n, n) stack of windows. group_ids holds the group of
+        each window and defaults to the first group for all windows."""
+        if group_ids is None:
+            group_ids = np.zeros(len(windows), dtype=int)
+        sums, counts = grouped_nan_sums(windows, group_ids, len(self.sums))
+        self.sums += sums
+        self.counts += counts
+
+    def merge_groups(self, group_ids, group_number):
+        """Returns new accumulator with group_number groups whose sums and counts are
+        merged from the groups of this accumulator. group_ids holds the new group of
+        each group of this accumulator. Averages of coarser groupings that are unions of
+        finer groups can thereby be calculated without adding the windows again."""
+        merged = PileupAccumulator(self.sums.shape[1:], group_number=group_number)
+        merged.sums = grouped_nan_sums(self.sums, group_ids, group_number)[0]
+        merged.counts += grouped_nan_sums(self.counts, group_ids, group_number)[
+            0
+        ].astype(np.int64)
+        return merged
+
+    def average(self):
+        """Returns (groups, n, n) array of averages. Pixels without any
+        valid value are nan."""
+        return _divide_counts(self.sums, self.counts)
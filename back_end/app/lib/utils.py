@@ -35,6 +35,75 @@ def parse_binsizes(map, filetype):
     return list(binsizes)
 
 
+def get_pipeline_calls(intervals, preprocessing_map, filetype, nest_windows=False):
+    """Returns (interval_id, binsize, nested_interval_ids) tuples for the pipelines that
+    need to run for intervals, given as (interval_id, region_dataset_id, windowsize)
+    tuples, according to the preprocessing map. If nest_windows is True, intervals of the
+    same region dataset with fixed windowsizes that share a binsize are combined into a
+    single call for the interval with the largest windowsize. Results of the intervals in
+    nested_interval_ids are cropped from it."""
+    calls = []
+    nested_groups = {}
+    for interval_id, region_dataset_id, windowsize in intervals:
+        map_key = "variable" if windowsize is None else windowsize
+        # check whether windowsize is in preprocessing map
+        if map_key not in preprocessing_map:
+            continue
+        for binsize in preprocessing_map[map_key][filetype]:
+            if not nest_windows or windowsize is None or windowsize % binsize != 0:
+                calls.append((interval_id, binsize, []))
+                continue
+            nested_groups.setdefault((region_dataset_id, binsize), []).append(
+                (windowsize, interval_id)
+            )
+    for (_, binsize), group in nested_groups.items():
+        group = sorted(group, reverse=True)
+        calls.append(
+            (group[0][1], binsize, [interval_id for _, interval_id in group[1:]])
+        )
+    return calls
+
+
+def get_stackup_calls(intervals, preprocessing_map):
+    """Returns (interval_id, binsize, derived_stackups) tuples for the bigwig stackups that
+    need to run for intervals, given as (interval_id, region_dataset_id, windowsize) tuples,
+    according to the preprocessing map. Binsizes of a windowsize that are multiples of its
+    finest binsize are grouped with it, as are windowsizes of the same region dataset that
+    share this binsize. Each group is a single call at the largest windowsize and finest
+    binsize of the group. Stackups of the other (interval_id, binsize) combinations of the
+    group, listed in derived_stackups, are derived from it."""
+    calls = []
+    groups = {}
+    for interval_id, region_dataset_id, windowsize in intervals:
+        map_key = "variable" if windowsize is None else windowsize
+        # check whether windowsize is in preprocessing map
+        if map_key not in preprocessing_map:
+            continue
+        binsizes = preprocessing_map[map_key]["bigwig"]
+        for binsize in binsizes:
+            finest_binsize = min(binsizes)
+            if windowsize is not None and windowsize % binsize != 0:
+                calls.append((interval_id, binsize, []))
+                continue
+            if binsize % finest_binsize != 0:
+                finest_binsize = binsize
+            groups.setdefault(
+                (region_dataset_id, windowsize is None, finest_binsize), []
+            ).append((windowsize, binsize, interval_id))
+    for group in groups.values():
+        # finest binsize of the largest windowsize is read, variable intervals have one size
+        _, binsize, interval_id = max(
+            group, key=lambda entry: (entry[0] or 0, -entry[1])
+        )
+        derived_stackups = [
+            (derived_interval_id, derived_binsize)
+            for _, derived_binsize, derived_interval_id in group
+            if (derived_interval_id, derived_binsize) != (interval_id, binsize)
+        ]
+        calls.append((interval_id, binsize, derived_stackups))
+    return calls
+
+
 def get_optimal_binsize(regions, target_bin_number, processing_map):
     """given a dataframe of regions defined via (chrom, start, end) and a
     target bin number, decide which binsize to use for variable size pileup/enrichment analysis
@@ -69,9 +138,13 @@ def get_optimal_binsize(regions, target_bin_number, processing_map):
 
 
 def flatten_and_clean_array(array):
-    """takes numpy array and converts it to a list where
-    numpy.na and +\- np.inf is convert to python None"""
-    return [
-        entry if not (np.isnan(entry) or np.isinf(entry)) else None
-        for entry in array.flatten()
-    ]
+    """takes numpy array and converts it to a flat list where
+    numpy.na and +\- np.inf is convert to python None. Values are converted
+    with numpy instead of checking each element in python."""
+    values = np.asarray(array).ravel()
+    invalid = ~np.isfinite(values)
+    if not invalid.any():
+        return values.tolist()
+    cleaned = values.astype(object)
+    cleaned[invalid] = None
+    return cleaned.tolist()
@@ -23,6 +23,9 @@ from . import lib as hicognition
 from .lib.utils import parse_binsizes
 from .lib.format_checkers import FORMAT_CHECKERS
 from . import db
+from . import enrichment_cache
+from . import embedding_cache
+from . import response_payloads
 
 
 # define association tables
@@ -463,6 +466,9 @@ class Dataset(db.Model):
 
     def delete_data_of_associated_entries(self):
         """deletes files of associated entries"""
+        embedding_cache.remove_cached_models("embedding2d", self.id)
+        for intervals in self.intervals.all():
+            embedding_cache.remove_cached_models(intervals_id=intervals.id)
         # join lists
         deletion_queue = chain(
             [self],
@@ -479,10 +485,15 @@ class Dataset(db.Model):
                 hicognition.io_helpers.remove_safely(
                     entry.file_path_small, current_app.logger
                 )
+                if os.path.exists(entry.file_path_summary):
+                    hicognition.io_helpers.remove_safely(
+                        entry.file_path_summary, current_app.logger
+                    )
             if hasattr(entry, "file_path") and (entry.file_path is not None):
                 hicognition.io_helpers.remove_safely(
                     entry.file_path, current_app.logger
                 )
+            _remove_response_payloads(entry)
             if hasattr(entry, "file_path_sub_sample_index") and (
                 entry.file_path_sub_sample_index is not None
             ):
@@ -665,6 +676,8 @@ class Collection(db.Model):
 
     def delete_data_of_associated_entries(self):
         """Deletes associated Data"""
+        enrichment_cache.remove_cached_targets(self.id)
+        embedding_cache.remove_cached_models("embedding1d", self.id)
         assoc_data = self.associationData  # .all()
         deletion_queue = assoc_data
         for entry in deletion_queue:
@@ -674,6 +687,7 @@ class Collection(db.Model):
                 hicognition.io_helpers.remove_safely(
                     entry.file_path_feature_values, current_app.logger
                 )
+            _remove_response_payloads(entry)
 
     def set_processing_state(self, database):
         """Sets the current processing state of the collection instance.
@@ -947,6 +961,12 @@ class IndividualIntervalData(BaseIntervalData):
     def intervaldata_type(self) -> IntervalDataTypeEnum:
         return IntervalDataTypeEnum.STACKUP.value
 
+    @property
+    def file_path_summary(self):
+        """Location of the single value per region that 1d-embeddings are based on,
+        which is written next to the full stackup. Older stackups have no summary."""
+        return os.path.splitext(self.file_path)[0] + "_summary.npy"
+
 
 class AssociationIntervalData(BaseIntervalData):
     """db.Table to hold information and pointers to data for values extracted by calculating
@@ -1241,6 +1261,18 @@ def all_tasks_finished(tasks):
     return True
 
 
+def _remove_response_payloads(entry):
+    """Removes precompressed response payloads of the artifacts of entry."""
+    response_payloads.remove_payloads(
+        getattr(entry, "file_path", None),
+        getattr(entry, "file_path_small", None),
+        getattr(entry, "cluster_id_path", None),
+    )
+    response_payloads.remove_column_payloads(
+        getattr(entry, "file_path_feature_values", None)
+    )
+
+
 def any_tasks_failed(tasks):
     """Return True if any rq job failed."""
     for task in tasks:
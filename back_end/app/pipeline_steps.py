@@ -2,12 +2,16 @@
 import os
 import uuid
 import logging
+import multiprocessing
+from functools import partial
 from datetime import datetime
 from flask.globals import current_app
 import pandas as pd
 import numpy as np
 from rq import get_current_job
 from . import db
+from . import embedding_cache
+from . import response_payloads
 from . import pipeline_worker_functions as worker_funcs
 from .notifications import NotificationHandler
 from .models import (
@@ -70,60 +74,140 @@ def bed_preprocess_pipeline_step(dataset_id, windowsize):
 
 def pileup_pipeline_step(cooler_dataset_id, interval_id, binsize, arms, pileup_type):
     """Performs pileup [either ICCF or Obs/Exp; parameter passed to pileup_type] of cooler_dataset on
-    intervals with resolution binsize."""
+    intervals with resolution binsize. If pileup_type is a list of pileup types, all of them are
+    derived from a single pass over the cooler file. If interval_id is a list of intervals with fixed
+    windowsizes on the same regions, the pileup is done at the largest windowsize and the smaller
+    windowsizes are cropped from it."""
     current_app.logger.info(
         f"  Doing pileup on cooler {cooler_dataset_id} with intervals { interval_id} on binsize {binsize} with {pileup_type}"
     )
     cooler_dataset = Dataset.query.get(cooler_dataset_id)
-    intervals = Intervals.query.get(interval_id)
+    interval_ids = interval_id if isinstance(interval_id, list) else [interval_id]
+    intervals = [Intervals.query.get(current_id) for current_id in interval_ids]
     # get path to interval regions
-    regions_path = intervals.source_dataset.file_path
+    regions_path = intervals[0].source_dataset.file_path
     # get dimension
-    dimension = intervals.source_dataset.dimension
+    dimension = intervals[0].source_dataset.dimension
     # do pileup
     current_app.logger.debug(
         f"      {cooler_dataset_id}-{interval_id}-{binsize}|{pileup_type} => Doing pileup..."
     )
-    # get windowsize
-    window_size = intervals.windowsize
-    if window_size is not None:
+    pileup_types = [pileup_type] if isinstance(pileup_type, str) else pileup_type
+    if intervals[0].windowsize is not None:
         # check whether windowsize is divisible by binsize
-        if window_size % int(binsize) != 0:
-            current_app.logger.warn(
-                f"      {cooler_dataset_id}-{interval_id}-{binsize}|{pileup_type} => ########### Windowsize and binsize do not match! ##############"
-            )
+        for current_intervals in intervals:
+            if current_intervals.windowsize % int(binsize) != 0:
+                current_app.logger.warn(
+                    f"      {cooler_dataset_id}-{current_intervals.id}-{binsize}|{pileup_type} => ########### Windowsize and binsize do not match! ##############"
+                )
+        intervals = [
+            current_intervals
+            for current_intervals in intervals
+            if current_intervals.windowsize % int(binsize) == 0
+        ]
+        if len(intervals) == 0:
             return
-        pileup_array = worker_funcs._do_pileup_fixed_size(
+    if len(intervals) > 1:
+        # smaller windows share their center with the largest one and are cropped from it
+        pileup_chunks = (
+            {
+                (current_intervals.id, current_type): chunk[
+                    current_intervals.windowsize
+                ][current_type]
+                for current_intervals in intervals
+                for current_type in pileup_types
+            }
+            for chunk in worker_funcs._iterate_pileup_fixed_size_nested(
+                cooler_dataset,
+                [current_intervals.windowsize for current_intervals in intervals],
+                binsize,
+                regions_path,
+                arms,
+                pileup_types,
+                dimension=dimension,
+            )
+        )
+    elif intervals[0].windowsize is not None:
+        pileup_chunks = worker_funcs._iterate_pileup_fixed_size(
             cooler_dataset,
-            window_size,
+            intervals[0].windowsize,
             binsize,
             regions_path,
             arms,
-            pileup_type,
-            collapse=False,
+            pileup_types,
             dimension=dimension,
         )
     else:
-        pileup_array = worker_funcs._do_pileup_variable_size(
+        pileup_chunks = worker_funcs._iterate_pileup_variable_size(
             cooler_dataset,
             binsize,
             regions_path,
             arms,
-            pileup_type,
-            collapse=False,
+            pileup_types,
             dimension=dimension,
         )
-    embedding_results = worker_funcs._do_embedding_2d(pileup_array)
+    if len(intervals) == 1:
+        pileup_chunks = (
+            {
+                (intervals[0].id, current_type): chunk[current_type]
+                for current_type in pileup_types
+            }
+            for chunk in pileup_chunks
+        )
+    # windows are consumed in chunks to keep memory independent of the number of regions
+    pileup_keys = [
+        (current_intervals.id, current_type)
+        for current_intervals in intervals
+        for current_type in pileup_types
+    ]
+    pileup_results = worker_funcs._do_pileup_embedding_streamed(
+        pileup_chunks,
+        pileup_keys,
+        cache_scopes={
+            (current_id, current_type): embedding_cache.get_scope(
+                "embedding2d", cooler_dataset.id, current_id, binsize, current_type
+            )
+            for current_id, current_type in pileup_keys
+        },
+    )
+    intervals_by_id = {
+        current_intervals.id: current_intervals for current_intervals in intervals
+    }
+    for (current_id, current_type), (
+        average,
+        embedding_results,
+    ) in pileup_results.items():
+        _write_pileup_results(
+            average,
+            embedding_results,
+            cooler_dataset,
+            intervals_by_id[current_id],
+            binsize,
+            current_type,
+        )
+    current_app.logger.info(
+        f"       {cooler_dataset_id}-{interval_id}-{binsize}|{pileup_type} => Success!"
+    )
+
+
+def _write_pileup_results(
+    average, embedding_results, cooler_dataset, intervals, binsize, pileup_type
+):
+    """Writes average pileup and embedding results to files
+    and adds them to the database."""
     # add result to database
     current_app.logger.debug(
-        f"      {cooler_dataset_id}-{interval_id}-{binsize}|{pileup_type} => Writing output..."
+        f"      {cooler_dataset.id}-{intervals.id}-{binsize}|{pileup_type} => Writing output..."
     )
     file_name = uuid.uuid4().hex + ".npy"
     file_path = os.path.join(current_app.config["UPLOAD_DIR"], file_name)
-    np.save(file_path, np.nanmean(pileup_array, axis=2))
+    np.save(file_path, average)
+    response_payloads.write_payload(
+        response_payloads.get_array_payload(average), file_path
+    )
     # add this to database
     current_app.logger.debug(
-        f"      {cooler_dataset_id}-{interval_id}-{binsize}|{pileup_type} => Adding database entry for pileup..."
+        f"      {cooler_dataset.id}-{intervals.id}-{binsize}|{pileup_type} => Adding database entry for pileup..."
     )
     worker_funcs._add_pileup_db(
         file_path, binsize, intervals.id, cooler_dataset.id, pileup_type
@@ -148,6 +232,14 @@ def pileup_pipeline_step(cooler_dataset_id, interval_id, binsize, arms, pileup_t
             uuid.uuid4().hex + f"_thumbnails_{size}.npy",
         )
         np.save(file_path_thumbnails, embedding_results["clusters"][size]["thumbnails"])
+        response_payloads.write_payload(
+            response_payloads.get_embedding_payload(
+                embedding_results["embedding"],
+                embedding_results["clusters"][size]["cluster_ids"],
+                embedding_results["clusters"][size]["thumbnails"],
+            ),
+            file_path_cluster_ids,
+        )
         filepaths = {
             "embedding": file_path_embedding,
             "cluster_ids": file_path_cluster_ids,
@@ -157,14 +249,17 @@ def pileup_pipeline_step(cooler_dataset_id, interval_id, binsize, arms, pileup_t
         worker_funcs._add_embedding_2d_to_db(
             filepaths, binsize, intervals.id, cooler_dataset.id, pileup_type, size
         )
-    current_app.logger.info(
-        f"       {cooler_dataset_id}-{interval_id}-{binsize}|{pileup_type} => Success!"
-    )
 
 
-def stackup_pipeline_step(bigwig_dataset_id, intervals_id, binsize, region_side=None):
+def stackup_pipeline_step(
+    bigwig_dataset_id, intervals_id, binsize, region_side=None, derived_stackups=None
+):
     """Performs stackup of bigwig dataset over the intervals provided with the indicated binsize.
-    Stores result and adds it to database."""
+    Stores result and adds it to database. derived_stackups is a list of (intervals_id, binsize)
+    combinations on the same regions with smaller or equal windowsizes and coarser binsizes. These
+    are cropped and binned from the stackup instead of reading the bigwig again. region_side can be
+    a list of anchors of 2d regions, in which case all anchors are read in a single pass over the
+    bigwig. All database entries are added in a single transaction."""
     current_app.logger.info(
         f"  Doing pileup on bigwig {bigwig_dataset_id} with intervals {intervals_id} on binsize {binsize} with region_side: {region_side}"
     )
@@ -180,43 +275,240 @@ def stackup_pipeline_step(bigwig_dataset_id, intervals_id, binsize, region_side=
     )
     regions = pd.read_csv(file_path, sep="\t", header=None)
     sub_sample_index = np.load(intervals.file_path_sub_sample_index)
-    regions_small = regions.iloc[sub_sample_index, :]
     current_app.logger.debug(
         f"      {bigwig_dataset_id}-{intervals_id}-{binsize} => Doing stackup..."
     )
-    if window_size is None:
-        full_size_array = worker_funcs._do_stackup_variable_size(
-            bigwig_dataset.file_path, regions, binsize, region_side
-        )
-        downsampled_array = worker_funcs._do_stackup_variable_size(
-            bigwig_dataset.file_path, regions_small, binsize, region_side
+    # full size stackups are written directly to memory-mapped files, one per region side
+    sides = region_side if isinstance(region_side, list) else [region_side]
+    file_uuids = [uuid.uuid4().hex for _ in sides]
+    file_paths = [
+        os.path.join(current_app.config["UPLOAD_DIR"], file_uuid + ".npy")
+        for file_uuid in file_uuids
+    ]
+    output_path = file_paths if isinstance(region_side, list) else file_paths[0]
+    full_size_arrays = _do_stackup(
+        bigwig_dataset.file_path,
+        regions,
+        window_size,
+        binsize,
+        region_side,
+        output_path,
+    )
+    if not isinstance(region_side, list):
+        full_size_arrays = [full_size_arrays]
+    derivable_stackups = []
+    separate_stackups = []
+    for derived_intervals_id, derived_binsize in derived_stackups or []:
+        derived_intervals = Intervals.query.get(derived_intervals_id)
+        if worker_funcs._can_derive_stackup(
+            window_size, binsize, derived_intervals.windowsize, derived_binsize
+        ):
+            derivable_stackups.append((derived_intervals, derived_binsize))
+        else:
+            current_app.logger.warn(
+                f"      {bigwig_dataset_id}-{derived_intervals_id}-{derived_binsize} => Cannot be derived from {intervals_id}-{binsize}. Doing separate stackup..."
+            )
+            separate_stackups.append((derived_intervals_id, derived_binsize))
+    for side, file_uuid, full_size_array in zip(sides, file_uuids, full_size_arrays):
+        _write_stackup_results(
+            full_size_array,
+            sub_sample_index,
+            file_uuid,
+            bigwig_dataset,
+            intervals,
+            binsize,
+            side,
         )
-    else:
-        full_size_array = worker_funcs._do_stackup_fixed_size(
-            bigwig_dataset.file_path, regions, window_size, binsize, region_side
+        for derived_intervals, derived_binsize in derivable_stackups:
+            current_app.logger.debug(
+                f"      {bigwig_dataset_id}-{derived_intervals.id}-{derived_binsize} => Deriving stackup from {intervals_id}-{binsize}..."
+            )
+            derived_uuid = uuid.uuid4().hex
+            derived_array = worker_funcs._derive_stackup(
+                full_size_array,
+                window_size,
+                binsize,
+                derived_intervals.windowsize,
+                derived_binsize,
+                output_path=os.path.join(
+                    current_app.config["UPLOAD_DIR"], derived_uuid + ".npy"
+                ),
+            )
+            _write_stackup_results(
+                derived_array,
+                np.load(derived_intervals.file_path_sub_sample_index),
+                derived_uuid,
+                bigwig_dataset,
+                derived_intervals,
+                derived_binsize,
+                side,
+            )
+    db.session.commit()
+    for derived_intervals_id, derived_binsize in separate_stackups:
+        stackup_pipeline_step(
+            bigwig_dataset_id, derived_intervals_id, derived_binsize, region_side
         )
-        downsampled_array = worker_funcs._do_stackup_fixed_size(
-            bigwig_dataset.file_path, regions_small, window_size, binsize, region_side
+    current_app.logger.info(
+        f"       {bigwig_dataset_id}-{intervals_id}-{binsize} => Success!"
+    )
+
+
+def collection_stackup_pipeline_step(
+    bigwig_dataset_ids, intervals_id, binsize, region_side=None, max_progress=100
+):
+    """Performs stackups of multiple bigwig datasets, e.g. the features of a collection, over the
+    intervals provided with the indicated binsize. Regions are loaded once and the bigwigs are read
+    in parallel by STACKUP_PROCESSES processes. Results of each dataset are added to the database as
+    soon as its stackup is finished and task progress is set to the fraction of finished datasets
+    of max_progress."""
+    current_app.logger.info(
+        f"  Doing stackups on bigwigs {bigwig_dataset_ids} with intervals {intervals_id} on binsize {binsize} with region_side: {region_side}"
+    )
+    intervals = Intervals.query.get(intervals_id)
+    bigwig_datasets = {
+        dataset_id: Dataset.query.get(dataset_id) for dataset_id in bigwig_dataset_ids
+    }
+    # load bedfile
+    current_app.logger.debug(f"      {intervals_id}-{binsize} => Loading regions...")
+    regions = pd.read_csv(intervals.source_dataset.file_path, sep="\t", header=None)
+    sub_sample_index = np.load(intervals.file_path_sub_sample_index)
+    # full size stackups are written to memory-mapped files by the stackup processes
+    sides = region_side if isinstance(region_side, list) else [region_side]
+    file_uuids = {
+        dataset_id: [uuid.uuid4().hex for _ in sides]
+        for dataset_id in bigwig_dataset_ids
+    }
+    stackup_arguments = [
+        (
+            dataset_id,
+            bigwig_datasets[dataset_id].file_path,
+            [
+                os.path.join(current_app.config["UPLOAD_DIR"], file_uuid + ".npy")
+                for file_uuid in file_uuids[dataset_id]
+            ],
+        )
+        for dataset_id in bigwig_dataset_ids
+    ]
+    # processes are forked to inherit the application context
+    worker_funcs._dispose_database_connections()
+    with multiprocessing.get_context("fork").Pool(
+        min(current_app.config["STACKUP_PROCESSES"], len(stackup_arguments))
+    ) as pool:
+        finished_stackups = pool.imap_unordered(
+            partial(
+                _do_collection_stackup,
+                regions,
+                intervals.windowsize,
+                binsize,
+                region_side,
+            ),
+            stackup_arguments,
+        )
+        for finished_number, dataset_id in enumerate(finished_stackups, start=1):
+            for side, file_uuid in zip(sides, file_uuids[dataset_id]):
+                full_size_array = np.load(
+                    os.path.join(current_app.config["UPLOAD_DIR"], file_uuid + ".npy"),
+                    mmap_mode="r",
+                )
+                _write_stackup_results(
+                    full_size_array,
+                    sub_sample_index,
+                    file_uuid,
+                    bigwig_datasets[dataset_id],
+                    intervals,
+                    binsize,
+                    side,
+                )
+            db.session.commit()
+            current_app.logger.info(
+                f"       {dataset_id}-{intervals_id}-{binsize} => Success!"
+            )
+            set_task_progress(
+                int(max_progress * finished_number / len(stackup_arguments))
+            )
+
+
+def _do_collection_stackup(
+    regions, window_size, binsize, region_side, stackup_arguments
+):
+    """Does stackup of a single bigwig dataset of a collection stackup into the
+    memory-mapped files at output_paths. Returns the id of the dataset."""
+    dataset_id, bigwig_filepath, output_paths = stackup_arguments
+    _do_stackup(
+        bigwig_filepath,
+        regions,
+        window_size,
+        binsize,
+        region_side,
+        output_paths if isinstance(region_side, list) else output_paths[0],
+    )
+    return dataset_id
+
+
+def _do_stackup(
+    bigwig_filepath, regions, window_size, binsize, region_side, output_path
+):
+    """Dispatches stackup of bigwig_filepath over regions to the worker function
+    for fixed size or variably sized regions."""
+    if window_size is None:
+        return worker_funcs._do_stackup_variable_size(
+            bigwig_filepath,
+            regions,
+            binsize,
+            region_side,
+            output_path=output_path,
         )
-    # save full length array to file
+    return worker_funcs._do_stackup_fixed_size(
+        bigwig_filepath,
+        regions,
+        window_size,
+        binsize,
+        region_side,
+        output_path=output_path,
+    )
+
+
+def _write_stackup_results(
+    full_size_array,
+    sub_sample_index,
+    file_uuid,
+    bigwig_dataset,
+    intervals,
+    binsize,
+    region_side,
+):
+    """Writes line, downsampled stackup and summary next to the full size stackup at
+    file_uuid.npy in UPLOAD_DIR and adds them to the database session without
+    committing. The downsampled stackup consists of the rows of full_size_array
+    at sub_sample_index."""
+    file_path = os.path.join(current_app.config["UPLOAD_DIR"], file_uuid + ".npy")
+    # save line array to file
     current_app.logger.debug(
-        f"      {bigwig_dataset_id}-{intervals_id}-{binsize} => Writing output..."
+        f"      {bigwig_dataset.id}-{intervals.id}-{binsize} => Writing output..."
     )
-    file_uuid = uuid.uuid4().hex
-    file_name = file_uuid + ".npy"
     file_name_line = file_uuid + "_line.npy"
-    file_path = os.path.join(current_app.config["UPLOAD_DIR"], file_name)
     file_path_line = os.path.join(current_app.config["UPLOAD_DIR"], file_name_line)
-    np.save(file_path, full_size_array)
-    line_array = np.nanmean(full_size_array, axis=0)
+    line_array = worker_funcs._average_stackup(full_size_array)
     np.save(file_path_line, line_array)
+    response_payloads.write_payload(
+        response_payloads.get_array_payload(line_array), file_path_line
+    )
     # save small array to file
     file_name_small = file_uuid + "_small.npy"
     file_path_small = os.path.join(current_app.config["UPLOAD_DIR"], file_name_small)
-    np.save(file_path_small, downsampled_array)
+    small_array = full_size_array[sub_sample_index]
+    np.save(file_path_small, small_array)
+    response_payloads.write_payload(
+        response_payloads.get_array_payload(small_array), file_path_small
+    )
+    # save summary that 1d-embeddings are based on so that they don't read the full stackup
+    np.save(
+        os.path.join(current_app.config["UPLOAD_DIR"], file_uuid + "_summary.npy"),
+        worker_funcs._summarize_stackup(full_size_array, intervals.windowsize, binsize),
+    )
     # add to database
     current_app.logger.debug(
-        f"      {bigwig_dataset_id}-{intervals_id}-{binsize} => Adding database entry..."
+        f"      {bigwig_dataset.id}-{intervals.id}-{binsize} => Adding database entry..."
     )
     worker_funcs._add_stackup_db(
         file_path,
@@ -225,17 +517,21 @@ def stackup_pipeline_step(bigwig_dataset_id, intervals_id, binsize, region_side=
         intervals.id,
         bigwig_dataset.id,
         region_side,
+        commit=False,
     )
     worker_funcs._add_line_db(
-        file_path_line, binsize, intervals.id, bigwig_dataset.id, region_side
-    )
-    current_app.logger.info(
-        f"       {bigwig_dataset_id}-{intervals_id}-{binsize} => Success!"
+        file_path_line,
+        binsize,
+        intervals.id,
+        bigwig_dataset.id,
+        region_side,
+        commit=False,
     )
 
 
 def enrichment_pipeline_step(collection_id, intervals_id, binsize, region_side=None):
-    """Pipeline step to perform enrichment analysis"""
+    """Pipeline step to perform enrichment analysis. region_side can be a list of
+    anchors of 2d regions, in which case the target list is prepared once."""
     current_app.logger.info(
         f"Doing enrichment analysis with collection {collection_id} on intervals {intervals_id} with binsize {binsize} with region_side: {region_side}"
     )
@@ -252,18 +548,24 @@ def enrichment_pipeline_step(collection_id, intervals_id, binsize, region_side=N
         stacked = worker_funcs._do_enrichment_calculations_fixed_size(
             collection_id, window_size, binsize, regions_path, region_side=region_side
         )
+    if not isinstance(region_side, list):
+        stacked = {region_side: stacked}
     # write output
     current_app.logger.debug(
         f"      {collection_id}-{intervals_id}-{binsize} => Writing output..."
     )
-    file_path = os.path.join(
-        current_app.config["UPLOAD_DIR"], uuid.uuid4().hex + ".npy"
-    )
-    np.save(file_path, stacked)
-    # add to database
-    worker_funcs._add_association_data_to_db(
-        file_path, binsize, intervals_id, collection_id, region_side=region_side
-    )
+    for side, side_stacked in stacked.items():
+        file_path = os.path.join(
+            current_app.config["UPLOAD_DIR"], uuid.uuid4().hex + ".npy"
+        )
+        np.save(file_path, side_stacked)
+        response_payloads.write_payload(
+            response_payloads.get_array_payload(side_stacked), file_path
+        )
+        # add to database
+        worker_funcs._add_association_data_to_db(
+            file_path, binsize, intervals_id, collection_id, region_side=side
+        )
     current_app.logger.info(
         f"      {collection_id}-{intervals_id}-{binsize} => Success!"
     )
@@ -271,7 +573,8 @@ def enrichment_pipeline_step(collection_id, intervals_id, binsize, region_side=N
 
 def embedding_1d_pipeline_step(collection_id, intervals_id, binsize, region_side=None):
     """Performs embedding on each binsize-sized bin of the window specified in intervals_id using
-    the features in collection_id"""
+    the features in collection_id. region_side can be a list of anchors of 2d regions, in which
+    case the stackups of all anchors are loaded at once and each anchor is embedded."""
     current_app.logger.info(
         f"Doing 1d-embedding with collection {collection_id} on intervals {intervals_id} with binsize {binsize} with region_side: {region_side}"
     )
@@ -285,47 +588,61 @@ def embedding_1d_pipeline_step(collection_id, intervals_id, binsize, region_side
         embedding_results = worker_funcs._do_embedding_1d_fixed_size(
             collection_id, intervals_id, binsize, region_side=region_side
         )
-    # write output for embedding
-    current_app.logger.debug(
-        f"      {collection_id}-{intervals_id}-{binsize} => Writing output..."
-    )
-    file_path_embedding = os.path.join(
-        current_app.config["UPLOAD_DIR"], uuid.uuid4().hex + "_embedding.npy"
-    )
-    np.save(file_path_embedding, embedding_results["embedding"])
-    # write output for feature_overlay
-    file_path_features = os.path.join(
-        current_app.config["UPLOAD_DIR"], uuid.uuid4().hex + "_features.npy"
-    )
-    np.save(file_path_features, embedding_results["features"])
-    # write output for clusters
-    for size in ["small", "large"]:
-        file_path_cluster_ids = os.path.join(
-            current_app.config["UPLOAD_DIR"],
-            uuid.uuid4().hex + f"_cluster_ids_{size}.npy",
-        )
-        np.save(
-            file_path_cluster_ids, embedding_results["clusters"][size]["cluster_ids"]
-        )
-        # write output for average_features
-        file_path_average_values = os.path.join(
-            current_app.config["UPLOAD_DIR"],
-            uuid.uuid4().hex + f"_average_values_{size}.npy",
-        )
-        np.save(
-            file_path_average_values,
-            embedding_results["clusters"][size]["average_values"],
-        )
-        filepaths = {
-            "embedding": file_path_embedding,
-            "cluster_ids": file_path_cluster_ids,
-            "average_values": file_path_average_values,
-            "features": file_path_features,
-        }
-        # add to database
-        worker_funcs._add_embedding_1d_to_db(
-            filepaths, binsize, intervals.id, collection_id, size, region_side
-        )
+    if not isinstance(region_side, list):
+        embedding_results = {region_side: embedding_results}
+    for side, side_results in embedding_results.items():
+        # write output for embedding
+        current_app.logger.debug(
+            f"      {collection_id}-{intervals_id}-{binsize} => Writing output..."
+        )
+        file_path_embedding = os.path.join(
+            current_app.config["UPLOAD_DIR"], uuid.uuid4().hex + "_embedding.npy"
+        )
+        np.save(file_path_embedding, side_results["embedding"])
+        # write output for feature_overlay
+        file_path_features = os.path.join(
+            current_app.config["UPLOAD_DIR"], uuid.uuid4().hex + "_features.npy"
+        )
+        np.save(file_path_features, side_results["features"])
+        response_payloads.write_column_payloads(
+            side_results["features"], file_path_features
+        )
+        # write output for clusters
+        for size in ["small", "large"]:
+            file_path_cluster_ids = os.path.join(
+                current_app.config["UPLOAD_DIR"],
+                uuid.uuid4().hex + f"_cluster_ids_{size}.npy",
+            )
+            np.save(
+                file_path_cluster_ids, side_results["clusters"][size]["cluster_ids"]
+            )
+            # write output for average_features
+            file_path_average_values = os.path.join(
+                current_app.config["UPLOAD_DIR"],
+                uuid.uuid4().hex + f"_average_values_{size}.npy",
+            )
+            np.save(
+                file_path_average_values,
+                side_results["clusters"][size]["average_values"],
+            )
+            response_payloads.write_payload(
+                response_payloads.get_embedding_payload(
+                    side_results["embedding"],
+                    side_results["clusters"][size]["cluster_ids"],
+                    side_results["clusters"][size]["average_values"],
+                ),
+                file_path_cluster_ids,
+            )
+            filepaths = {
+                "embedding": file_path_embedding,
+                "cluster_ids": file_path_cluster_ids,
+                "average_values": file_path_average_values,
+                "features": file_path_features,
+            }
+            # add to database
+            worker_funcs._add_embedding_1d_to_db(
+                filepaths, binsize, intervals.id, collection_id, size, side
+            )
     current_app.logger.info(
         f"      {collection_id}-{intervals_id}-{binsize} => Success!"
     )
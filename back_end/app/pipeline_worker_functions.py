@@ -4,6 +4,8 @@ changes"""
 import os
 import logging
 import uuid
+import multiprocessing
+from functools import partial
 import pandas as pd
 import numpy as np
 import umap
@@ -14,13 +16,23 @@ import cooler
 import bbi
 import bioframe as bf
 from sklearn.impute import SimpleImputer
-from sklearn.cluster import KMeans
 from sklearn.preprocessing import StandardScaler
-import pylola
+from sqlalchemy.pool import StaticPool
 from . import lib as hicognition
-from .lib import io_helpers, interval_operations, feature_extraction
+from .lib import (
+    io_helpers,
+    interval_operations,
+    feature_extraction,
+    pileup_operations,
+    enrichment_operations,
+    clustering,
+)
 from .lib.utils import get_optimal_binsize
 from . import db
+from . import expected_cache
+from . import response_payloads
+from . import enrichment_cache
+from . import embedding_cache
 from .models import (
     Assembly,
     AverageIntervalData,
@@ -28,16 +40,28 @@ from .models import (
     IndividualIntervalData,
     AssociationIntervalData,
     EmbeddingIntervalData,
-    ObsExp,
 )
 
 # get logger
 log = logging.getLogger("rq.worker")
 
+# data of the current enrichment job that is shared with the processes of its pool
+_enrichment_data = None
+
 
 # Data handling
 
 
+def _get_window_diagonal_offsets(windows, binsize, dimension):
+    """Returns the distance in bins between the two anchors of each pileup window.
+    This is 0 for 1d regions since their windows are centered on the main diagonal."""
+    if dimension == "1d":
+        return np.zeros(len(windows), dtype=int)
+    return (windows["start2"].values // int(binsize)) - (
+        windows["start1"].values // int(binsize)
+    )
+
+
 def _do_pileup_fixed_size(
     cooler_dataset,
     window_size,
@@ -48,8 +72,154 @@ def _do_pileup_fixed_size(
     collapse=True,
     dimension="1d",
 ):
-    """do pileup with subsequent averaging for regions with a fixed size"""
-    # load regions and search for center, dependent on dimensions of region
+    """do pileup with subsequent averaging for regions with a fixed size.
+    If pileup_type is a list of pileup types (e.g. ["ICCF", "Obs/Exp"]), every window is fetched
+    only once from the cooler and Obs/Exp windows are derived from the balanced windows. In this
+    case, a dictionary mapping pileup types to pileup arrays is returned."""
+    regions = _load_regions_fixed_size(regions_path, dimension)
+    return _pileup_regions_fixed_size(
+        cooler_dataset,
+        window_size,
+        binsize,
+        regions,
+        arms,
+        pileup_type,
+        collapse=collapse,
+        dimension=dimension,
+    )
+
+
+def _iterate_pileup_fixed_size(
+    cooler_dataset,
+    window_size,
+    binsize,
+    regions_path,
+    arms,
+    pileup_types,
+    dimension="1d",
+):
+    """Does pileup for consecutive chunks of regions with a fixed size and yields
+    dictionaries mapping each of pileup_types to the (n, n, chunk regions) stack of
+    the chunk. The size of chunks is set via PILEUP_CHUNK_PIXELS."""
+    regions = _load_regions_fixed_size(regions_path, dimension)
+    chunk_size = _get_pileup_chunk_size((2 * window_size) // binsize)
+    for start in range(0, len(regions), chunk_size):
+        yield _pileup_regions_fixed_size(
+            cooler_dataset,
+            window_size,
+            binsize,
+            regions.iloc[start : start + chunk_size].reset_index(drop=True),
+            arms,
+            list(pileup_types),
+            collapse=False,
+            dimension=dimension,
+        )
+
+
+def _iterate_pileup_fixed_size_nested(
+    cooler_dataset,
+    window_sizes,
+    binsize,
+    regions_path,
+    arms,
+    pileup_types,
+    dimension="1d",
+):
+    """Does pileup for consecutive chunks of regions at the largest of window_sizes and
+    crops the windows of the smaller window_sizes from it, since all windows of a region
+    share the same center. Yields dictionaries mapping each of window_sizes to a dictionary
+    that maps pileup_types to the (n, n, chunk regions) stack of the chunk. Regions whose
+    smaller window can be assigned to a chromosome arm, but whose largest window cannot,
+    are fetched separately."""
+    regions = _load_regions_fixed_size(regions_path, dimension)
+    largest_window_size = max(window_sizes)
+    chunk_size = _get_pileup_chunk_size((2 * largest_window_size) // binsize)
+    for start in range(0, len(regions), chunk_size):
+        chunk = regions.iloc[start : start + chunk_size].reset_index(drop=True)
+        largest_windows = _pileup_regions_fixed_size(
+            cooler_dataset,
+            largest_window_size,
+            binsize,
+            chunk,
+            arms,
+            list(pileup_types),
+            collapse=False,
+            dimension=dimension,
+        )
+        largest_assigned = (
+            ~_assign_pileup_windows(
+                largest_window_size, binsize, chunk, arms, dimension
+            )
+            .region.isnull()
+            .values
+        )
+        output = {}
+        for window_size in window_sizes:
+            if window_size == largest_window_size:
+                output[window_size] = largest_windows
+                continue
+            # windows are centered, crop the same number of bins from each side
+            offset = (largest_window_size - window_size) // binsize
+            bin_number = (2 * window_size) // binsize
+            output[window_size] = {
+                pileup_type: np.array(
+                    largest_windows[pileup_type][
+                        offset : offset + bin_number, offset : offset + bin_number, :
+                    ]
+                )
+                for pileup_type in pileup_types
+            }
+            assigned = (
+                ~_assign_pileup_windows(window_size, binsize, chunk, arms, dimension)
+                .region.isnull()
+                .values
+            )
+            missing = assigned & ~largest_assigned
+            if np.any(missing):
+                missing_windows = _pileup_regions_fixed_size(
+                    cooler_dataset,
+                    window_size,
+                    binsize,
+                    chunk[missing].reset_index(drop=True),
+                    arms,
+                    list(pileup_types),
+                    collapse=False,
+                    dimension=dimension,
+                )
+                for pileup_type in pileup_types:
+                    output[window_size][pileup_type][..., missing] = missing_windows[
+                        pileup_type
+                    ]
+        yield output
+
+
+def _assign_pileup_windows(window_size, binsize, regions, arms, dimension):
+    """Assigns pileup windows of regions to chromosome arms. Windows
+    that cannot be assigned have a null region."""
+    if dimension == "1d":
+        return HT.assign_regions(
+            window_size, int(binsize), regions["chrom"], regions["pos"], arms
+        )
+    return HT.assign_regions_2d(
+        window_size,
+        int(binsize),
+        regions["chrom1"],
+        regions["pos1"],
+        regions["chrom2"],
+        regions["pos2"],
+        arms,
+    )
+
+
+def _get_pileup_chunk_size(bin_number):
+    """Returns the number of regions whose pileup windows with bin_number bins
+    are held in memory at once."""
+    return max(1, current_app.config["PILEUP_CHUNK_PIXELS"] // (bin_number**2))
+
+
+def _load_regions_fixed_size(regions_path, dimension):
+    """Loads regions with a fixed size and searches for their center,
+    dependent on dimensions of regions"""
     if dimension == "1d":
         regions = pd.read_csv(regions_path, sep="\t", header=None)
         regions = regions.rename(columns={0: "chrom", 1: "start", 2: "end"})
@@ -68,64 +238,94 @@ def _do_pileup_fixed_size(
         )
         regions.loc[:, "pos1"] = (regions["start1"] + regions["end1"]) // 2
         regions.loc[:, "pos2"] = (regions["start2"] + regions["end2"]) // 2
+    return regions
+
+
+def _pileup_regions_fixed_size(
+    cooler_dataset,
+    window_size,
+    binsize,
+    regions,
+    arms,
+    pileup_type,
+    collapse=True,
+    dimension="1d",
+):
+    """do pileup of the loaded regions with a fixed size. See _do_pileup_fixed_size."""
+    combined = not isinstance(pileup_type, str)
+    output_shape = (2 * window_size) // binsize
     # open cooler and check whether resolution is defined, if not return empty array
     try:
         cooler_file = cooler.Cooler(
             cooler_dataset.file_path + f"::/resolutions/{binsize}"
         )
     except KeyError:
-        output_shape = (2 * window_size) // binsize
-        if collapse:
-            return np.full((output_shape, output_shape), np.nan)
-        return np.full((output_shape, output_shape, len(regions)), np.nan)
+        if combined:
+            return {
+                entry: _get_empty_pileup(output_shape, len(regions), collapse)
+                for entry in pileup_type
+            }
+        return _get_empty_pileup(output_shape, len(regions), collapse)
     # assing regions to support
-    if dimension == "1d":
-        pileup_windows = HT.assign_regions(
-            window_size, int(binsize), regions["chrom"], regions["pos"], arms
-        )
-    else:
-        pileup_windows = HT.assign_regions_2d(
-            window_size,
-            int(binsize),
-            regions["chrom1"],
-            regions["pos1"],
-            regions["chrom2"],
-            regions["pos2"],
-            arms,
-        )
+    pileup_windows = _assign_pileup_windows(
+        window_size, binsize, regions, arms, dimension
+    )
     # create placeholder with nans
     good_indices = ~pileup_windows.region.isnull().values
     pileup_windows = pileup_windows.dropna()
-    # do pileup
-    if pileup_type == "Obs/Exp":
-        # check whether obs_exp exists
-        if (
-            obs_exp_entry := cooler_dataset.obs_exp.filter(
-                ObsExp.binsize == binsize
-            ).first()
-        ) is not None:
-            # binsize exists
-            expected = pd.read_csv(obs_exp_entry.filepath)
-        else:
+    if combined:
+        if len(pileup_windows) == 0:
+            # no region could be assigned to a chromosome arm
+            return {
+                entry: _get_empty_pileup(output_shape, len(regions), collapse)
+                for entry in pileup_type
+            }
+        # fetch balanced windows once and derive all pileup types from them
+        try:
+            iccf_array = HT.do_pileup_iccf(
+                cooler_file,
+                pileup_windows,
+                proc=current_app.config["PILEUP_PROCESSES"],
+                collapse=False,
+            )
+        # catches ValueError: No column 'bins/weight'found
+        except ValueError:
+            return {
+                entry: _get_empty_pileup(output_shape, len(regions), collapse)
+                for entry in pileup_type
+            }
+        pileup_arrays = {"ICCF": iccf_array}
+        if "Obs/Exp" in pileup_type:
             try:
-                expected = HT.get_expected(
-                    cooler_file, arms, proc=current_app.config["OBS_EXP_PROCESSES"]
+                expected = expected_cache.get_expected(
+                    cooler_dataset, cooler_file, binsize, arms
+                )
+                pileup_arrays["Obs/Exp"] = pileup_operations.obs_exp_from_iccf(
+                    iccf_array,
+                    pileup_windows["region"],
+                    expected,
+                    _get_window_diagonal_offsets(pileup_windows, binsize, dimension),
                 )
             # Catches KeyError: 'Balancing weight {weight_name} not found!'
             except KeyError:
-                output_shape = (2 * window_size) // binsize
-                if collapse:
-                    return np.full((output_shape, output_shape), np.nan)
-                return np.full((output_shape, output_shape, len(regions)), np.nan)
-            file_path = os.path.join(
-                current_app.config["UPLOAD_DIR"], uuid.uuid4().hex + ".csv"
+                pileup_arrays["Obs/Exp"] = None
+        return {
+            entry: _get_empty_pileup(output_shape, len(regions), collapse)
+            if pileup_arrays[entry] is None
+            else _fill_pileup_output(
+                pileup_arrays[entry], good_indices, len(regions), collapse
             )
-            expected.to_csv(file_path, index=False)
-            new_obs_exp_ds = ObsExp(
-                dataset_id=cooler_dataset.id, binsize=binsize, filepath=file_path
+            for entry in pileup_type
+        }
+    # do pileup
+    if pileup_type == "Obs/Exp":
+        try:
+            expected = expected_cache.get_expected(
+                cooler_dataset, cooler_file, binsize, arms
             )
-            db.session.add(new_obs_exp_ds)
-            db.session.commit()
+        # Catches KeyError: 'Balancing weight {weight_name} not found!'
+        except KeyError:
+            return _get_empty_pileup(output_shape, len(regions), collapse)
         pileup_array = HT.do_pileup_obs_exp(
             cooler_file,
             expected,
@@ -143,22 +343,49 @@ def _do_pileup_fixed_size(
             )
         # catches ValueError: No column 'bins/weight'found
         except ValueError:
-            output_shape = (2 * window_size) // binsize
-            if collapse:
-                return np.full((output_shape, output_shape), np.nan)
-            return np.full((output_shape, output_shape, len(regions)), np.nan)
+            return _get_empty_pileup(output_shape, len(regions), collapse)
     # put togehter output if collapse is false
-    # DEBUG TODO
     if collapse is False:
-        pileup_shape = pileup_array[..., 0].shape[0]
-        output = np.empty((pileup_shape, pileup_shape, len(regions)))
-        output.fill(np.nan)
-        output[..., good_indices] = pileup_array
-    else:
-        output = pileup_array
+        return _fill_pileup_output(pileup_array, good_indices, len(regions), False)
+    return pileup_array
+
+
+def _get_empty_pileup(output_shape, region_number, collapse):
+    """Returns pileup output filled with nans"""
+    if collapse:
+        return np.full((output_shape, output_shape), np.nan)
+    return np.full((output_shape, output_shape, region_number), np.nan)
+
+
+def _fill_pileup_output(pileup_array, good_indices, region_number, collapse):
+    """Puts the (n, n, good regions) pileup_array into an output stack that has
+    an entry for every region. Regions that could not be assigned are filled with nans.
+    Averages the stack if collapse is True."""
+    pileup_shape = pileup_array.shape[0]
+    output = np.empty((pileup_shape, pileup_shape, region_number))
+    output.fill(np.nan)
+    output[..., good_indices] = pileup_array
+    if collapse:
+        return np.nanmean(output, axis=2)
     return output
 
 
+def _resize_windows(pileup_arrays, bin_number):
+    """Resizes windows of different sizes to (bin_number, bin_number) and
+    stacks them. Empty windows are filled with nans."""
+    resized_arrays = []
+    for array in pileup_arrays:
+        # replace inf with nan
+        array[np.isinf(array)] = np.nan
+        if len(array) != 0:
+            resized_arrays.append(resize(array, (bin_number, bin_number)))
+        else:
+            empty = np.empty((bin_number, bin_number))
+            empty[:] = np.nan
+            resized_arrays.append(empty)
+    return np.stack(resized_arrays, axis=2)
+
+
 def _do_pileup_variable_size(
     cooler_dataset,
     binsize,
@@ -168,8 +395,53 @@ def _do_pileup_variable_size(
     collapse=True,
     dimension="1d",
 ):
-    """do pileup with subsequent averaging for regions with a variable size"""
-    # load regions
+    """do pileup with subsequent averaging for regions with a variable size.
+    If pileup_type is a list of pileup types (e.g. ["ICCF", "Obs/Exp"]), every window is fetched
+    only once from the cooler and Obs/Exp windows are derived from the balanced windows. In this
+    case, a dictionary mapping pileup types to pileup arrays is returned."""
+    regions = _load_regions_variable_size(regions_path, dimension)
+    bin_number_expanded, cooler_binsize = _get_variable_size_binsizes(regions, binsize)
+    return _pileup_regions_variable_size(
+        cooler_dataset,
+        cooler_binsize,
+        bin_number_expanded,
+        regions,
+        arms,
+        pileup_type,
+        collapse=collapse,
+        dimension=dimension,
+    )
+
+
+def _iterate_pileup_variable_size(
+    cooler_dataset,
+    binsize,
+    regions_path,
+    arms,
+    pileup_types,
+    dimension="1d",
+):
+    """Does pileup for consecutive chunks of regions with a variable size and yields
+    dictionaries mapping each of pileup_types to the (n, n, chunk regions) stack of
+    the chunk. The cooler binsize is chosen based on all regions."""
+    regions = _load_regions_variable_size(regions_path, dimension)
+    bin_number_expanded, cooler_binsize = _get_variable_size_binsizes(regions, binsize)
+    chunk_size = _get_pileup_chunk_size(bin_number_expanded)
+    for start in range(0, len(regions), chunk_size):
+        yield _pileup_regions_variable_size(
+            cooler_dataset,
+            cooler_binsize,
+            bin_number_expanded,
+            regions.iloc[start : start + chunk_size].reset_index(drop=True),
+            arms,
+            list(pileup_types),
+            collapse=False,
+            dimension=dimension,
+        )
+
+
+def _load_regions_variable_size(regions_path, dimension):
+    """Loads regions with a variable size"""
     regions = pd.read_csv(regions_path, sep="\t", header=None)
     if dimension == "1d":
         regions = regions.rename(columns={0: "chrom", 1: "start", 2: "end"})
@@ -184,7 +456,12 @@ def _do_pileup_variable_size(
                 5: "end2",
             }
         )
-    # search for optimal binsize
+    return regions
+
+
+def _get_variable_size_binsizes(regions, binsize):
+    """Returns the number of bins of expanded regions and the
+    optimal cooler binsize to fetch them."""
     bin_number_expanded = interval_operations.get_bin_number_for_expanded_intervals(
         binsize, current_app.config["VARIABLE_SIZE_EXPANSION_FACTOR"]
     )
@@ -192,45 +469,76 @@ def _do_pileup_variable_size(
         regions, bin_number_expanded, current_app.config["PREPROCESSING_MAP"]
     )
     log.info(f"      Optimal binsize is {cooler_binsize}")
+    return bin_number_expanded, cooler_binsize
+
+
+def _pileup_regions_variable_size(
+    cooler_dataset,
+    cooler_binsize,
+    bin_number_expanded,
+    regions,
+    arms,
+    pileup_type,
+    collapse=True,
+    dimension="1d",
+):
+    """do pileup of the loaded regions with a variable size at cooler_binsize.
+    See _do_pileup_variable_size."""
+    combined = not isinstance(pileup_type, str)
     if cooler_binsize is None:
-        if collapse:
-            return np.full((bin_number_expanded, bin_number_expanded), np.nan)
-        return np.full((bin_number_expanded, bin_number_expanded, len(regions)), np.nan)
+        if combined:
+            return {
+                entry: _get_empty_pileup(bin_number_expanded, len(regions), collapse)
+                for entry in pileup_type
+            }
+        return _get_empty_pileup(bin_number_expanded, len(regions), collapse)
     # open cooler and check whether resolution is defined, if not return empty array
     try:
         cooler_file = cooler.Cooler(
             cooler_dataset.file_path + f"::/resolutions/{cooler_binsize}"
         )
     except KeyError:
-        if collapse:
-            return np.full((bin_number_expanded, bin_number_expanded), np.nan)
-        return np.full((bin_number_expanded, bin_number_expanded, len(regions)), np.nan)
+        if combined:
+            return {
+                entry: _get_empty_pileup(bin_number_expanded, len(regions), collapse)
+                for entry in pileup_type
+            }
+        return _get_empty_pileup(bin_number_expanded, len(regions), collapse)
     # expand regions
     pileup_regions = interval_operations.expand_regions(
         regions, current_app.config["VARIABLE_SIZE_EXPANSION_FACTOR"]
     )
-    if pileup_type == "Obs/Exp":
-        # check whether obs_exp exists
-        if (
-            obs_exp_entry := cooler_dataset.obs_exp.filter(
-                ObsExp.binsize == cooler_binsize
-            ).first()
-        ) is not None:
-            # binsize exists
-            expected = pd.read_csv(obs_exp_entry.filepath)
-        else:
-            expected = HT.get_expected(
-                cooler_file, arms, proc=current_app.config["OBS_EXP_PROCESSES"]
-            )
-            file_path = os.path.join(
-                current_app.config["UPLOAD_DIR"], uuid.uuid4().hex + ".csv"
+    # get regions that can be assigned to chromosome arms
+    assigned_regions = HT._assign_supports(pileup_regions, bf.parse_regions(arms))
+    good_indices = ~assigned_regions.region.isnull().values
+    if combined:
+        if not np.any(good_indices):
+            # no region could be assigned to a chromosome arm
+            return {
+                entry: _get_empty_pileup(bin_number_expanded, len(regions), collapse)
+                for entry in pileup_type
+            }
+        # fetch balanced windows once and derive all pileup types from them
+        iccf_arrays = HT.extract_windows_different_sizes_iccf(
+            pileup_regions, arms, cooler_file
+        )
+        pileup_arrays = {"ICCF": iccf_arrays}
+        if "Obs/Exp" in pileup_type:
+            expected = expected_cache.get_expected(
+                cooler_dataset, cooler_file, cooler_binsize, arms
             )
-            expected.to_csv(file_path, index=False)
-            new_obs_exp_ds = ObsExp(
-                dataset_id=cooler_dataset.id, binsize=cooler_binsize, filepath=file_path
+            pileup_arrays["Obs/Exp"] = pileup_operations.obs_exp_from_iccf(
+                iccf_arrays,
+                assigned_regions.region[good_indices],
+                expected,
+                _get_window_diagonal_offsets(
+                    pileup_regions[good_indices], cooler_binsize, dimension
+                ),
             )
-            db.session.add(new_obs_exp_ds)
-            db.session.commit()
+    elif pileup_type == "Obs/Exp":
+        expected = expected_cache.get_expected(
+            cooler_dataset, cooler_file, cooler_binsize, arms
+        )
         pileup_arrays = HT.extract_windows_different_sizes_obs_exp(
             pileup_regions, arms, cooler_file, expected
         )
@@ -238,62 +546,29 @@ def _do_pileup_variable_size(
         pileup_arrays = HT.extract_windows_different_sizes_iccf(
             pileup_regions, arms, cooler_file
         )
-    # resize to fit
-    resized_arrays = []
-    for array in pileup_arrays:
-        # replace inf with nan
-        array[np.isinf(array)] = np.nan
-        if len(array) != 0:
-            resized_arrays.append(
-                resize(array, (bin_number_expanded, bin_number_expanded))
+    # resize to fit and fill in bad indices
+    if combined:
+        return {
+            entry: _fill_pileup_output(
+                _resize_windows(pileup_arrays[entry], bin_number_expanded),
+                good_indices,
+                len(regions),
+                collapse,
             )
-        else:
-            empty = np.empty((bin_number_expanded, bin_number_expanded))
-            empty[:] = np.nan
-            resized_arrays.append(empty)
-    stacked = np.stack(resized_arrays, axis=2)
-    # fill in bad indices
-    assigned_regions = HT._assign_supports(pileup_regions, bf.parse_regions(arms))
-    good_indices = ~assigned_regions.region.isnull().values
-    pileup_shape = stacked[..., 0].shape[0]
-    output = np.empty((pileup_shape, pileup_shape, len(regions)))
-    output.fill(np.nan)
-    output[..., good_indices] = stacked
-    if collapse:
-        return np.nanmean(output, axis=2)
-    else:
-        return output
+            for entry in pileup_type
+        }
+    stacked = _resize_windows(pileup_arrays, bin_number_expanded)
+    return _fill_pileup_output(stacked, good_indices, len(regions), collapse)
 
 
 def _do_stackup_fixed_size(
-    bigwig_filepath, regions, window_size, binsize, region_side=None
+    bigwig_filepath, regions, window_size, binsize, region_side=None, output_path=None
 ):
-    if region_side is None:
-        regions = regions.rename(columns={0: "chrom", 1: "start", 2: "end"})
-    elif region_side == "left":
-        regions = regions.rename(
-            columns={
-                0: "chrom",
-                1: "start",
-                2: "end",
-                3: "chrom2",
-                4: "start2",
-                5: "end2",
-            }
-        )
-    elif region_side == "right":
-        regions = regions.rename(
-            columns={
-                0: "chrom1",
-                1: "start1",
-                2: "end1",
-                3: "chrom",
-                4: "start",
-                5: "end",
-            }
-        )
-    else:
-        raise ValueError(f"region_side parameter {region_side} not understood")
+    """Does stackup of bigwig over windows of window_size around the center of
+    regions. If region_side is a list of anchors of 2d regions, the anchors are
+    extracted in a single pass and a list of stackups per anchor is returned.
+    output_path is then a list of paths as well."""
+    regions = _get_stackup_anchors(regions, region_side)
     regions.loc[:, "pos"] = (regions["start"] + regions["end"]) // 2
     # construct stackup-regions: positions - windowsize until position + windowsize
     stackup_regions = pd.DataFrame(
@@ -305,10 +580,7 @@ def _do_stackup_fixed_size(
         }
     )
     # calculate number of bins
-    bin_number = int(window_size / binsize) * 2
-    # make target array
-    target_array = np.empty((len(stackup_regions), bin_number))
-    target_array.fill(np.nan)
+    bin_number = _get_stackup_bin_number(window_size, binsize)
     # filter stackup_regions for chromoosmes that are in bigwig
     chromosome_names = bbi.chromsizes(bigwig_filepath).keys()
     is_good_chromosome = [
@@ -328,21 +600,57 @@ def _do_stackup_fixed_size(
         ]
         good_chromosome_indices = np.arange(len(stackup_regions))[is_good_chromosome]
         good_regions = stackup_regions.iloc[good_chromosome_indices, :]
-    # extract data
-    stackup_array = bbi.stackup(
+    return _fill_stackup(
         bigwig_filepath,
-        chroms=good_regions["chrom"].to_list(),
-        starts=good_regions["start"].to_list(),
-        ends=good_regions["end"].to_list(),
-        bins=bin_number,
-        missing=np.nan,
+        good_regions,
+        good_chromosome_indices,
+        (len(stackup_regions), bin_number),
+        output_path,
+        part_number=len(region_side) if isinstance(region_side, list) else None,
     )
-    # put extracted data back in target array
-    target_array[good_chromosome_indices, :] = stackup_array
-    return target_array
 
 
-def _do_stackup_variable_size(bigwig_filepath, regions, binsize, region_side=None):
+def _do_stackup_variable_size(
+    bigwig_filepath, regions, binsize, region_side=None, output_path=None
+):
+    """Does stackup of bigwig over the expanded regions. If region_side is a list
+    of anchors of 2d regions, the anchors are extracted in a single pass and a list
+    of stackups per anchor is returned. output_path is then a list of paths as well."""
+    regions = _get_stackup_anchors(regions, region_side)
+    stackup_regions = interval_operations.expand_regions(
+        regions, current_app.config["VARIABLE_SIZE_EXPANSION_FACTOR"]
+    )
+    bin_number = _get_stackup_bin_number(None, binsize)
+    # filter stackup_regions for chromoosmes that are in bigwig
+    chromosome_names = bbi.chromsizes(bigwig_filepath).keys()
+    is_good_chromosome = [
+        True if chrom in chromosome_names else False
+        for chrom in stackup_regions["chrom"]
+    ]
+    good_chromosome_indices = np.arange(len(stackup_regions))[is_good_chromosome]
+    good_regions = stackup_regions.iloc[good_chromosome_indices, :]
+    return _fill_stackup(
+        bigwig_filepath,
+        good_regions,
+        good_chromosome_indices,
+        (len(stackup_regions), bin_number),
+        output_path,
+        part_number=len(region_side) if isinstance(region_side, list) else None,
+    )
+
+
+def _get_stackup_anchors(regions, region_side):
+    """Renames columns of regions such that the anchor at region_side is in chrom,
+    start and end. If region_side is a list of anchors, the anchors are concatenated
+    in the order of region_side."""
+    if isinstance(region_side, list):
+        return pd.concat(
+            [
+                _get_stackup_anchors(regions, side)[["chrom", "start", "end"]]
+                for side in region_side
+            ],
+            ignore_index=True,
+        )
     if region_side is None:
         regions = regions.rename(columns={0: "chrom", 1: "start", 2: "end"})
     elif region_side == "left":
@@ -369,121 +677,193 @@ def _do_stackup_variable_size(bigwig_filepath, regions, binsize, region_side=Non
         )
     else:
         raise ValueError(f"region_side parameter {region_side} not understood")
-    stackup_regions = interval_operations.expand_regions(
-        regions, current_app.config["VARIABLE_SIZE_EXPANSION_FACTOR"]
-    )
-    bin_number = interval_operations.get_bin_number_for_expanded_intervals(
-        binsize, current_app.config["VARIABLE_SIZE_EXPANSION_FACTOR"]
-    )
-    # make target array
-    target_array = np.empty((len(stackup_regions), bin_number))
-    target_array.fill(np.nan)
-    # filter stackup_regions for chromoosmes that are in bigwig
-    chromosome_names = bbi.chromsizes(bigwig_filepath).keys()
-    is_good_chromosome = [
-        True if chrom in chromosome_names else False
-        for chrom in stackup_regions["chrom"]
-    ]
-    good_chromosome_indices = np.arange(len(stackup_regions))[is_good_chromosome]
-    good_regions = stackup_regions.iloc[good_chromosome_indices, :]
-    # extract data
-    stackup_array = bbi.stackup(
-        bigwig_filepath,
-        chroms=good_regions["chrom"].to_list(),
-        starts=good_regions["start"].to_list(),
-        ends=good_regions["end"].to_list(),
-        bins=bin_number,
-        missing=np.nan,
+    return regions
+
+
+def _fill_stackup(
+    bigwig_filepath,
+    good_regions,
+    good_chromosome_indices,
+    shape,
+    output_path=None,
+    part_number=None,
+):
+    """Creates target array of shape (regions, bins) filled with nans and puts the
+    stackup of good_regions at good_chromosome_indices. If output_path is given, the
+    target array is a memory-mapped .npy file at output_path that is filled in chunks
+    of STACKUP_CHUNK_SIZE regions. Otherwise, it is held in memory. If part_number is
+    given, rows are split into a list of part_number target arrays of equal size, e.g.
+    one per anchor of 2d regions, and output_path is a list of paths."""
+    output_paths = [output_path] if part_number is None else output_path
+    if output_paths is None:
+        output_paths = [None] * part_number
+    part_size = shape[0] // len(output_paths)
+    if all(path is None for path in output_paths):
+        target_arrays = [np.empty((part_size, shape[1])) for _ in output_paths]
+        chunk_size = max(len(good_regions), 1)
+    else:
+        target_arrays = [
+            np.lib.format.open_memmap(
+                path, mode="w+", dtype=np.float64, shape=(part_size, shape[1])
+            )
+            for path in output_paths
+        ]
+        chunk_size = current_app.config["STACKUP_CHUNK_SIZE"]
+    for target_array in target_arrays:
+        target_array.fill(np.nan)
+    for start in range(0, max(len(good_regions), 1), chunk_size):
+        chunk = good_regions.iloc[start : start + chunk_size, :]
+        # extract data
+        stackup_array = bbi.stackup(
+            bigwig_filepath,
+            chroms=chunk["chrom"].to_list(),
+            starts=chunk["start"].to_list(),
+            ends=chunk["end"].to_list(),
+            bins=shape[1],
+            missing=np.nan,
+        )
+        # put extracted data back in target arrays
+        chunk_indices = good_chromosome_indices[start : start + chunk_size]
+        for part, target_array in enumerate(target_arrays):
+            in_part = chunk_indices // part_size == part
+            target_array[chunk_indices[in_part] - part * part_size, :] = stackup_array[
+                in_part
+            ]
+    for target_array in target_arrays:
+        if isinstance(target_array, np.memmap):
+            target_array.flush()
+    if part_number is None:
+        return target_arrays[0]
+    return target_arrays
+
+
+def _average_stackup(stackup_array):
+    """Returns the nan-aware average of stackup_array over regions. stackup_array
+    is read in chunks of STACKUP_CHUNK_SIZE regions so that memory-mapped stackups
+    are not loaded into memory at once."""
+    chunk_size = current_app.config["STACKUP_CHUNK_SIZE"]
+    accumulator = pileup_operations.PileupAccumulator(stackup_array.shape[1:])
+    for start in range(0, len(stackup_array), chunk_size):
+        accumulator.add(stackup_array[start : start + chunk_size])
+    return accumulator.average()[0]
+
+
+def _can_derive_stackup(window_size, binsize, target_window_size, target_binsize):
+    """Returns whether the stackup at target_window_size and target_binsize can be
+    derived from the stackup of the same regions at window_size and binsize. Window
+    sizes of None refer to variable size intervals with binsizes in percent."""
+    if window_size is None or target_window_size is None:
+        return (
+            window_size is None
+            and target_window_size is None
+            and target_binsize % binsize == 0
+            and _get_stackup_bin_number(None, binsize)
+            == _get_stackup_bin_number(None, target_binsize)
+            * (target_binsize // binsize)
+        )
+    return (
+        target_window_size <= window_size
+        and window_size % binsize == 0
+        and target_binsize % binsize == 0
+        and target_window_size % target_binsize == 0
     )
-    # put extracted data back in target array
-    target_array[good_chromosome_indices, :] = stackup_array
+
+
+def _derive_stackup(
+    stackup_array,
+    window_size,
+    binsize,
+    target_window_size,
+    target_binsize,
+    output_path=None,
+):
+    """Derives the stackup at target_window_size and target_binsize from stackup_array,
+    the stackup of the same regions at window_size and binsize. The centered target
+    window is cropped from stackup_array and blocks of neighbouring bins are averaged
+    to target_binsize ignoring nans. Bins of stackups are means over the bases that are
+    covered by the bigwig. Averaging them is therefore an approximation of the stackup at
+    target_binsize that weights bins equally instead of by their coverage. Both agree
+    unless blocks contain partially covered bins. If output_path is given, the result is a
+    memory-mapped .npy file at output_path that is filled in chunks of
+    STACKUP_CHUNK_SIZE regions."""
+    if window_size is None:
+        offset = 0
+    else:
+        offset = (window_size - target_window_size) // binsize
+    block_size = target_binsize // binsize
+    bin_number = _get_stackup_bin_number(target_window_size, target_binsize)
+    shape = (len(stackup_array), bin_number)
+    if output_path is None:
+        target_array = np.empty(shape)
+        chunk_size = max(len(stackup_array), 1)
+    else:
+        target_array = np.lib.format.open_memmap(
+            output_path, mode="w+", dtype=np.float64, shape=shape
+        )
+        chunk_size = current_app.config["STACKUP_CHUNK_SIZE"]
+    for start in range(0, len(stackup_array), chunk_size):
+        blocks = np.asarray(
+            stackup_array[
+                start : start + chunk_size, offset : offset + bin_number * block_size
+            ]
+        ).reshape(-1, bin_number, block_size)
+        counts = np.sum(~np.isnan(blocks), axis=2)
+        with np.errstate(invalid="ignore"):
+            target_array[start : start + chunk_size] = (
+                np.nansum(blocks, axis=2) / counts
+            )
+    if output_path is not None:
+        target_array.flush()
     return target_array
 
 
+def _get_stackup_bin_number(window_size, binsize):
+    """Returns number of bins of stackups at window_size and binsize. Window sizes
+    of None refer to variable size intervals with binsizes in percent."""
+    if window_size is None:
+        return interval_operations.get_bin_number_for_expanded_intervals(
+            binsize, current_app.config["VARIABLE_SIZE_EXPANSION_FACTOR"]
+        )
+    return int(window_size / binsize) * 2
+
+
+def _dispose_database_connections():
+    """Discards the pooled database connections before processes are forked so that
+    the processes do not share connections with the worker. The single connection
+    of a static pool, e.g. of an in-memory database, is kept since it cannot be
+    replaced without losing the database. Redis connections are reset by redis
+    in forked processes."""
+    if not isinstance(db.engine.pool, StaticPool):
+        db.engine.dispose()
+
+
 def _do_enrichment_calculations_fixed_size(
     collection_id, window_size, binsize, regions_path, region_side
 ):
     """Lola enrichment calculations for fixed size regions"""
-    regions = pd.read_csv(regions_path, sep="\t", header=None)
-    if region_side is None:
-        regions = regions.rename(columns={0: "chrom", 1: "start", 2: "end"})
-    elif region_side == "left":
-        regions = regions[[0, 1, 2]].rename(columns={0: "chrom", 1: "start", 2: "end"})
-    elif region_side == "right":
-        regions = regions[[3, 4, 5]].rename(columns={3: "chrom", 4: "start", 5: "end"})
-    else:
-        raise ValueError(f"region_side parameter {region_side} not understood")
-    # make queries
-    log.info("      Constructing queries...")
-    # get chromosome sizes -> this will be the same for all datasets of the collection
-    assembly = Assembly.query.get(
-        Collection.query.get(collection_id).datasets[0].assembly
-    )
-    chromsizes = io_helpers.load_chromsizes(assembly.chrom_sizes)
-    chromsizes_regions = pd.DataFrame(
-        {"chrom": chromsizes.index, "start": 0, "end": chromsizes}
+    return _do_enrichment_calculations(
+        collection_id, window_size, binsize, regions_path, region_side
     )
-    # filter based on whether the original regions are in chromosomes
-    filtered = (
-        bf.count_overlaps(regions, chromsizes_regions)
-        .query("count > 0")
-        .drop("count", axis="columns")
-    )
-    queries = interval_operations.chunk_intervals(filtered, window_size, binsize)
-    filtered_queries = [
-        bf.count_overlaps(query, chromsizes_regions)
-        .query("count > 0")
-        .drop("count", axis="columns")
-        .drop_duplicates()
-        .reset_index(drop=True)
-        for query in queries
-    ]
-    # get target datasets
-    log.info("      Calculate target list...")
-    collection = Collection.query.get(collection_id)
-    target_list = [
-        pd.read_csv(target.file_path, sep="\t", header=None)
-        .iloc[:, [0, 1, 2]]
-        .rename(columns={0: "chrom", 1: "start", 2: "end"})
-        for target in collection.datasets
-    ]
-    filtered_target_list = [
-        bf.count_overlaps(target, chromsizes_regions)
-        .query("count > 0")
-        .drop("count", axis="columns")
-        .drop_duplicates()
-        .reset_index(drop=True)
-        for target in target_list
-    ]
-    # get universe -> genome binned with equal binsize
-    universe = bf.binnify(chromsizes, binsize)
-    # perform enrichment analysis
-    log.info("      Run enrichment analysis...")
-    results = [
-        pylola.run_lola(query, filtered_target_list, universe, processes=4)[
-            "odds_ratio"
-        ].values
-        for query in filtered_queries
-    ]
-    # stack results
-    return np.stack(results, axis=1)
 
 
 def _do_enrichment_calculations_variable_size(
     collection_id, binsize, regions_path, region_side
 ):
     """Lola enrichment calculations for variably size regions"""
+    return _do_enrichment_calculations(
+        collection_id, None, binsize, regions_path, region_side
+    )
+
+
+def _do_enrichment_calculations(
+    collection_id, window_size, binsize, regions_path, region_side
+):
+    """Lola enrichment calculations for fixed size regions or variably sized regions
+    if window_size is None. If region_side is a list of anchors of 2d regions, the
+    target list of the collection is prepared once and a dictionary mapping each anchor
+    to its results is returned. Chunks of all anchors are distributed in batches over a
+    single pool of ENRICHMENT_PROCESSES processes."""
     regions = pd.read_csv(regions_path, sep="\t", header=None)
-    if region_side is None:
-        regions = regions.rename(columns={0: "chrom", 1: "start", 2: "end"})
-    elif region_side == "left":
-        regions = regions[[0, 1, 2]].rename(columns={0: "chrom", 1: "start", 2: "end"})
-    elif region_side == "right":
-        regions = regions[[3, 4, 5]].rename(columns={3: "chrom", 4: "start", 5: "end"})
-    else:
-        raise ValueError(f"region_side parameter {region_side} not understood")
-    # make queries
-    log.info("      Constructing queries...")
     # get chromosome sizes -> this will be the same for all datasets of the collection
     assembly = Assembly.query.get(
         Collection.query.get(collection_id).datasets[0].assembly
@@ -492,94 +872,273 @@ def _do_enrichment_calculations_variable_size(
     chromsizes_regions = pd.DataFrame(
         {"chrom": chromsizes.index, "start": 0, "end": chromsizes}
     )
-    # filter based on whether the original regions are in chromosomes
-    filtered = (
-        bf.count_overlaps(regions, chromsizes_regions)
-        .query("count > 0")
-        .drop("count", axis="columns")
-    )
-    queries = interval_operations.chunk_intervals_variable_size(
-        filtered, binsize, current_app.config["VARIABLE_SIZE_EXPANSION_FACTOR"]
-    )
-    filtered_queries = [
-        bf.count_overlaps(query, chromsizes_regions)
-        .query("count > 0")
-        .drop("count", axis="columns")
-        .drop_duplicates()
-        .reset_index(drop=True)
-        for query in queries
-    ]
-    # get target datasets
-    log.info("      Calculate target list...")
     collection = Collection.query.get(collection_id)
-    target_list = [
-        pd.read_csv(target.file_path, sep="\t", header=None)
-        .iloc[:, [0, 1, 2]]
-        .rename(columns={0: "chrom", 1: "start", 2: "end"})
-        for target in collection.datasets
+    sides = region_side if isinstance(region_side, list) else [region_side]
+    enrichment_data = {"queries": {}}
+    if window_size is not None:
+        # get targets as bitsets over the universe -> genome binned with equal binsize
+        enrichment_data.update(
+            target_bitsets=enrichment_cache.get_target_bitsets(
+                collection, assembly.id, chromsizes_regions, chromsizes, binsize
+            ),
+            bin_number=enrichment_operations.get_bin_number(chromsizes, binsize),
+            chromsizes=chromsizes,
+            binsize=binsize,
+        )
+    else:
+        # index targets once -> reused for all queries
+        target_indices = [
+            enrichment_operations.IntervalIndex(target)
+            for target in enrichment_cache.get_targets(
+                collection, assembly.id, chromsizes_regions
+            )
+        ]
+        enrichment_data.update(universes={}, universe_in_targets={})
+    for side in sides:
+        # make queries
+        log.info("      Constructing queries...")
+        # filter based on whether the original regions are in chromosomes
+        filtered = _filter_in_chromosomes(
+            _get_enrichment_anchors(regions, side), chromsizes_regions
+        )
+        if window_size is None:
+            queries = interval_operations.chunk_intervals_variable_size(
+                filtered, binsize, current_app.config["VARIABLE_SIZE_EXPANSION_FACTOR"]
+            )
+            # get universe -> union of queries
+            universe = pd.concat(queries).drop_duplicates().reset_index(drop=True)
+            # chunks outside of chromosomes stay in the universe, but are no queries
+            queries = [
+                _filter_in_chromosomes(query, chromsizes_regions) for query in queries
+            ]
+            enrichment_data["universes"][side] = universe
+            enrichment_data["universe_in_targets"][side] = _get_universe_in_targets(
+                universe, target_indices
+            )
+        else:
+            queries = interval_operations.chunk_intervals(
+                filtered, window_size, binsize
+            )
+        enrichment_data["queries"][side] = queries
+    # perform enrichment analysis
+    log.info("      Run enrichment analysis...")
+    process_number = current_app.config["ENRICHMENT_PROCESSES"]
+    batches = [
+        (side, batch[0], batch[-1] + 1)
+        for side in sides
+        for batch in np.array_split(
+            np.arange(len(enrichment_data["queries"][side])), process_number
+        )
+        if len(batch) > 0
     ]
-    filtered_target_list = [
-        bf.count_overlaps(target, chromsizes_regions)
+    batch_results = []
+    if batches:
+        # processes are forked to share enrichment data without copying it
+        _dispose_database_connections()
+        with multiprocessing.get_context("fork").Pool(
+            min(process_number, len(batches)),
+            initializer=_set_enrichment_data,
+            initargs=(enrichment_data,),
+        ) as pool:
+            batch_results = pool.starmap(_do_enrichment_batch, batches)
+    # sides without query chunks have no results
+    empty_result = np.empty((len(collection.datasets), 0))
+    results = {
+        side: np.concatenate(
+            [empty_result]
+            + [
+                batch_result
+                for (batch_side, _, _), batch_result in zip(batches, batch_results)
+                if batch_side == side
+            ],
+            axis=1,
+        )
+        for side in sides
+    }
+    if isinstance(region_side, list):
+        return results
+    return results[region_side]
+
+
+def _set_enrichment_data(enrichment_data):
+    """Makes enrichment_data available to _do_enrichment_batch in processes of the enrichment pool."""
+    global _enrichment_data
+    _enrichment_data = enrichment_data
+
+
+def _do_enrichment_batch(side, start, end):
+    """Returns (targets, chunks) array of odds ratios of the chunks from start to end of the
+    queries of side in the enrichment data of this process."""
+    queries = _enrichment_data["queries"][side][start:end]
+    if "target_bitsets" in _enrichment_data:
+        # queries are aligned with universe bins
+        query_bitsets = enrichment_operations.pack_bins(
+            [
+                enrichment_operations.get_bin_indices(
+                    query, _enrichment_data["chromsizes"], _enrichment_data["binsize"]
+                )
+                for query in queries
+            ],
+            _enrichment_data["bin_number"],
+        )
+        return enrichment_operations.get_odds_ratios_from_bitsets(
+            query_bitsets,
+            _enrichment_data["target_bitsets"],
+            _enrichment_data["bin_number"],
+        )
+    universe = _enrichment_data["universes"][side]
+    universe_in_queries = np.stack(
+        [
+            enrichment_operations.IntervalIndex(query).overlaps(universe)
+            for query in queries
+        ],
+        axis=1,
+    )
+    return enrichment_operations.get_odds_ratios(
+        universe_in_queries, _enrichment_data["universe_in_targets"][side]
+    )
+
+
+def _get_universe_in_targets(universe, target_indices):
+    """Returns boolean (universe regions, targets) array that is True for universe
+    regions that overlap the target of the respective index."""
+    return np.stack([index.overlaps(universe) for index in target_indices], axis=1)
+
+
+def _filter_in_chromosomes(intervals, chromsizes_regions):
+    """Returns intervals that overlap chromosomes in chromsizes_regions."""
+    return (
+        bf.count_overlaps(intervals, chromsizes_regions)
         .query("count > 0")
         .drop("count", axis="columns")
-        .drop_duplicates()
         .reset_index(drop=True)
-        for target in target_list
-    ]
-    # get universe -> union of queries
-    universe = pd.concat(queries).drop_duplicates().reset_index(drop=True)
-    # perform enrichment analysis
-    log.info("      Run enrichment analysis...")
-    results = [
-        pylola.run_lola(query, filtered_target_list, universe, processes=4)[
-            "odds_ratio"
-        ].values
-        for query in filtered_queries
-    ]
-    # stack results
-    return np.stack(results, axis=1)
+    )
+
+
+def _get_enrichment_anchors(regions, region_side):
+    """Returns chrom, start and end of the anchor at region_side of regions."""
+    if region_side is None:
+        return regions.rename(columns={0: "chrom", 1: "start", 2: "end"})
+    if region_side == "left":
+        return regions[[0, 1, 2]].rename(columns={0: "chrom", 1: "start", 2: "end"})
+    if region_side == "right":
+        return regions[[3, 4, 5]].rename(columns={3: "chrom", 4: "start", 5: "end"})
+    raise ValueError(f"region_side parameter {region_side} not understood")
 
 
 def _do_embedding_1d_fixed_size(collection_id, intervals_id, binsize, region_side):
+    """Embeds regions of intervals_id based on the center columns of the stackups
+    of the features in collection_id."""
+    return _do_embedding_1d(
+        collection_id, intervals_id, binsize, region_side, _get_center_column
+    )
+
+
+def _do_embedding_1d_variable_size(collection_id, intervals_id, binsize, region_side):
+    """Embeds regions of intervals_id based on the mean of the stackups of the
+    features in collection_id between the expanded regions."""
+    return _do_embedding_1d(
+        collection_id,
+        intervals_id,
+        binsize,
+        region_side,
+        partial(_get_region_mean, binsize=binsize),
+    )
+
+
+def _get_center_column(stackup_array):
+    # extract center column if data is point feature
+    return np.array(stackup_array[:, stackup_array.shape[1] // 2])
+
+
+def _get_region_mean(stackup_array, binsize):
+    # Take area between the expanded regions
+    start_index = int(
+        (current_app.config["VARIABLE_SIZE_EXPANSION_FACTOR"] * 100) // binsize
+    )
+    end_index = int(start_index + (100 // binsize))
+    return np.mean(stackup_array[:, start_index:end_index], axis=1)
+
+
+def _summarize_stackup(stackup_array, window_size, binsize):
+    """Reduces stackup_array to the single value per region that 1d-embeddings are
+    based on, the center column for regions with window_size or the mean between
+    the expanded regions for variable size regions (window_size None)."""
+    if window_size is None:
+        return _get_region_mean(stackup_array, binsize)
+    return _get_center_column(stackup_array)
+
+
+def _load_stackup_summary(stackup, reduce_stackup):
+    """Returns the summary of stackup written next to it by the stackup step. Stackups
+    without summary are memory-mapped and reduced by reduce_stackup, which only reads
+    the columns it needs."""
+    if os.path.exists(stackup.file_path_summary):
+        return np.load(stackup.file_path_summary)
+    return reduce_stackup(np.load(stackup.file_path, mmap_mode="r"))
+
+
+def _do_embedding_1d(collection_id, intervals_id, binsize, region_side, reduce_stackup):
+    """Embeds regions of intervals_id based on the stackups of the features in collection_id
+    reduced to a single value per region by reduce_stackup. If region_side is a list of anchors
+    of 2d regions, the stackups of all anchors are queried at once and a dictionary mapping each
+    anchor to its embedding results is returned."""
     features = Collection.query.get(collection_id).datasets
-    data = []
-    for feature in features:
-        stackup = IndividualIntervalData.query.filter(
-            (IndividualIntervalData.dataset_id == feature.id)
-            & (IndividualIntervalData.intervals_id == intervals_id)
-            & (IndividualIntervalData.binsize == binsize)
-            & (IndividualIntervalData.region_side == region_side)
-        ).first()
-        temp = np.load(stackup.file_path)
-        # load data and extract center column if data is point feature
-        data.append(temp[:, temp.shape[1] // 2])
-    # construct feature frame
-    feature_frame = np.stack(data).transpose()
+    if isinstance(region_side, list):
+        side_filter = IndividualIntervalData.region_side.in_(region_side)
+    else:
+        side_filter = IndividualIntervalData.region_side == region_side
+    stackups = {}
+    for stackup in IndividualIntervalData.query.filter(
+        IndividualIntervalData.dataset_id.in_([feature.id for feature in features])
+        & (IndividualIntervalData.intervals_id == intervals_id)
+        & (IndividualIntervalData.binsize == binsize)
+        & side_filter
+    ).all():
+        stackups.setdefault((stackup.dataset_id, stackup.region_side), stackup)
+    results = {}
+    for side in region_side if isinstance(region_side, list) else [region_side]:
+        data = [
+            _load_stackup_summary(stackups[(feature.id, side)], reduce_stackup)
+            for feature in features
+        ]
+        # construct feature frame
+        results[side] = _embed_feature_frame(
+            np.stack(data).transpose(),
+            cache_scope=embedding_cache.get_scope(
+                "embedding1d", collection_id, intervals_id, binsize, side
+            ),
+        )
+    if isinstance(region_side, list):
+        return results
+    return results[region_side]
+
+
+def _embed_feature_frame(feature_frame, cache_scope=None):
+    """Calculates embedding and clusters of the regions x features feature_frame. Fitted
+    models are reused from and stored in the embedding cache under cache_scope."""
     # do imputation
     imputed_frame = SimpleImputer().fit_transform(feature_frame)
-    # calculate embedding
-    log.info("      Running embedding...")
-    embedder = umap.UMAP(random_state=42)
-    embedding = embedder.fit_transform(imputed_frame)
-    # do clustering and extract values
-    log.info("      Running clustering large...")
-    kmeans_large = KMeans(
-        n_clusters=current_app.config["CLUSTER_NUMBER_LARGE"], random_state=0
-    ).fit(embedding)
-    cluster_ids_large = kmeans_large.labels_
-    log.info("      Generating average values large...")
+    # calculate embedding and clusters -> imputed values depend on all rows, so rows are
+    # identified by their values before imputation
+    embedding, cluster_ids = _embed_and_cluster(
+        imputed_frame,
+        cache_scope,
+        row_hashes=embedding_cache.hash_rows(feature_frame),
+    )
+    cluster_ids_large = cluster_ids["large"]
+    cluster_ids_small = cluster_ids["small"]
+    log.info("      Generating average values...")
     scaled = StandardScaler().fit_transform(imputed_frame)
-    average_cluster_values_large = (
-        pd.DataFrame(scaled).groupby(cluster_ids_large).mean().values
+    average_cluster_values_large = pileup_operations.grouped_nanmean(
+        scaled,
+        cluster_ids_large,
+        current_app.config["CLUSTER_NUMBER_LARGE"],
     )
-    log.info("      Running clustering small...")
-    kmeans_large = KMeans(
-        n_clusters=current_app.config["CLUSTER_NUMBER_SMALL"], random_state=0
-    ).fit(embedding)
-    cluster_ids_small = kmeans_large.labels_
-    log.info("      Generating average values small...")
-    average_cluster_values_small = (
-        pd.DataFrame(scaled).groupby(cluster_ids_small).mean().values
+    average_cluster_values_small = pileup_operations.grouped_nanmean(
+        scaled,
+        cluster_ids_small,
+        current_app.config["CLUSTER_NUMBER_SMALL"],
     )
     return {
         "embedding": embedding,
@@ -597,68 +1156,147 @@ def _do_embedding_1d_fixed_size(collection_id, intervals_id, binsize, region_sid
     }
 
 
-def _do_embedding_1d_variable_size(collection_id, intervals_id, binsize, region_side):
-    features = Collection.query.get(collection_id).datasets
-    data = []
-    for feature in features:
-        stackup = IndividualIntervalData.query.filter(
-            (IndividualIntervalData.dataset_id == feature.id)
-            & (IndividualIntervalData.intervals_id == intervals_id)
-            & (IndividualIntervalData.binsize == binsize)
-            & (IndividualIntervalData.region_side == region_side)
-        ).first()
-        temp = np.load(stackup.file_path)
-        # Take area between the expanded regions
-        start_index = int(
-            (current_app.config["VARIABLE_SIZE_EXPANSION_FACTOR"] * 100) // binsize
-        )
-        end_index = int(start_index + (100 // binsize))
-        reduced = np.mean(temp[:, start_index:end_index], axis=1)
-        data.append(reduced)
-    # construct feature frame
-    feature_frame = np.stack(data).transpose()
-    # do imputation
-    imputed_frame = SimpleImputer().fit_transform(feature_frame)
+def _embed_and_cluster(features, cache_scope=None, scaler=None, row_hashes=None):
+    """Embeds the regions x features array features into a 2-dimensional space using umap
+    and clusters the embedding into CLUSTER_NUMBER_LARGE and CLUSTER_NUMBER_SMALL clusters,
+    which are both cut from a single clustering (see clustering.CentroidHierarchy).
+    If an unfitted scaler (e.g. an imputer) is given, it is fitted on features and transforms
+    them before embedding. Returns the embedding and a dictionary mapping the cluster sizes
+    (large and small) to cluster ids. If cache_scope is given, fitted models of the scope
+    (including the scaler) are reused if they are applicable to features and newly fitted
+    models are cached. Rows are identified by row_hashes, which default to the hashes of
+    features and need to be given if features were preprocessed depending on all rows."""
+    cluster_numbers = {
+        size: current_app.config[f"CLUSTER_NUMBER_{size.upper()}"]
+        for size in ["large", "small"]
+    }
+    parameters = {
+        "cluster_numbers": cluster_numbers,
+        "clustering": "centroid_hierarchy",
+        "umap_random_state": 42,
+        "kmeans_random_state": 0,
+        "feature_number": features.shape[1],
+        "scaler": repr(scaler),
+    }
+    # rows are hashed before scaling since the scaling of each row depends on all rows
+    if row_hashes is None:
+        row_hashes = embedding_cache.hash_rows(features)
+    if cache_scope is not None:
+        models = embedding_cache.load_models(cache_scope, parameters, row_hashes)
+        if models is not None:
+            log.info("      Reusing fitted embedding models...")
+            embedding = models.embed(models.scale(features), row_hashes)
+            return embedding, models.cluster(embedding)
+    if scaler is not None:
+        features = scaler.fit_transform(features)
     # calculate embedding
     log.info("      Running embedding...")
-    embedder = umap.UMAP(random_state=42)
-    embedding = embedder.fit_transform(imputed_frame)
-    # do clustering and extract values
-    log.info("      Running clustering large...")
-    kmeans_large = KMeans(
-        n_clusters=current_app.config["CLUSTER_NUMBER_LARGE"], random_state=0
+    reducer = umap.UMAP(random_state=42)
+    embedding = reducer.fit_transform(features)
+    # do clustering once -> all cluster numbers are cut from the centroid hierarchy
+    log.info("      Running clustering...")
+    hierarchy = clustering.CentroidHierarchy(
+        max(cluster_numbers.values()), random_state=0
     ).fit(embedding)
-    cluster_ids_large = kmeans_large.labels_
-    log.info("      Generating average values large...")
-    scaled = StandardScaler().fit_transform(imputed_frame)
-    average_cluster_values_large = (
-        pd.DataFrame(scaled).groupby(cluster_ids_large).mean().values
-    )
-    log.info("      Running clustering small...")
-    kmeans_large = KMeans(
-        n_clusters=current_app.config["CLUSTER_NUMBER_SMALL"], random_state=0
-    ).fit(embedding)
-    cluster_ids_small = kmeans_large.labels_
-    log.info("      Generating average values small...")
-    average_cluster_values_small = (
-        pd.DataFrame(scaled).groupby(cluster_ids_small).mean().values
-    )
-    return {
-        "embedding": embedding,
-        "clusters": {
-            "large": {
-                "cluster_ids": cluster_ids_large,
-                "average_values": average_cluster_values_large,
-            },
-            "small": {
-                "cluster_ids": cluster_ids_small,
-                "average_values": average_cluster_values_small,
-            },
-        },
-        "features": feature_frame,
+    if cache_scope is not None:
+        embedding_cache.save_models(
+            cache_scope,
+            embedding_cache.EmbeddingModels(
+                scaler, reducer, hierarchy, cluster_numbers, row_hashes, parameters
+            ),
+        )
+    return embedding, {
+        size: hierarchy.get_labels(cluster_number)
+        for size, cluster_number in cluster_numbers.items()
     }
 
 
+def _do_pileup_embedding_streamed(pileup_chunks, pileup_types, cache_scopes=None):
+    """Consumes pileup_chunks, an iterable of dictionaries mapping pileup types to
+    (n, n, chunk regions) stacks, and returns a dictionary mapping each of pileup_types
+    to a tuple of the average pileup and the results of the 2d embedding. Pileup types
+    can be any hashable key, e.g. (interval id, pileup type) tuples. Averages and
+    image features are accumulated chunk by chunk and windows are spilled to a temporary
+    file in UPLOAD_DIR to generate thumbnails, so peak memory does not scale with
+    the number of regions. cache_scopes optionally maps pileup types to the scope of
+    their fitted models in the embedding cache. Pileup types without regions get nan
+    averages and empty embedding results."""
+    if cache_scopes is None:
+        cache_scopes = {}
+    spill_paths = {
+        pileup_type: os.path.join(
+            current_app.config["UPLOAD_DIR"], uuid.uuid4().hex + "_pileup_stack.tmp"
+        )
+        for pileup_type in pileup_types
+    }
+    accumulators = {}
+    pixel_features = {pileup_type: [] for pileup_type in pileup_types}
+    region_numbers = {pileup_type: 0 for pileup_type in pileup_types}
+    chunk_size = 0
+    try:
+        log.info("      Extracting image features...")
+        for chunk in pileup_chunks:
+            for pileup_type in pileup_types:
+                # windows are transposed like in _do_embedding_2d
+                images = np.ascontiguousarray(chunk[pileup_type].T, dtype=np.float64)
+                if pileup_type not in accumulators:
+                    accumulators[pileup_type] = pileup_operations.PileupAccumulator(
+                        images.shape[1:]
+                    )
+                if len(images) == 0:
+                    continue
+                chunk_size = max(chunk_size, len(images))
+                accumulators[pileup_type].add(images)
+                region_numbers[pileup_type] += len(images)
+                pixel_features[pileup_type].append(
+                    feature_extraction.extract_pixel_features(
+                        images,
+                        pixel_target=(10, 10),
+                        threads=current_app.config["FEATURE_EXTRACTION_THREADS"],
+                    )
+                )
+                with open(spill_paths[pileup_type], "ab") as spill_file:
+                    images.tofile(spill_file)
+        output = {}
+        for pileup_type in pileup_types:
+            if region_numbers[pileup_type] == 0:
+                # no regions -> window shape is only known from empty chunks
+                window_shape = (
+                    accumulators[pileup_type].sums.shape[1:]
+                    if pileup_type in accumulators
+                    else (0, 0)
+                )
+                output[pileup_type] = (
+                    np.full(window_shape, np.nan),
+                    _get_empty_embedding_2d(0, window_shape),
+                )
+                continue
+            window_shape = accumulators[pileup_type].sums.shape[1:]
+            images = np.memmap(
+                spill_paths[pileup_type], dtype=np.float64, mode="r"
+            ).reshape(-1, *window_shape)
+            # features are scaled together with the embedding -> cached scalers are reused
+            image_features = feature_extraction.clean_image_features(
+                np.concatenate(pixel_features[pileup_type])
+            )
+            output[pileup_type] = (
+                accumulators[pileup_type].average()[0].T,
+                _cluster_images(
+                    image_features,
+                    images,
+                    chunk_size,
+                    cache_scope=cache_scopes.get(pileup_type),
+                    scaler=feature_extraction.get_image_feature_scaler(),
+                ),
+            )
+            del images
+        return output
+    finally:
+        for spill_path in spill_paths.values():
+            if os.path.exists(spill_path):
+                io_helpers.remove_safely(spill_path, log)
+
+
 def _do_embedding_2d(data):
     """Embeds examples in the n x k array into a 2-dimensional space
     using umap."""
@@ -667,125 +1305,85 @@ def _do_embedding_2d(data):
     # extract features
     log.info("      Extracting image features...")
     image_features = feature_extraction.extract_image_features(
-        data, pixel_target=(10, 10)
+        data,
+        pixel_target=(10, 10),
+        threads=current_app.config["FEATURE_EXTRACTION_THREADS"],
     )
+    return _cluster_images(image_features, data, max(len(data), 1))
+
+
+def _cluster_images(image_features, images, chunk_size, cache_scope=None, scaler=None):
+    """Embeds image_features into a 2-dimensional space using umap, clusters
+    the embedding and averages images per cluster to thumbnails. images is a
+    (regions, n, n) array that may be memory-mapped and is read in chunks
+    of chunk_size. image_features are scaled with scaler if it is given. Fitted
+    models are reused from and stored in the embedding cache under cache_scope."""
+    cluster_numbers = {
+        size: current_app.config[f"CLUSTER_NUMBER_{size.upper()}"]
+        for size in ["large", "small"]
+    }
     # check if bad image features and return empty arrays if so
     if image_features is None:
-        return {
-            "embedding": np.full((len(data), 2), np.nan),
-            "clusters": {
-                "large": {
-                    "cluster_ids": np.full((len(data)), np.nan),
-                    "thumbnails": np.full(
-                        (
-                            current_app.config["CLUSTER_NUMBER_LARGE"],
-                            data[0].shape[0],
-                            data[0].shape[1],
-                        ),
-                        np.nan,
-                    ),
-                },
-                "small": {
-                    "cluster_ids": np.full((len(data)), np.nan),
-                    "thumbnails": np.full(
-                        (
-                            current_app.config["CLUSTER_NUMBER_SMALL"],
-                            data[0].shape[0],
-                            data[0].shape[1],
-                        ),
-                        np.nan,
-                    ),
-                },
-            },
-        }
-    # calculate embedding
-    log.info("      Running embedding...")
-    embedder = umap.UMAP(random_state=42)
+        return _get_empty_embedding_2d(len(images), images.shape[1:])
+    # too few regions to be clustered
+    if len(image_features) < max(cluster_numbers.values()):
+        log.info("      Too few regions for embedding!")
+        return _get_empty_embedding_2d(len(images), images.shape[1:])
+    # calculate embedding and clusters
     try:
-        embedding = embedder.fit_transform(image_features)
-    except:
-        # TODO: fix nicer
-        log.info("      Embedding failed!")
-        return {
-            "embedding": np.full((len(data), 2), np.nan),
-            "clusters": {
-                "large": {
-                    "cluster_ids": np.full((len(data)), np.nan),
-                    "thumbnails": np.full(
-                        (
-                            current_app.config["CLUSTER_NUMBER_LARGE"],
-                            data[0].shape[0],
-                            data[0].shape[1],
-                        ),
-                        np.nan,
-                    ),
-                },
-                "small": {
-                    "cluster_ids": np.full((len(data)), np.nan),
-                    "thumbnails": np.full(
-                        (
-                            current_app.config["CLUSTER_NUMBER_SMALL"],
-                            data[0].shape[0],
-                            data[0].shape[1],
-                        ),
-                        np.nan,
-                    ),
-                },
-            },
-        }
-    #  kmeans clustering
-    log.info("      Running clustering large...")
-    kmeans_large = KMeans(
-        n_clusters=current_app.config["CLUSTER_NUMBER_LARGE"], random_state=0
-    ).fit(embedding)
-    cluster_ids_large = kmeans_large.labels_
-    # create thumbnails for each cluster
-    log.info("      Generating thumbnails large...")
-    thumbnails_list = []
-    for cluster in range(current_app.config["CLUSTER_NUMBER_LARGE"]):
-        sub_stacks = np.stack(
-            [
-                array
-                for index, array in enumerate(data)
-                if cluster_ids_large[index] == cluster
-            ],
-            axis=2,
-        )
-        thumbnail = np.nanmean(sub_stacks, axis=2)
-        thumbnails_list.append(thumbnail)
-    thumbnails_large = np.stack(thumbnails_list, axis=0)
-    #  kmeans clustering
-    log.info("      Running clustering small...")
-    kmeans_small = KMeans(
-        n_clusters=current_app.config["CLUSTER_NUMBER_SMALL"], random_state=0
-    ).fit(embedding)
-    cluster_ids_small = kmeans_small.labels_
-    # create thumbnails for each cluster
-    log.info("      Generating thumbnails small...")
-    thumbnails_list = []
-    for cluster in range(current_app.config["CLUSTER_NUMBER_SMALL"]):
-        sub_stacks = np.stack(
-            [
-                array
-                for index, array in enumerate(data)
-                if cluster_ids_small[index] == cluster
-            ],
-            axis=2,
+        embedding, cluster_ids = _embed_and_cluster(image_features, cache_scope, scaler)
+    except ValueError as error:
+        # umap rejects features it cannot embed
+        log.info(f"      Embedding failed: {error}")
+        return _get_empty_embedding_2d(len(images), images.shape[1:])
+    # images are only summed for the finer clustering, the clusters of the coarser
+    # clustering are unions of its clusters (see clustering.CentroidHierarchy)
+    fine_size, coarse_size = sorted(
+        cluster_numbers, key=cluster_numbers.get, reverse=True
+    )
+    log.info("      Generating thumbnails...")
+    accumulators = {
+        fine_size: pileup_operations.PileupAccumulator(
+            images.shape[1:], group_number=cluster_numbers[fine_size]
         )
-        thumbnail = np.nanmean(sub_stacks, axis=2)
-        thumbnails_list.append(thumbnail)
-    thumbnails_small = np.stack(thumbnails_list, axis=0)
+    }
+    for start in range(0, len(images), chunk_size):
+        accumulators[fine_size].add(
+            images[start : start + chunk_size],
+            cluster_ids[fine_size][start : start + chunk_size],
+        )
+    fine_to_coarse = np.zeros(cluster_numbers[fine_size], dtype=np.int64)
+    fine_to_coarse[cluster_ids[fine_size]] = cluster_ids[coarse_size]
+    accumulators[coarse_size] = accumulators[fine_size].merge_groups(
+        fine_to_coarse, cluster_numbers[coarse_size]
+    )
+    clusters = {
+        size: {
+            "cluster_ids": cluster_ids[size],
+            "thumbnails": accumulators[size].average(),
+        }
+        for size in ["large", "small"]
+    }
+    return {"embedding": embedding, "clusters": clusters}
+
+
+def _get_empty_embedding_2d(image_number, image_shape):
+    """Returns embedding results filled with nans"""
     return {
-        "embedding": embedding,
+        "embedding": np.full((image_number, 2), np.nan),
         "clusters": {
-            "large": {
-                "cluster_ids": cluster_ids_large,
-                "thumbnails": thumbnails_large,
-            },
-            "small": {
-                "cluster_ids": cluster_ids_small,
-                "thumbnails": thumbnails_small,
-            },
+            size: {
+                "cluster_ids": np.full((image_number), np.nan),
+                "thumbnails": np.full(
+                    (
+                        current_app.config[f"CLUSTER_NUMBER_{size.upper()}"],
+                        image_shape[0],
+                        image_shape[1],
+                    ),
+                    np.nan,
+                ),
+            }
+            for size in ["large", "small"]
         },
     }
 
@@ -809,6 +1407,7 @@ def _add_embedding_2d_to_db(
         hicognition.io_helpers.remove_safely(entry.file_path, current_app.logger)
         hicognition.io_helpers.remove_safely(entry.thumbnail_path, current_app.logger)
         hicognition.io_helpers.remove_safely(entry.cluster_id_path, current_app.logger)
+        response_payloads.remove_payloads(entry.cluster_id_path)
         # update entry
         entry.name = os.path.basename(filepaths["embedding"])
         entry.file_path = filepaths["embedding"]
@@ -851,6 +1450,8 @@ def _add_embedding_1d_to_db(
         )
         hicognition.io_helpers.remove_safely(entry.cluster_id_path, current_app.logger)
         hicognition.io_helpers.remove_safely(entry.thumbnail_path, current_app.logger)
+        response_payloads.remove_payloads(entry.cluster_id_path)
+        response_payloads.remove_column_payloads(entry.file_path_feature_values)
         entry.name = os.path.basename(filepaths["embedding"])
         entry.file_path = filepaths["embedding"]
         entry.file_path_feature_values = filepaths["features"]
@@ -888,6 +1489,7 @@ def _add_association_data_to_db(
     ).first()
     if entry is not None:
         hicognition.io_helpers.remove_safely(entry.file_path, current_app.logger)
+        response_payloads.remove_payloads(entry.file_path)
         entry.file_path = file_path
     else:
         # add new entry
@@ -910,8 +1512,10 @@ def _add_stackup_db(
     intervals_id,
     bigwig_dataset_id,
     region_side=None,
+    commit=True,
 ):
-    """Adds stackup to database"""
+    """Adds stackup to database. If commit is False, the caller
+    is responsible for committing the session."""
     # check if old individual interval data exists and delete them
     entry = IndividualIntervalData.query.filter(
         (IndividualIntervalData.binsize == int(binsize))
@@ -922,6 +1526,11 @@ def _add_stackup_db(
     if entry is not None:
         hicognition.io_helpers.remove_safely(entry.file_path, current_app.logger)
         hicognition.io_helpers.remove_safely(entry.file_path_small, current_app.logger)
+        response_payloads.remove_payloads(entry.file_path_small)
+        if os.path.exists(entry.file_path_summary):
+            hicognition.io_helpers.remove_safely(
+                entry.file_path_summary, current_app.logger
+            )
         entry.file_path = file_path
         entry.file_path_small = file_path_small
     else:
@@ -936,11 +1545,15 @@ def _add_stackup_db(
             region_side=region_side,
         )
         db.session.add(entry)
-    db.session.commit()
+    if commit:
+        db.session.commit()
 
 
-def _add_line_db(file_path, binsize, intervals_id, bigwig_dataset_id, region_side=None):
-    """Adds pileup region to database"""
+def _add_line_db(
+    file_path, binsize, intervals_id, bigwig_dataset_id, region_side=None, commit=True
+):
+    """Adds pileup region to database. If commit is False, the caller
+    is responsible for committing the session."""
     # check if old average interval data exists and delete them
     entry = AverageIntervalData.query.filter(
         (AverageIntervalData.binsize == int(binsize))
@@ -950,6 +1563,7 @@ def _add_line_db(file_path, binsize, intervals_id, bigwig_dataset_id, region_sid
     ).first()
     if entry is not None:
         hicognition.io_helpers.remove_safely(entry.file_path, current_app.logger)
+        response_payloads.remove_payloads(entry.file_path)
         entry.file_path = file_path
     else:
         # add new entry
@@ -963,7 +1577,8 @@ def _add_line_db(file_path, binsize, intervals_id, bigwig_dataset_id, region_sid
             region_side=region_side,
         )
         db.session.add(entry)
-    db.session.commit()
+    if commit:
+        db.session.commit()
 
 
 def _add_pileup_db(file_path, binsize, intervals_id, cooler_dataset_id, pileup_type):
@@ -978,6 +1593,7 @@ def _add_pileup_db(file_path, binsize, intervals_id, cooler_dataset_id, pileup_t
     ).first()
     if entry is not None:
         hicognition.io_helpers.remove_safely(entry.file_path, current_app.logger)
+        response_payloads.remove_payloads(entry.file_path)
         entry.file_path = file_path
     else:
         # add new entry
@@ -0,0 +1,102 @@
+"""Precompressed json payloads of processed artifacts.
+Pipeline steps write the gzipped json response of the processed artifacts they produce
+next to the artifacts, so that get routes serve these files instead of loading, serializing
+and compressing the artifacts on every request. Payloads are named after the artifact they
+belong to and are removed together with it. Routes build payloads on the fly if they do not
+exist, e.g. for artifacts that were processed before payloads were written."""
+import os
+import glob
+import gzip
+import json
+import numpy as np
+from .lib.utils import flatten_and_clean_array
+
+# payloads are written once, so the better compression is worth the time
+PAYLOAD_COMPRESSION_LEVEL = 9
+
+
+def get_array_payload(array):
+    """Returns json payload of array with nan and +/- inf converted to None."""
+    return {
+        "data": flatten_and_clean_array(np.asarray(array, dtype=np.float64)),
+        "shape": list(np.shape(array)),
+        "dtype": "float32",
+    }
+
+
+def get_embedding_payload(embedding, cluster_ids=None, thumbnails=None):
+    """Returns json payload of embedding with cluster_ids and thumbnails (or average
+    values of 1d-embeddings). Missing cluster_ids and thumbnails are None."""
+    empty_payload = {"data": None, "shape": None, "dtype": None}
+    return {
+        "embedding": get_array_payload(embedding),
+        "cluster_ids": empty_payload
+        if cluster_ids is None
+        else get_array_payload(cluster_ids),
+        "thumbnails": empty_payload
+        if thumbnails is None
+        else get_array_payload(thumbnails),
+    }
+
+
+def compress_payload(payload, compresslevel=4):
+    """Returns payload as gzipped json."""
+    return gzip.compress(json.dumps(payload).encode("utf8"), compresslevel)
+
+
+def get_payload_path(file_path, part=None):
+    """Returns path of the payload of the artifact at file_path. part distinguishes
+    multiple payloads of a single artifact, e.g. the columns of feature values."""
+    suffix = "_payload" if part is None else f"_payload_{part}"
+    return os.path.splitext(file_path)[0] + suffix + ".json.gz"
+
+
+def write_payload(payload, file_path, part=None):
+    """Writes compressed payload of the artifact at file_path."""
+    payload_path = get_payload_path(file_path, part)
+    # write to temporary file first so that routes never serve partial files
+    temp_path = f"{payload_path}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as file_object:
+        file_object.write(compress_payload(payload, PAYLOAD_COMPRESSION_LEVEL))
+    os.replace(temp_path, payload_path)
+
+
+def write_column_payloads(array, file_path):
+    """Writes compressed payload of each column of the 2d array that is stored
+    at file_path. The column index is the part of the payload."""
+    for index in range(array.shape[1]):
+        write_payload(get_array_payload(array[:, index]), file_path, part=index)
+
+
+def read_payload(file_path, part=None):
+    """Returns compressed payload of the artifact at file_path or None if it
+    does not exist."""
+    try:
+        with open(get_payload_path(file_path, part), "rb") as file_object:
+            return file_object.read()
+    except FileNotFoundError:
+        return None
+
+
+def remove_payloads(*file_paths):
+    """Removes payloads of the artifacts at file_paths. File paths that
+    are None are skipped."""
+    for file_path in file_paths:
+        if file_path is not None:
+            _remove_if_exists(get_payload_path(file_path))
+
+
+def remove_column_payloads(file_path):
+    """Removes payloads of the columns of the array stored at file_path
+    (see write_column_payloads)."""
+    if file_path is None:
+        return
+    for payload_path in glob.glob(
+        glob.escape(os.path.splitext(file_path)[0]) + "_payload_*.json.gz"
+    ):
+        _remove_if_exists(payload_path)
+
+
+def _remove_if_exists(file_path):
+    if os.path.exists(file_path):
+        os.remove(file_path)
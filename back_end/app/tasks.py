@@ -100,18 +100,22 @@ def pipeline_bed(dataset_id):
 
 
 # @task_context
-def pipeline_pileup(dataset_id, intervals_id, binsize):
+def pipeline_pileup(dataset_id, intervals_id, binsize, nested_intervals_ids=None):
     """Start pileup pipeline for specified combination of
-    dataset_id (cooler_file), binsize and intervals_id"""
+    dataset_id (cooler_file), binsize and intervals_id. Pileups of
+    nested_intervals_ids, intervals with smaller windowsizes on the same
+    regions, are cropped from the pileup of intervals_id."""
     try:
         chromosome_arms = pd.read_csv(
             Assembly.query.get(Dataset.query.get(dataset_id).assembly).chrom_arms
         )
+        if nested_intervals_ids:
+            pileup_intervals = [intervals_id, *nested_intervals_ids]
+        else:
+            pileup_intervals = intervals_id
+        # ICCF and Obs/Exp pileups are derived from a single pass over the cooler
         pipeline_steps.pileup_pipeline_step(
-            dataset_id, intervals_id, binsize, chromosome_arms, "ICCF"
-        )
-        pipeline_steps.pileup_pipeline_step(
-            dataset_id, intervals_id, binsize, chromosome_arms, "Obs/Exp"
+            dataset_id, pileup_intervals, binsize, chromosome_arms, ["ICCF", "Obs/Exp"]
         )
         pipeline_steps.set_task_progress(100)
         pipeline_steps.set_dataset_finished(dataset_id, intervals_id)
@@ -121,21 +125,26 @@ def pipeline_pileup(dataset_id, intervals_id, binsize):
 
 
 # @task_context
-def pipeline_stackup(dataset_id, intervals_id, binsize):
+def pipeline_stackup(dataset_id, intervals_id, binsize, derived_stackups=None):
     """Start stackup pipeline for specified combination of
-    dataset_id (bigwig file), binsize and intervals_id"""
+    dataset_id (bigwig file), binsize and intervals_id. Stackups of
+    derived_stackups, (intervals_id, binsize) combinations on the same regions
+    with smaller windowsizes or coarser binsizes, are derived from it."""
     try:
         # decide whether to dispatch the 2d or 1d version
         if Intervals.query.get(intervals_id).source_dataset.dimension == "1d":
-            pipeline_steps.stackup_pipeline_step(dataset_id, intervals_id, binsize)
-            pipeline_steps.set_task_progress(100)
-        else:
             pipeline_steps.stackup_pipeline_step(
-                dataset_id, intervals_id, binsize, region_side="left"
+                dataset_id, intervals_id, binsize, derived_stackups=derived_stackups
             )
-            pipeline_steps.set_task_progress(50)
+            pipeline_steps.set_task_progress(100)
+        else:
+            # both anchors are read in a single pass over the bigwig
             pipeline_steps.stackup_pipeline_step(
-                dataset_id, intervals_id, binsize, region_side="right"
+                dataset_id,
+                intervals_id,
+                binsize,
+                region_side=["left", "right"],
+                derived_stackups=derived_stackups,
             )
             pipeline_steps.set_task_progress(100)
         pipeline_steps.set_dataset_finished(dataset_id, intervals_id)
@@ -157,11 +166,7 @@ def pipeline_lola(collection_id, intervals_id, binsize):
             pipeline_steps.set_task_progress(100)
         else:
             pipeline_steps.enrichment_pipeline_step(
-                collection_id, intervals_id, binsize, region_side="left"
-            )
-            pipeline_steps.set_task_progress(50)
-            pipeline_steps.enrichment_pipeline_step(
-                collection_id, intervals_id, binsize, region_side="right"
+                collection_id, intervals_id, binsize, region_side=["left", "right"]
             )
             pipeline_steps.set_task_progress(100)
         pipeline_steps.set_collection_finished(collection_id, intervals_id)
@@ -176,32 +181,33 @@ def pipeline_embedding_1d(collection_id, intervals_id, binsize):
     1-dimensional features per regions (e.g. bigwig tracks)"""
     # check whether stackups exist and perform stackup if not
     try:
-        for source_dataset in Collection.query.get(collection_id).datasets:
-            if Intervals.query.get(intervals_id).source_dataset.dimension == "1d":
-                stackup = IndividualIntervalData.query.filter(
-                    (IndividualIntervalData.dataset_id == source_dataset.id)
-                    & (IndividualIntervalData.intervals_id == intervals_id)
-                    & (IndividualIntervalData.binsize == binsize)
-                ).first()
-                if stackup is None:
-                    pipeline_steps.stackup_pipeline_step(
-                        source_dataset.id, intervals_id, binsize
-                    )
-            else:
-                stackup = IndividualIntervalData.query.filter(
-                    (IndividualIntervalData.dataset_id == source_dataset.id)
-                    & (IndividualIntervalData.intervals_id == intervals_id)
-                    & (IndividualIntervalData.binsize == binsize)
-                    & (IndividualIntervalData.region_side == "left")
-                ).first()
-                if stackup is None:
-                    # assume that if left does not exist, right also does not exist and vice versa
-                    pipeline_steps.stackup_pipeline_step(
-                        source_dataset.id, intervals_id, binsize, region_side="left"
-                    )
-                    pipeline_steps.stackup_pipeline_step(
-                        source_dataset.id, intervals_id, binsize, region_side="right"
-                    )
+        if Intervals.query.get(intervals_id).source_dataset.dimension == "1d":
+            region_side = None
+            stackup_region_side = None
+        else:
+            # assume that if left does not exist, right also does not exist and vice versa
+            region_side = "left"
+            stackup_region_side = ["left", "right"]
+        missing_dataset_ids = [
+            source_dataset.id
+            for source_dataset in Collection.query.get(collection_id).datasets
+            if IndividualIntervalData.query.filter(
+                (IndividualIntervalData.dataset_id == source_dataset.id)
+                & (IndividualIntervalData.intervals_id == intervals_id)
+                & (IndividualIntervalData.binsize == binsize)
+                & (IndividualIntervalData.region_side == region_side)
+            ).first()
+            is None
+        ]
+        if missing_dataset_ids:
+            # all missing stackups are done in a single batch that reads bigwigs in parallel
+            pipeline_steps.collection_stackup_pipeline_step(
+                missing_dataset_ids,
+                intervals_id,
+                binsize,
+                region_side=stackup_region_side,
+                max_progress=50,
+            )
         # perform embedding
         if Intervals.query.get(intervals_id).source_dataset.dimension == "1d":
             pipeline_steps.embedding_1d_pipeline_step(
@@ -210,11 +216,7 @@ def pipeline_embedding_1d(collection_id, intervals_id, binsize):
             pipeline_steps.set_task_progress(100)
         else:
             pipeline_steps.embedding_1d_pipeline_step(
-                collection_id, intervals_id, binsize, region_side="left"
-            )
-            pipeline_steps.set_task_progress(50)
-            pipeline_steps.embedding_1d_pipeline_step(
-                collection_id, intervals_id, binsize, region_side="right"
+                collection_id, intervals_id, binsize, region_side=["left", "right"]
             )
             pipeline_steps.set_task_progress(100)
         pipeline_steps.set_collection_finished(collection_id, intervals_id)
@@ -0,0 +1,54 @@
+"""Micro-benchmark of converting arrays to JSON with nan and inf replaced by null.
+Compares the element-wise conversion that was used before with flatten_and_clean_array.
+Run from the back_end directory with: python -m benchmarks.benchmark_flatten_and_clean_array"""
+import json
+import timeit
+import numpy as np
+from app.lib.utils import flatten_and_clean_array
+
+ELEMENT_NUMBER = 10**6
+REPEATS = 3
+
+
+def flatten_and_clean_array_elementwise(array):
+    """Element-wise conversion that was used before."""
+    return [
+        entry if not (np.isnan(entry) or np.isinf(entry)) else None
+        for entry in array.flatten()
+    ]
+
+
+def get_test_arrays():
+    """Returns dictionary of test arrays with different fractions of non-finite values."""
+    rng = np.random.default_rng(42)
+    values = rng.normal(size=ELEMENT_NUMBER)
+    arrays = {}
+    for fraction in [0, 0.01, 0.5]:
+        array = values.copy()
+        array[rng.random(ELEMENT_NUMBER) < fraction] = np.nan
+        arrays[f"{fraction:.0%} nan"] = array.reshape(1000, -1)
+    return arrays
+
+
+def time_per_million(function):
+    """Returns the fastest of REPEATS runs of function in seconds per million elements."""
+    seconds = min(timeit.repeat(function, number=1, repeat=REPEATS))
+    return seconds * 10**6 / ELEMENT_NUMBER
+
+
+def main():
+    print(
+        "arrays | conversion | seconds per million elements (conversion, conversion + json)"
+    )
+    for name, array in get_test_arrays().items():
+        for label, function in [
+            ("element-wise", flatten_and_clean_array_elementwise),
+            ("flatten_and_clean_array", flatten_and_clean_array),
+        ]:
+            conversion = time_per_million(lambda: function(array))
+            serialization = time_per_million(lambda: json.dumps(function(array)))
+            print(f"{name} | {label} | {conversion:.2f}, {serialization:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,7 @@
 """Test to check whether retrieving of averageIntervalData data works."""
 import os
+import gzip
+import json
 import unittest
 from unittest.mock import patch
 import numpy as np
@@ -8,7 +10,7 @@ from tests.test_utils.test_helpers import LoginTestCase, TempDirTestCase
 # add path to import app
 # import sys
 # sys.path.append("./")
-from app import db
+from app import db, response_payloads
 from app.models import Dataset, Intervals, AverageIntervalData
 
 
@@ -18,6 +20,7 @@ class TestGetAverageIntervalData(LoginTestCase, TempDirTestCase):
 
     def setUp(self):
         super().setUp()
+        self.accel_redirect_location = self.app.config["ACCEL_REDIRECT_LOCATION"]
         # add owned cooler
         self.owned_cooler = self.create_dataset(
             id=1,
@@ -159,6 +162,10 @@ class TestGetAverageIntervalData(LoginTestCase, TempDirTestCase):
             value_type="ICCF",
         )
 
+    def tearDown(self):
+        self.app.config["ACCEL_REDIRECT_LOCATION"] = self.accel_redirect_location
+        super().tearDown()
+
     def test_no_auth(self):
         """No authentication provided, response should be 401"""
         # protected route
@@ -363,6 +370,299 @@ class TestGetAverageIntervalData(LoginTestCase, TempDirTestCase):
         }
         self.assertEqual(response.json, expected)
 
+    def test_correct_binary_data_returned_with_nan_and_inf(self):
+        """Data is returned as float32 bytes with nan kept and inf converted to nan
+        if binary data is accepted"""
+        # authenticate
+        token = self.add_and_authenticate("test", "asdf")
+        # create token header
+        token_headers = self.get_token_header(token)
+        token_headers["Accept"] = "application/octet-stream"
+        # add data
+        db.session.add_all(
+            [
+                self.owned_cooler,
+                self.owned_bedfile,
+                self.owned_intervals,
+                self.avg_data_owned_w_nans,
+                self.avg_data_owned_w_inf,
+            ]
+        )
+        db.session.commit()
+        for entry in [self.avg_data_owned_w_nans, self.avg_data_owned_w_inf]:
+            # make request
+            response = self.client.get(
+                f"/api/averageIntervalData/{entry.id}/", headers=token_headers
+            )
+            layout = json.loads(response.headers["X-Array-Layout"])
+            self.assertEqual(
+                layout, {"data": {"shape": [1, 5], "dtype": "float32", "offset": 0}}
+            )
+            data = np.frombuffer(response.data, dtype="<f4")
+            np.testing.assert_allclose(
+                data, [1.66, 2.2, 3.8, 4.5, np.nan], rtol=1e-6, equal_nan=True
+            )
+
+    def test_not_modified_returned_if_data_cached(self):
+        """Data is not loaded again if the client sends the ETag of the unchanged data"""
+        # authenticate
+        token = self.add_and_authenticate("test", "asdf")
+        # create token header
+        token_headers = self.get_token_header(token)
+        # add data
+        db.session.add_all(
+            [
+                self.owned_cooler,
+                self.owned_bedfile,
+                self.owned_intervals,
+                self.avg_data_owned,
+            ]
+        )
+        db.session.commit()
+        # make request
+        response = self.client.get(
+            f"/api/averageIntervalData/{self.avg_data_owned.id}/",
+            headers=token_headers,
+            content_type="application/json",
+        )
+        etag = response.headers["ETag"]
+        self.assertIn("Last-Modified", response.headers)
+        # revalidate
+        token_headers["If-None-Match"] = etag
+        with patch("app.api.get_routes.np.load") as mock_load:
+            response = self.client.get(
+                f"/api/averageIntervalData/{self.avg_data_owned.id}/",
+                headers=token_headers,
+                content_type="application/json",
+            )
+            mock_load.assert_not_called()
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.headers["ETag"], etag)
+        # change data
+        np.save(self.avg_data_owned.file_path, np.array([[1.0, 2.0]]))
+        response = self.client.get(
+            f"/api/averageIntervalData/{self.avg_data_owned.id}/",
+            headers=token_headers,
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers["ETag"], etag)
+        self.assertEqual(response.json["data"], [1.0, 2.0])
+
+    def test_not_modified_returned_if_last_modified_is_sent_back(self):
+        """Data is not loaded again if the client revalidates with the Last-Modified date
+        of the unchanged data, but again if the data changed afterwards"""
+        # authenticate
+        token = self.add_and_authenticate("test", "asdf")
+        # create token header
+        token_headers = self.get_token_header(token)
+        # add data with modification time that has fractional seconds
+        os.utime(self.avg_data_owned.file_path, (1600000000.75, 1600000000.75))
+        db.session.add_all(
+            [
+                self.owned_cooler,
+                self.owned_bedfile,
+                self.owned_intervals,
+                self.avg_data_owned,
+            ]
+        )
+        db.session.commit()
+        # make request
+        response = self.client.get(
+            f"/api/averageIntervalData/{self.avg_data_owned.id}/",
+            headers=token_headers,
+            content_type="application/json",
+        )
+        # revalidate
+        token_headers["If-Modified-Since"] = response.headers["Last-Modified"]
+        with patch("app.api.get_routes.np.load") as mock_load:
+            response = self.client.get(
+                f"/api/averageIntervalData/{self.avg_data_owned.id}/",
+                headers=token_headers,
+                content_type="application/json",
+            )
+            mock_load.assert_not_called()
+        self.assertEqual(response.status_code, 304)
+        # change data one second later
+        os.utime(self.avg_data_owned.file_path, (1600000001.75, 1600000001.75))
+        response = self.client.get(
+            f"/api/averageIntervalData/{self.avg_data_owned.id}/",
+            headers=token_headers,
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_binary_and_json_data_have_different_etags(self):
+        """Binary and json responses of the same data are cached separately"""
+        # authenticate
+        token = self.add_and_authenticate("test", "asdf")
+        # create token header
+        token_headers = self.get_token_header(token)
+        # add data
+        db.session.add_all(
+            [
+                self.owned_cooler,
+                self.owned_bedfile,
+                self.owned_intervals,
+                self.avg_data_owned,
+            ]
+        )
+        db.session.commit()
+        etags = []
+        for accept in ["application/json", "application/octet-stream"]:
+            token_headers["Accept"] = accept
+            response = self.client.get(
+                f"/api/averageIntervalData/{self.avg_data_owned.id}/",
+                headers=token_headers,
+            )
+            etags.append(response.headers["ETag"])
+        self.assertNotEqual(etags[0], etags[1])
+
+    def test_precompressed_payload_returned_if_it_exists(self):
+        """The payload written by the pipeline is returned instead of loading the data"""
+        # authenticate
+        token = self.add_and_authenticate("test", "asdf")
+        # create token header
+        token_headers = self.get_token_header(token)
+        # add data
+        db.session.add_all(
+            [
+                self.owned_cooler,
+                self.owned_bedfile,
+                self.owned_intervals,
+                self.avg_data_owned_w_nans,
+            ]
+        )
+        db.session.commit()
+        response_payloads.write_payload(
+            response_payloads.get_array_payload(self.test_data_w_nans),
+            self.avg_data_owned_w_nans.file_path,
+        )
+        # make request
+        with patch("app.api.get_routes.np.load") as mock_load:
+            response = self.client.get(
+                f"/api/averageIntervalData/{self.avg_data_owned_w_nans.id}/",
+                headers={**token_headers, "Accept-Encoding": "gzip"},
+                content_type="application/json",
+            )
+            mock_load.assert_not_called()
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        expected = {
+            "data": [1.66, 2.2, 3.8, 4.5, None],
+            "shape": [1, 5],
+            "dtype": "float32",
+        }
+        self.assertEqual(json.loads(gzip.decompress(response.data)), expected)
+
+    def test_precompressed_payload_decompressed_if_gzip_not_accepted(self):
+        """The payload written by the pipeline is decompressed for clients that do not
+        accept gzipped content"""
+        # authenticate
+        token = self.add_and_authenticate("test", "asdf")
+        # create token header
+        token_headers = self.get_token_header(token)
+        # add data
+        db.session.add_all(
+            [
+                self.owned_cooler,
+                self.owned_bedfile,
+                self.owned_intervals,
+                self.avg_data_owned_w_nans,
+            ]
+        )
+        db.session.commit()
+        response_payloads.write_payload(
+            response_payloads.get_array_payload(self.test_data_w_nans),
+            self.avg_data_owned_w_nans.file_path,
+        )
+        # make request
+        response = self.client.get(
+            f"/api/averageIntervalData/{self.avg_data_owned_w_nans.id}/",
+            headers={**token_headers, "Accept-Encoding": "identity"},
+            content_type="application/json",
+        )
+        self.assertNotIn("Content-Encoding", response.headers)
+        self.assertIn("Accept-Encoding", response.headers["Vary"])
+        expected = {
+            "data": [1.66, 2.2, 3.8, 4.5, None],
+            "shape": [1, 5],
+            "dtype": "float32",
+        }
+        self.assertEqual(json.loads(response.data), expected)
+
+    def test_accel_redirect_returned_if_location_is_set(self):
+        """nginx is instructed to send the payload if an internal location is configured"""
+        self.app.config["ACCEL_REDIRECT_LOCATION"] = "/protected_data/"
+        # authenticate
+        token = self.add_and_authenticate("test", "asdf")
+        # create token header
+        token_headers = self.get_token_header(token)
+        # add data
+        db.session.add_all(
+            [
+                self.owned_cooler,
+                self.owned_bedfile,
+                self.owned_intervals,
+                self.avg_data_owned_w_nans,
+            ]
+        )
+        db.session.commit()
+        response_payloads.write_payload(
+            response_payloads.get_array_payload(self.test_data_w_nans),
+            self.avg_data_owned_w_nans.file_path,
+        )
+        # make request
+        with patch("app.api.get_routes.np.load") as mock_load:
+            response = self.client.get(
+                f"/api/averageIntervalData/{self.avg_data_owned_w_nans.id}/",
+                headers={**token_headers, "Accept-Encoding": "gzip"},
+                content_type="application/json",
+            )
+            mock_load.assert_not_called()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.headers["X-Accel-Redirect"],
+            "/protected_data/test1_payload.json.gz",
+        )
+        self.assertEqual(response.data, b"")
+        # validators are passed on by nginx
+        self.assertIn("ETag", response.headers)
+        self.assertEqual(response.headers["Cache-Control"], "private, no-cache")
+        self.assertIn("Accept", response.headers["Vary"])
+
+    def test_data_returned_by_flask_if_accel_redirect_location_is_set_without_payload(
+        self,
+    ):
+        """Data without payload is returned by flask even if an internal location is configured"""
+        self.app.config["ACCEL_REDIRECT_LOCATION"] = "/protected_data/"
+        # authenticate
+        token = self.add_and_authenticate("test", "asdf")
+        # create token header
+        token_headers = self.get_token_header(token)
+        # add data
+        db.session.add_all(
+            [
+                self.owned_cooler,
+                self.owned_bedfile,
+                self.owned_intervals,
+                self.avg_data_owned,
+            ]
+        )
+        db.session.commit()
+        # make request
+        response = self.client.get(
+            f"/api/averageIntervalData/{self.avg_data_owned.id}/",
+            headers=token_headers,
+            content_type="application/json",
+        )
+        self.assertNotIn("X-Accel-Redirect", response.headers)
+        expected = {
+            "data": [1.66, 2.2, 3.8, 4.5],
+            "shape": [1, 4],
+            "dtype": "float32",
+        }
+        self.assertEqual(response.json, expected)
+
     def test_public_unowned_data_returned(self):
         """Test whether public, unowned data is returned correctly."""
         # authenticate
@@ -166,7 +166,7 @@ class TestGetEmbeddingIntervalDataFeatures(LoginTestCase, TempDirTestCase):
         # make request
         response = self.client.get(
             f"/api/embeddingIntervalData/{self.assoc_data_owned.id}/0/",
-            headers=token_headers,
+            headers={**token_headers, "Accept-Encoding": "gzip"},
             content_type="application/json",
         )
         data = json.loads(gzip.decompress(response.data))
@@ -196,6 +196,7 @@ class TestGetEmbeddingIntervalDataFeatures(LoginTestCase, TempDirTestCase):
             # make request
             response = self.client.get(
                 f"/api/embeddingIntervalData/{self.assoc_data_owned.id}/0/",
+                headers={"Accept-Encoding": "gzip"},
                 content_type="application/json",
             )
             data = json.loads(gzip.decompress(response.data))
@@ -225,7 +226,7 @@ class TestGetEmbeddingIntervalDataFeatures(LoginTestCase, TempDirTestCase):
         # make request
         response = self.client.get(
             f"/api/embeddingIntervalData/{self.assoc_data_owned.id}/2/",
-            headers=token_headers,
+            headers={**token_headers, "Accept-Encoding": "gzip"},
             content_type="application/json",
         )
         data = json.loads(gzip.decompress(response.data))
@@ -192,7 +192,7 @@ class TestGetEmbeddingIntervalData(LoginTestCase, TempDirTestCase):
         # make request
         response = self.client.get(
             f"/api/embeddingIntervalData/{self.embedding_data_owned.id}/",
-            headers=token_headers,
+            headers={**token_headers, "Accept-Encoding": "gzip"},
             content_type="application/json",
         )
         data = json.loads(gzip.decompress(response.data))
@@ -215,6 +215,45 @@ class TestGetEmbeddingIntervalData(LoginTestCase, TempDirTestCase):
         }
         self.assertEqual(data, expected)
 
+    def test_correct_binary_data_returned(self):
+        """Arrays are returned as float32 bytes with their layout if binary data is accepted"""
+        # authenticate
+        token = self.add_and_authenticate("test", "asdf")
+        # create token header
+        token_headers = self.get_token_header(token)
+        token_headers["Accept"] = "application/octet-stream"
+        # add data
+        db.session.add_all(
+            [
+                self.owned_cooler,
+                self.owned_bedfile,
+                self.owned_intervals,
+                self.embedding_data_owned,
+            ]
+        )
+        db.session.commit()
+        # make request
+        response = self.client.get(
+            f"/api/embeddingIntervalData/{self.embedding_data_owned.id}/",
+            headers=token_headers,
+        )
+        self.assertEqual(response.headers["Content-Type"], "application/octet-stream")
+        layout = json.loads(response.headers["X-Array-Layout"])
+        for name, expected in [
+            ("embedding", self.test_data),
+            ("cluster_ids", self.cluster_data),
+            ("thumbnails", self.thumbnail_data),
+        ]:
+            self.assertEqual(layout[name]["shape"], list(expected.shape))
+            self.assertEqual(layout[name]["dtype"], "float32")
+            data = np.frombuffer(
+                response.data,
+                dtype="<f4",
+                count=expected.size,
+                offset=layout[name]["offset"],
+            )
+            np.testing.assert_array_equal(data.reshape(expected.shape), expected)
+
     def test_correct_data_returned_showcase(self):
         """Correct data is returned from an owned embeddingIntervalData"""
         app_config = self.app.config.copy()
@@ -234,6 +273,7 @@ class TestGetEmbeddingIntervalData(LoginTestCase, TempDirTestCase):
             # make request
             response = self.client.get(
                 f"/api/embeddingIntervalData/{self.embedding_data_owned.id}/",
+                headers={"Accept-Encoding": "gzip"},
                 content_type="application/json",
             )
             data = json.loads(gzip.decompress(response.data))
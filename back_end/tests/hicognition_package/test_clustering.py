@@ -0,0 +1,52 @@
+"""Tests the clustering of embeddings in the hicognition library"""
+import unittest
+import numpy as np
+from app.lib import clustering
+
+
+class TestCentroidHierarchy(unittest.TestCase):
+    """Tests for CentroidHierarchy"""
+
+    def setUp(self):
+        rng = np.random.default_rng(42)
+        self.data = np.concatenate(
+            [rng.normal(center, 0.1, (50, 2)) for center in [0, 5, 10, 15]]
+        )
+        self.hierarchy = clustering.CentroidHierarchy(8, random_state=0).fit(self.data)
+
+    def test_largest_cluster_number_equal_to_kmeans(self):
+        """Tests whether clusters of the largest cluster number are the kmeans clusters"""
+        np.testing.assert_array_equal(
+            self.hierarchy.get_labels(8), self.hierarchy.kmeans.labels_
+        )
+
+    def test_cluster_numbers_cut_from_hierarchy(self):
+        """Tests whether every smaller cluster number is cut from the hierarchy"""
+        for cluster_number in range(1, 9):
+            labels = self.hierarchy.get_labels(cluster_number)
+            self.assertEqual(len(np.unique(labels)), cluster_number)
+            self.assertEqual(labels.max(), cluster_number - 1)
+
+    def test_clusters_are_nested(self):
+        """Tests whether clusters of fewer clusters are unions of clusters of more clusters"""
+        large = self.hierarchy.get_labels(8)
+        small = self.hierarchy.get_labels(4)
+        for cluster in np.unique(large):
+            self.assertEqual(len(np.unique(small[large == cluster])), 1)
+
+    def test_separated_groups_recovered(self):
+        """Tests whether well separated groups end up in separate clusters"""
+        small = self.hierarchy.get_labels(4)
+        for group in range(4):
+            self.assertEqual(len(np.unique(small[group * 50 : (group + 1) * 50])), 1)
+        self.assertEqual(len(np.unique(small[::50])), 4)
+
+    def test_predict_equal_to_labels(self):
+        """Tests whether predicting the fitted data returns its labels"""
+        np.testing.assert_array_equal(
+            self.hierarchy.predict(self.data, 4), self.hierarchy.get_labels(4)
+        )
+
+
+if __name__ == "__main__":
+    res = unittest.main(verbosity=3, exit=False)
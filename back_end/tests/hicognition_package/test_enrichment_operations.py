@@ -0,0 +1,200 @@
+"""Tests the enrichment operations in the hicognition library"""
+import unittest
+import numpy as np
+import pandas as pd
+import bioframe as bf
+from scipy.stats import fisher_exact
+from app.lib import enrichment_operations
+
+
+class TestIntervalIndex(unittest.TestCase):
+    """Tests for IntervalIndex"""
+
+    def setUp(self):
+        self.targets = pd.DataFrame(
+            {
+                "chrom": ["chr1", "chr1", "chr1", "chr2"],
+                "start": [500, 100, 150, 0],
+                "end": [600, 400, 200, 50],
+            }
+        )
+
+    def test_overlaps(self):
+        """Tests whether overlaps of half-open intervals are found"""
+        queries = pd.DataFrame(
+            {
+                "chrom": ["chr1", "chr1", "chr1", "chr1", "chr2", "chr3"],
+                "start": [0, 400, 300, 600, 49, 0],
+                "end": [100, 500, 310, 700, 60, 1000],
+            }
+        )
+        result = enrichment_operations.IntervalIndex(self.targets).overlaps(queries)
+        np.testing.assert_array_equal(result, [False, False, True, False, True, False])
+
+    def test_overlaps_equal_to_bioframe(self):
+        """Tests whether overlaps of random intervals are equal to bioframe overlaps"""
+        rng = np.random.default_rng(42)
+        starts = rng.integers(0, 100000, 200)
+        targets = pd.DataFrame(
+            {
+                "chrom": "chr1",
+                "start": starts,
+                "end": starts + rng.integers(1, 500, 200),
+            }
+        )
+        universe = bf.binnify(pd.Series({"chr1": 100000}), 1000)
+        result = enrichment_operations.IntervalIndex(targets).overlaps(universe)
+        expected = bf.count_overlaps(universe, targets)["count"].values > 0
+        np.testing.assert_array_equal(result, expected)
+
+
+class TestGetOddsRatios(unittest.TestCase):
+    """Tests for get_odds_ratios"""
+
+    def test_odds_ratios(self):
+        """Tests whether odds ratio is calculated from contingency tables over universe regions"""
+        universe_in_queries = np.array(
+            [
+                [True, False],
+                [True, True],
+                [True, True],
+                [False, True],
+                [False, False],
+                [False, False],
+                [False, False],
+                [False, False],
+            ]
+        )
+        universe_in_targets = np.array(
+            [
+                [True, False],
+                [True, False],
+                [False, False],
+                [True, False],
+                [False, True],
+                [False, False],
+                [False, False],
+                [False, False],
+            ]
+        )
+        result = enrichment_operations.get_odds_ratios(
+            universe_in_queries, universe_in_targets
+        )
+        self.assertEqual(result.shape, (2, 2))
+        # target 1, query 1: support 2, query only 1, target only 1, rest 4
+        self.assertAlmostEqual(result[0, 0], 8.0)
+        # target 1, query 2: support 2, query only 1, target only 1, rest 4
+        self.assertAlmostEqual(result[0, 1], 8.0)
+        # target 2, query 1: support 0, query only 3, target only 1, rest 4
+        self.assertAlmostEqual(result[1, 0], 0.0)
+        self.assertAlmostEqual(result[1, 1], 0.0)
+
+    def test_odds_ratios_equal_to_fisher_exact(self):
+        """Tests whether odds ratios of random overlaps are equal to those of scipy"""
+        rng = np.random.default_rng(42)
+        universe_in_queries = rng.random((100, 5)) > 0.7
+        universe_in_targets = rng.random((100, 3)) > 0.5
+        result = enrichment_operations.get_odds_ratios(
+            universe_in_queries, universe_in_targets
+        )
+        for target in range(3):
+            for query in range(5):
+                support = np.sum(
+                    universe_in_queries[:, query] & universe_in_targets[:, target]
+                )
+                query_only = universe_in_queries[:, query].sum() - support
+                target_only = universe_in_targets[:, target].sum() - support
+                rest = 100 - support - query_only - target_only
+                expected = fisher_exact([[support, query_only], [target_only, rest]])[0]
+                self.assertAlmostEqual(result[target, query], expected)
+
+    def test_odds_ratios_of_large_universe_use_exact_counts(self):
+        """Tests whether overlaps counted with float matrix products are equal to
+        integer counts for a large universe"""
+        rng = np.random.default_rng(42)
+        universe_in_queries = rng.random((300000, 4)) > 0.3
+        universe_in_targets = rng.random((300000, 3)) > 0.5
+        expected = enrichment_operations.get_odds_ratios_from_counts(
+            universe_in_targets.T.astype(np.int64)
+            @ universe_in_queries.astype(np.int64),
+            universe_in_queries.sum(axis=0),
+            universe_in_targets.sum(axis=0),
+            300000,
+        )
+        result = enrichment_operations.get_odds_ratios(
+            universe_in_queries, universe_in_targets
+        )
+        np.testing.assert_array_equal(result, expected)
+
+    def test_degenerate_contingency_tables(self):
+        """Tests whether odds ratio is inf if the denominator is zero and nan if a
+        margin of the contingency table is zero"""
+        universe_in_queries = np.array([[True, False], [False, False], [False, False]])
+        universe_in_targets = np.array([[True], [False], [False]])
+        result = enrichment_operations.get_odds_ratios(
+            universe_in_queries, universe_in_targets
+        )
+        self.assertTrue(np.isinf(result[0, 0]))
+        self.assertTrue(np.isnan(result[0, 1]))
+
+
+class TestBitsets(unittest.TestCase):
+    """Tests for the bitset representation of intervals over universe bins"""
+
+    def setUp(self):
+        self.chromsizes = pd.Series({"chr1": 1050, "chr2": 300})
+        self.universe = bf.binnify(self.chromsizes, 100)
+
+    def test_bin_number(self):
+        """Tests whether bin number is equal to the number of bins of bioframe"""
+        self.assertEqual(
+            enrichment_operations.get_bin_number(self.chromsizes, 100),
+            len(self.universe),
+        )
+
+    def test_bin_indices(self):
+        """Tests whether aligned intervals are assigned to the universe bin they overlap"""
+        intervals = pd.DataFrame(
+            {
+                "chrom": ["chr1", "chr1", "chr2", "chr2", "chr1", "chr3"],
+                "start": [0, 1000, 200, 300, -100, 0],
+                "end": [100, 1100, 300, 400, 0, 100],
+            }
+        )
+        result = enrichment_operations.get_bin_indices(intervals, self.chromsizes, 100)
+        np.testing.assert_array_equal(result, [0, 10, 13, -1, -1, -1])
+        universe_in_intervals = enrichment_operations.IntervalIndex(intervals).overlaps(
+            self.universe
+        )
+        np.testing.assert_array_equal(
+            np.flatnonzero(universe_in_intervals), [0, 10, 13]
+        )
+
+    def test_pack_bins(self):
+        """Tests whether set bins are packed into bitsets"""
+        result = enrichment_operations.pack_bins([[0, 9, -1], []], 10)
+        np.testing.assert_array_equal(
+            np.unpackbits(result, axis=1)[:, :10],
+            [[1, 0, 0, 0, 0, 0, 0, 0, 0, 1], [0, 0, 0, 0, 0, 0, 0, 0, 0, 0]],
+        )
+
+    def test_odds_ratios_equal_to_boolean_matrices(self):
+        """Tests whether odds ratios from bitsets are equal to odds ratios of boolean matrices"""
+        rng = np.random.default_rng(42)
+        universe_in_queries = rng.random((101, 5)) > 0.7
+        universe_in_targets = rng.random((101, 3)) > 0.5
+        result = enrichment_operations.get_odds_ratios_from_bitsets(
+            np.packbits(universe_in_queries.T, axis=1),
+            np.packbits(universe_in_targets.T, axis=1),
+            101,
+        )
+        np.testing.assert_array_almost_equal(
+            result,
+            enrichment_operations.get_odds_ratios(
+                universe_in_queries, universe_in_targets
+            ),
+        )
+
+
+if __name__ == "__main__":
+    res = unittest.main(verbosity=3, exit=False)
@@ -1,5 +1,6 @@
 """Tests the image feature extraction in the hicognition library"""
 import unittest
+import cv2
 import numpy as np
 from app.lib import feature_extraction
 
@@ -41,6 +42,54 @@ class TestExtractImageFeatures(unittest.TestCase):
         expected = np.array([[-0.74355736], [-0.67001872], [1.41357609]])
         self.assertTrue(np.allclose(result, expected, atol=0.1))
 
+    def test_chunked_extraction_equal_to_full_extraction(self):
+        """Tests whether concatenated pixel features of chunks give the same result as
+        extracting features from all images at once"""
+        images = [np.random.normal(0, 1, (20, 20)) for i in range(7)]
+        expected = feature_extraction.extract_image_features(images)
+        chunks = [
+            feature_extraction.extract_pixel_features(images[index : index + 3])
+            for index in range(0, len(images), 3)
+        ]
+        result = feature_extraction.scale_image_features(np.concatenate(chunks))
+        self.assertTrue(np.allclose(result, expected))
+
+    def test_batched_extraction_equal_to_single_images(self):
+        """Tests whether images resized as batches give the same features as resizing each
+        image on its own, also if batches are processed by multiple threads"""
+        images = np.random.normal(0, 1, (1100, 40, 40))
+        images[:, 5, 5] = np.nan
+        expected = np.stack(
+            [
+                cv2.resize(cv2.GaussianBlur(image, (5, 5), 1), (10, 10)).flatten()
+                for image in images
+            ]
+        )
+        for threads in [1, 3]:
+            result = feature_extraction.extract_pixel_features(
+                images, (10, 10), threads=threads
+            )
+            np.testing.assert_allclose(result, expected, equal_nan=True)
+
+    def test_upscaled_extraction_equal_to_single_images(self):
+        """Tests whether images smaller than pixel_target are upscaled like single images"""
+        images = np.random.normal(0, 1, (3, 5, 5))
+        expected = np.stack([cv2.resize(image, (10, 10)).flatten() for image in images])
+        result = feature_extraction.extract_pixel_features(images, (10, 10))
+        np.testing.assert_allclose(result, expected)
+
+    def test_upscaled_extraction_with_nans_equal_to_single_images(self):
+        """Tests whether many images smaller than pixel_target that contain nans are
+        upscaled like single images, also if they are processed by multiple threads"""
+        images = np.random.normal(0, 1, (600, 6, 6))
+        images[np.random.random(images.shape) < 0.05] = np.nan
+        expected = np.stack([cv2.resize(image, (10, 10)).flatten() for image in images])
+        for threads in [1, 3]:
+            result = feature_extraction.extract_pixel_features(
+                images, (10, 10), threads=threads
+            )
+            np.testing.assert_array_equal(result, expected)
+
 
 if __name__ == "__main__":
     res = unittest.main(verbosity=3, exit=False)
@@ -0,0 +1,176 @@
+"""Tests the pileup operations in the hicognition library"""
+import unittest
+import numpy as np
+import pandas as pd
+from app.lib import pileup_operations
+
+
+class TestExpectedToLookup(unittest.TestCase):
+    """Tests for expected_to_lookup"""
+
+    def test_lookup_indexed_by_diagonal(self):
+        """Tests whether averages are indexed by diagonal per region"""
+        expected = pd.DataFrame(
+            {
+                "region": ["chr1:0-100", "chr1:0-100", "chr1:0-100", "chr2:0-100"],
+                "diag": [0, 2, 1, 0],
+                "balanced.avg": [1.0, 3.0, 2.0, 4.0],
+            }
+        )
+        result = pileup_operations.expected_to_lookup(expected)
+        self.assertEqual(sorted(result.keys()), ["chr1:0-100", "chr2:0-100"])
+        self.assertTrue(np.allclose(result["chr1:0-100"], [1.0, 2.0, 3.0]))
+        self.assertTrue(np.allclose(result["chr2:0-100"], [4.0]))
+
+
+class TestDivideByExpected(unittest.TestCase):
+    """Tests for divide_by_expected"""
+
+    def test_window_on_diagonal(self):
+        """Tests division of window that is centered on the main diagonal"""
+        window = np.full((3, 3), 6.0)
+        result = pileup_operations.divide_by_expected(window, np.array([1.0, 2.0, 3.0]))
+        expected = np.array([[6.0, 3.0, 2.0], [3.0, 6.0, 3.0], [2.0, 3.0, 6.0]])
+        self.assertTrue(np.allclose(result, expected))
+
+    def test_window_off_diagonal(self):
+        """Tests division of window whose second anchor is shifted by an offset"""
+        window = np.full((2, 2), 12.0)
+        result = pileup_operations.divide_by_expected(
+            window, np.array([1.0, 2.0, 3.0, 4.0]), diagonal_offset=2
+        )
+        expected = np.array([[4.0, 3.0], [6.0, 4.0]])
+        self.assertTrue(np.allclose(result, expected))
+
+    def test_missing_diagonals_are_nan(self):
+        """Tests whether distances that are not covered by expected result in nans"""
+        window = np.ones((3, 3))
+        result = pileup_operations.divide_by_expected(window, np.array([1.0, 1.0]))
+        self.assertTrue(np.isnan(result[0, 2]))
+        self.assertTrue(np.isnan(result[2, 0]))
+        self.assertEqual(np.sum(np.isnan(result)), 2)
+
+    def test_empty_window(self):
+        """Tests whether empty windows are returned unchanged"""
+        result = pileup_operations.divide_by_expected(np.array([]), np.array([1.0]))
+        self.assertEqual(result.size, 0)
+
+
+class TestObsExpFromIccf(unittest.TestCase):
+    """Tests for obs_exp_from_iccf"""
+
+    def setUp(self):
+        self.expected = pd.DataFrame(
+            {
+                "region": ["chr1:0-100"] * 2,
+                "diag": [0, 1],
+                "balanced.avg": [2.0, 4.0],
+            }
+        )
+
+    def test_stack_input(self):
+        """Tests whether a stack of windows is converted correctly"""
+        windows = np.ones((2, 2, 2))
+        result = pileup_operations.obs_exp_from_iccf(
+            windows, ["chr1:0-100", "chr2:0-100"], self.expected
+        )
+        self.assertEqual(result.shape, (2, 2, 2))
+        self.assertTrue(
+            np.allclose(result[..., 0], np.array([[0.5, 0.25], [0.25, 0.5]]))
+        )
+        # region not in expected is filled with nans
+        self.assertTrue(np.all(np.isnan(result[..., 1])))
+
+    def test_list_input(self):
+        """Tests whether a list of windows with different sizes is converted correctly"""
+        windows = [np.ones((1, 1)), np.full((2, 2), 8.0), np.array([])]
+        result = pileup_operations.obs_exp_from_iccf(
+            windows, ["chr1:0-100"] * 3, self.expected
+        )
+        self.assertEqual(len(result), 3)
+        self.assertTrue(np.allclose(result[0], [[0.5]]))
+        self.assertTrue(np.allclose(result[1], np.array([[4.0, 2.0], [2.0, 4.0]])))
+        self.assertEqual(result[2].size, 0)
+
+
+class TestPileupAccumulator(unittest.TestCase):
+    """Tests for PileupAccumulator"""
+
+    def test_average_equal_to_nanmean(self):
+        """Tests whether chunked accumulation gives the same result as nanmean"""
+        windows = np.random.normal(size=(10, 3, 3))
+        windows[windows > 1] = np.nan
+        accumulator = pileup_operations.PileupAccumulator((3, 3))
+        accumulator.add(windows[:4])
+        accumulator.add(windows[4:])
+        result = accumulator.average()
+        self.assertEqual(result.shape, (1, 3, 3))
+        self.assertTrue(
+            np.allclose(result[0], np.nanmean(windows, axis=0), equal_nan=True)
+        )
+
+    def test_pixels_without_values_are_nan(self):
+        """Tests whether pixels without any valid value result in nan"""
+        windows = np.full((2, 2, 2), np.nan)
+        windows[:, 0, 0] = [1.0, 3.0]
+        accumulator = pileup_operations.PileupAccumulator((2, 2))
+        accumulator.add(windows)
+        result = accumulator.average()[0]
+        self.assertEqual(result[0, 0], 2.0)
+        self.assertEqual(np.sum(np.isnan(result)), 3)
+
+    def test_grouped_averages(self):
+        """Tests whether windows are averaged per group"""
+        windows = np.stack([np.full((2, 2), value) for value in [1.0, 2.0, 3.0, 5.0]])
+        accumulator = pileup_operations.PileupAccumulator((2, 2), group_number=3)
+        accumulator.add(windows[:2], group_ids=[0, 1])
+        accumulator.add(windows[2:], group_ids=[0, 1])
+        result = accumulator.average()
+        self.assertTrue(np.allclose(result[0], 2.0))
+        self.assertTrue(np.allclose(result[1], 3.5))
+        self.assertTrue(np.all(np.isnan(result[2])))
+
+    def test_merged_groups_equal_to_coarse_grouping(self):
+        """Tests whether merging groups gives the same averages as adding the windows with the coarse groups"""
+        windows = np.random.normal(size=(20, 3, 3))
+        windows[windows > 1] = np.nan
+        fine_ids = np.arange(20) % 4
+        fine_to_coarse = np.array([0, 1, 0, 1])
+        fine = pileup_operations.PileupAccumulator((3, 3), group_number=4)
+        fine.add(windows, group_ids=fine_ids)
+        coarse = pileup_operations.PileupAccumulator((3, 3), group_number=2)
+        coarse.add(windows, group_ids=fine_to_coarse[fine_ids])
+        merged = fine.merge_groups(fine_to_coarse, 2)
+        np.testing.assert_array_equal(merged.counts, coarse.counts)
+        np.testing.assert_allclose(merged.average(), coarse.average())
+
+
+class TestGroupedNanmean(unittest.TestCase):
+    """Tests for grouped_nanmean"""
+
+    def test_equal_to_groupby_mean(self):
+        """Tests whether grouped means equal pandas groupby means"""
+        values = np.random.normal(size=(50, 4))
+        group_ids = np.random.randint(0, 3, size=50)
+        group_ids[:3] = [0, 1, 2]
+        result = pileup_operations.grouped_nanmean(values, group_ids, 3)
+        expected = pd.DataFrame(values).groupby(group_ids).mean().values
+        np.testing.assert_allclose(result, expected)
+
+    def test_nans_ignored(self):
+        """Tests whether nans are ignored and empty groups are nan"""
+        values = np.array([[1.0, np.nan], [3.0, np.nan], [5.0, 2.0]])
+        result = pileup_operations.grouped_nanmean(values, [0, 0, 1], 3)
+        np.testing.assert_array_equal(
+            result, np.array([[2.0, np.nan], [5.0, 2.0], [np.nan, np.nan]])
+        )
+
+    def test_empty_values(self):
+        """Tests whether empty values result in nan for all groups"""
+        result = pileup_operations.grouped_nanmean(np.empty((0, 2, 2)), [], 2)
+        self.assertEqual(result.shape, (2, 2, 2))
+        self.assertTrue(np.all(np.isnan(result)))
+
+
+if __name__ == "__main__":
+    res = unittest.main(verbosity=3, exit=False)
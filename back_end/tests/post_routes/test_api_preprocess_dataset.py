@@ -117,6 +117,34 @@ class TestPreprocessDataset(LoginTestCase, TempDirTestCase):
             interval5,
         ]
 
+    # stackups are done at the finest binsize and derived for coarser binsizes and
+    # smaller windowsizes
+    expected_stackup_calls = [
+        (1, 1000, {"derived_stackups": [(1, 2000), (1, 5000), (1, 10000)]}),
+        (2, 500, {"derived_stackups": [(2, 1000), (2, 2000), (7, 500)]}),
+        (3, 2000, {"derived_stackups": [(3, 10000), (3, 20000)]}),
+        (3, 5000, {}),
+        (4, 10000, {"derived_stackups": [(4, 20000), (4, 50000), (4, 100000)]}),
+        (5, 20000, {"derived_stackups": [(5, 100000), (5, 200000)]}),
+        (5, 50000, {}),
+        (
+            6,
+            100,
+            {
+                "derived_stackups": [
+                    (6, 500),
+                    (8, 100),
+                    (8, 500),
+                    (9, 100),
+                    (9, 500),
+                    (10, 100),
+                    (10, 500),
+                ]
+            },
+        ),
+        (7, 200, {"derived_stackups": [(7, 1000)]}),
+    ]
+
     @patch("app.models.User.launch_task")
     def test_pipeline_pileup_is_called_correctly(self, mock_launch):
         """Tests whether cooler pipeline to do pileups is called correctly."""
@@ -140,21 +168,25 @@ class TestPreprocessDataset(LoginTestCase, TempDirTestCase):
             content_type="multipart/form-data",
         )
         self.assertEqual(response.status_code, 200)
-        # check whether pipeline has been called with right parameters
-        intervals = [1, 2, 3, 4, 5]
-        for interval_id in intervals:
-            interval = Intervals.query.get(interval_id)
-            for binsize in current_app.config["PREPROCESSING_MAP"][interval.windowsize][
-                "cooler"
-            ]:
-                mock_launch.assert_any_call(
-                    self.app.queues["long"],
-                    "pipeline_pileup",
-                    "run pileup pipeline",
-                    dataset_id=1,
-                    intervals_id=interval.id,
-                    binsize=binsize,
-                )
+        # check whether pipeline has been called once per binsize with smaller windowsizes nested
+        expected_calls = [
+            (1, 1000, {"nested_intervals_ids": [2, 7, 6]}),
+            (1, 5000, {"nested_intervals_ids": [2]}),
+            (3, 10000, {}),
+            (4, 20000, {}),
+            (5, 50000, {}),
+        ]
+        for interval_id, binsize, nested_kwargs in expected_calls:
+            mock_launch.assert_any_call(
+                self.app.queues["long"],
+                "pipeline_pileup",
+                "run pileup pipeline",
+                dataset_id=1,
+                intervals_id=interval_id,
+                binsize=binsize,
+                **nested_kwargs,
+            )
+        self.assertEqual(mock_launch.call_count, len(expected_calls))
 
     @patch("app.models.User.launch_task")
     def test_pipeline_pileup_is_called_correctly_w_small_preprocessing_map(
@@ -182,20 +214,14 @@ class TestPreprocessDataset(LoginTestCase, TempDirTestCase):
         )
         self.assertEqual(response.status_code, 200)
         # check whether pipeline has been called with right parameters
-        intervals = [2, 6, 7]
-        for interval_id in intervals:
-            interval = Intervals.query.get(interval_id)
-            for binsize in current_app.config["PREPROCESSING_MAP_SMALL_WINDOWSIZES"][
-                interval.windowsize
-            ]["cooler"]:
-                mock_launch.assert_any_call(
-                    self.app.queues["long"],
-                    "pipeline_pileup",
-                    "run pileup pipeline",
-                    dataset_id=1,
-                    intervals_id=interval.id,
-                    binsize=binsize,
-                )
+        mock_launch.assert_called_once_with(
+            self.app.queues["long"],
+            "pipeline_pileup",
+            "run pileup pipeline",
+            dataset_id=1,
+            intervals_id=2,
+            binsize=1000,
+        )
 
     @patch("app.models.User.launch_task")
     def test_user_cannot_access_other_datasets(self, mock_launch):
@@ -291,21 +317,25 @@ class TestPreprocessDataset(LoginTestCase, TempDirTestCase):
             content_type="multipart/form-data",
         )
         self.assertEqual(response.status_code, 200)
-        # check whether pipeline has been called with right parameters
-        intervals = [1, 2, 3, 4, 5]
-        for interval_id in intervals:
-            interval = Intervals.query.get(interval_id)
-            for binsize in current_app.config["PREPROCESSING_MAP"][interval.windowsize][
-                "cooler"
-            ]:
-                mock_launch.assert_any_call(
-                    self.app.queues["long"],
-                    "pipeline_pileup",
-                    "run pileup pipeline",
-                    dataset_id=5,
-                    intervals_id=interval.id,
-                    binsize=binsize,
-                )
+        # check whether pipeline has been called once per binsize with smaller windowsizes nested
+        expected_calls = [
+            (1, 1000, {"nested_intervals_ids": [2, 7, 6]}),
+            (1, 5000, {"nested_intervals_ids": [2]}),
+            (3, 10000, {}),
+            (4, 20000, {}),
+            (5, 50000, {}),
+        ]
+        for interval_id, binsize, nested_kwargs in expected_calls:
+            mock_launch.assert_any_call(
+                self.app.queues["long"],
+                "pipeline_pileup",
+                "run pileup pipeline",
+                dataset_id=5,
+                intervals_id=interval_id,
+                binsize=binsize,
+                **nested_kwargs,
+            )
+        self.assertEqual(mock_launch.call_count, len(expected_calls))
 
     @patch("app.models.User.launch_task")
     def test_pipeline_stackup_is_called_correctly_for_owned_dataset(self, mock_launch):
@@ -331,20 +361,17 @@ class TestPreprocessDataset(LoginTestCase, TempDirTestCase):
         )
         self.assertEqual(response.status_code, 200)
         # check whether pipeline has been called with right parameters
-        intervals = [1, 2, 3, 4, 5]
-        for interval_id in intervals:
-            interval = Intervals.query.get(interval_id)
-            for binsize in current_app.config["PREPROCESSING_MAP"][interval.windowsize][
-                "bigwig"
-            ]:
-                mock_launch.assert_any_call(
-                    self.app.queues["medium"],
-                    "pipeline_stackup",
-                    "run stackup pipeline",
-                    dataset_id=6,
-                    intervals_id=interval.id,
-                    binsize=binsize,
-                )
+        for interval_id, binsize, nested_kwargs in self.expected_stackup_calls:
+            mock_launch.assert_any_call(
+                self.app.queues["medium"],
+                "pipeline_stackup",
+                "run stackup pipeline",
+                dataset_id=6,
+                intervals_id=interval_id,
+                binsize=binsize,
+                **nested_kwargs,
+            )
+        self.assertEqual(mock_launch.call_count, len(self.expected_stackup_calls))
 
     @patch("app.models.User.launch_task")
     @patch("app.models.Task.get_rq_job")
@@ -411,24 +438,24 @@ class TestPreprocessDataset(LoginTestCase, TempDirTestCase):
         )
         self.assertEqual(response.status_code, 200)
         # check whether pipeline has been called with right parameters
-        intervals = [1]
-        datasets = [2, 6]
-        for interval_id in intervals:
-            interval = Intervals.query.get(interval_id)
-            for dataset_id in datasets:
-                dataset = Dataset.query.get(dataset_id)
-                for binsize in current_app.config["PREPROCESSING_MAP"][
-                    interval.windowsize
-                ][dataset.filetype]:
-                    mock_launch.assert_any_call(
-                        current_app.queues[
-                            current_app.config["PIPELINE_QUEUES"][dataset.filetype]
-                        ],
-                        *current_app.config["PIPELINE_NAMES"][dataset.filetype],
-                        dataset_id=dataset.id,
-                        intervals_id=interval.id,
-                        binsize=binsize,
-                    )
+        # interval 1 is processed together with smaller windows and coarser binsizes
+        expected_calls = [
+            (2, 1, 1000, {"nested_intervals_ids": [2, 7, 6]}),
+            (2, 1, 5000, {"nested_intervals_ids": [2]}),
+            (6, 1, 1000, {"derived_stackups": [(1, 2000), (1, 5000), (1, 10000)]}),
+        ]
+        for dataset_id, interval_id, binsize, derived_kwargs in expected_calls:
+            dataset = Dataset.query.get(dataset_id)
+            mock_launch.assert_any_call(
+                current_app.queues[
+                    current_app.config["PIPELINE_QUEUES"][dataset.filetype]
+                ],
+                *current_app.config["PIPELINE_NAMES"][dataset.filetype],
+                dataset_id=dataset.id,
+                intervals_id=interval_id,
+                binsize=binsize,
+                **derived_kwargs,
+            )
         # check whether processing datasets where added correctly
         region_dataset = Dataset.query.get(4)
         feature_datasets = Dataset.query.filter(Dataset.id.in_([2, 6])).all()
@@ -460,23 +487,18 @@ class TestPreprocessDataset(LoginTestCase, TempDirTestCase):
         )
         self.assertEqual(response.status_code, 200)
         # check whether pipeline has been called with right parameters
-        intervals = [1, 2, 4, 5]
         datasets = [6, 7]
-        for interval_id in intervals:
-            interval = Intervals.query.get(interval_id)
-            for dataset_id in datasets:
-                dataset = Dataset.query.get(dataset_id)
-                for binsize in current_app.config["PREPROCESSING_MAP"][
-                    interval.windowsize
-                ][dataset.filetype]:
-                    mock_launch.assert_any_call(
-                        self.app.queues["medium"],
-                        "pipeline_stackup",
-                        "run stackup pipeline",
-                        dataset_id=dataset_id,
-                        intervals_id=interval.id,
-                        binsize=binsize,
-                    )
+        for dataset_id in datasets:
+            for interval_id, binsize, nested_kwargs in self.expected_stackup_calls:
+                mock_launch.assert_any_call(
+                    self.app.queues["medium"],
+                    "pipeline_stackup",
+                    "run stackup pipeline",
+                    dataset_id=dataset_id,
+                    intervals_id=interval_id,
+                    binsize=binsize,
+                    **nested_kwargs,
+                )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,154 @@
+"""Module with the tests for the cache of fitted embedding models."""
+import os
+import glob
+import unittest
+from unittest.mock import patch
+import numpy as np
+import umap
+from tests.test_utils.test_helpers import LoginTestCase, TempDirTestCase
+
+# add path to import app
+# import sys
+# sys.path.append("./")
+from app.embedding_cache import get_scope, remove_cached_models
+from app.pipeline_worker_functions import _embed_and_cluster
+from app.lib import feature_extraction
+
+
+class TestEmbeddingCache(LoginTestCase, TempDirTestCase):
+    """Tests whether fitted embedding models are cached and reused."""
+
+    def setUp(self):
+        """Create test features"""
+        super(TestEmbeddingCache, self).setUp()
+        self.app.config["UPLOAD_DIR"] = self.TEMP_PATH
+        self.app.config["CLUSTER_NUMBER_LARGE"] = 4
+        self.app.config["CLUSTER_NUMBER_SMALL"] = 2
+        self.app.config["EMBEDDING_TRANSFORM_FRACTION"] = 0.1
+        rng = np.random.default_rng(42)
+        self.features = rng.random((100, 5))
+        self.scope = get_scope("embedding1d", 1, 2, 10000, None)
+
+    def tearDown(self):
+        remove_cached_models("embedding1d", 1, intervals_id=2)
+        super(TestEmbeddingCache, self).tearDown()
+
+    @patch("app.pipeline_worker_functions.umap.UMAP", wraps=umap.UMAP)
+    def test_identical_rerun_reuses_results(self, mock_umap):
+        """Tests whether embedding and clusters of identical features are reused without fitting"""
+        first_embedding, first_clusters = _embed_and_cluster(self.features, self.scope)
+        second_embedding, second_clusters = _embed_and_cluster(
+            self.features, self.scope
+        )
+        self.assertEqual(mock_umap.call_count, 1)
+        np.testing.assert_array_equal(first_embedding, second_embedding)
+        for size in ["large", "small"]:
+            np.testing.assert_array_equal(first_clusters[size], second_clusters[size])
+
+    @patch("app.pipeline_worker_functions.umap.UMAP", wraps=umap.UMAP)
+    def test_few_new_rows_transformed(self, mock_umap):
+        """Tests whether features with few new rows are embedded with the cached models"""
+        first_embedding, _ = _embed_and_cluster(self.features, self.scope)
+        features = self.features.copy()
+        features[:5] = features[:5] + 1
+        embedding, clusters = _embed_and_cluster(features, self.scope)
+        self.assertEqual(mock_umap.call_count, 1)
+        np.testing.assert_array_equal(embedding[5:], first_embedding[5:])
+        self.assertEqual(embedding.shape, first_embedding.shape)
+        self.assertEqual(len(clusters["large"]), 100)
+        self.assertTrue(clusters["large"].max() < 4)
+
+    @patch("app.pipeline_worker_functions.umap.UMAP", wraps=umap.UMAP)
+    def test_many_new_rows_refitted(self, mock_umap):
+        """Tests whether models are fitted again if many rows are new"""
+        _embed_and_cluster(self.features, self.scope)
+        _embed_and_cluster(self.features + 1, self.scope)
+        self.assertEqual(mock_umap.call_count, 2)
+
+    @patch("app.pipeline_worker_functions.umap.UMAP", wraps=umap.UMAP)
+    def test_models_refitted_if_parameters_change(self, mock_umap):
+        """Tests whether models are fitted again if cluster numbers change"""
+        _embed_and_cluster(self.features, self.scope)
+        self.app.config["CLUSTER_NUMBER_SMALL"] = 3
+        _embed_and_cluster(self.features, self.scope)
+        self.assertEqual(mock_umap.call_count, 2)
+
+    @patch("app.pipeline_worker_functions.umap.UMAP", wraps=umap.UMAP)
+    def test_removed_models_not_reused(self, mock_umap):
+        """Tests whether models of removed intervals are fitted again"""
+        _embed_and_cluster(self.features, self.scope)
+        remove_cached_models(intervals_id=2)
+        self.assertEqual(self._get_cached_files(), [])
+        _embed_and_cluster(self.features, self.scope)
+        self.assertEqual(mock_umap.call_count, 2)
+
+    def test_models_removed_by_owner(self):
+        """Tests whether only models of the removed owner are removed"""
+        other_scope = get_scope("embedding2d", 1, 2, 10000, "Obs/Exp")
+        _embed_and_cluster(self.features, self.scope)
+        _embed_and_cluster(self.features, other_scope)
+        remove_cached_models("embedding1d", 1)
+        self.assertEqual(
+            [os.path.basename(file_path) for file_path in self._get_cached_files()],
+            ["10000_Obs-Exp.pickle"],
+        )
+
+    def test_least_recently_used_models_pruned(self):
+        """Tests whether only EMBEDDING_CACHE_SIZE models are kept, preferring the
+        most recently used ones"""
+        self.app.config["EMBEDDING_CACHE_SIZE"] = 2
+        scopes = [get_scope("embedding1d", 1, 2, 10000, side) for side in ["a", "b"]]
+        for scope in scopes:
+            _embed_and_cluster(self.features, scope)
+        for file_path in self._get_cached_files():
+            modification_time = 100 if file_path.endswith("a.pickle") else 200
+            os.utime(file_path, (modification_time, modification_time))
+        # reuse makes the least recently used models the most recently used ones
+        _embed_and_cluster(self.features, scopes[0])
+        _embed_and_cluster(self.features, get_scope("embedding1d", 1, 2, 10000, "c"))
+        self.assertEqual(
+            sorted(
+                os.path.basename(file_path) for file_path in self._get_cached_files()
+            ),
+            ["10000_a.pickle", "10000_c.pickle"],
+        )
+
+    @patch("app.pipeline_worker_functions.umap.UMAP", wraps=umap.UMAP)
+    def test_new_rows_transformed_with_cached_scaler(self, mock_umap):
+        """Tests whether appending rows to features that are scaled together with the
+        embedding reuses the cached models"""
+        scaler = feature_extraction.get_image_feature_scaler()
+        first_embedding, _ = _embed_and_cluster(self.features, self.scope, scaler)
+        features = np.concatenate([self.features, self.features[:5] + 1])
+        embedding, clusters = _embed_and_cluster(
+            features, self.scope, feature_extraction.get_image_feature_scaler()
+        )
+        self.assertEqual(mock_umap.call_count, 1)
+        np.testing.assert_array_equal(embedding[:100], first_embedding)
+        self.assertEqual(len(clusters["large"]), 105)
+
+    @patch("app.pipeline_worker_functions.umap.UMAP", wraps=umap.UMAP)
+    def test_models_refitted_if_scaler_changes(self, mock_umap):
+        """Tests whether models are fitted again if features are scaled differently"""
+        _embed_and_cluster(self.features, self.scope)
+        _embed_and_cluster(
+            self.features, self.scope, feature_extraction.get_image_feature_scaler()
+        )
+        self.assertEqual(mock_umap.call_count, 2)
+
+    @patch("app.pipeline_worker_functions.umap.UMAP", wraps=umap.UMAP)
+    def test_no_caching_without_scope(self, mock_umap):
+        """Tests whether models are not cached if no scope is given"""
+        _embed_and_cluster(self.features)
+        _embed_and_cluster(self.features)
+        self.assertEqual(mock_umap.call_count, 2)
+
+    def _get_cached_files(self):
+        return glob.glob(
+            os.path.join(self.TEMP_PATH, "embedding_cache", "**", "*.pickle"),
+            recursive=True,
+        )
+
+
+if __name__ == "__main__":
+    res = unittest.main(verbosity=3, exit=False)
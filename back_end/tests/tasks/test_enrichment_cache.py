@@ -0,0 +1,227 @@
+"""Module with the tests for the cluster-wide enrichment cache."""
+import os
+import unittest
+from unittest.mock import patch, MagicMock
+import numpy as np
+import pandas as pd
+from pandas.testing import assert_frame_equal
+from tests.test_utils.test_helpers import LoginTestCase, TempDirTestCase
+
+# add path to import app
+# import sys
+# sys.path.append("./")
+from app import db
+from app.models import Collection
+from app.enrichment_cache import (
+    get_targets,
+    get_target_bitsets,
+    get_universe,
+    remove_cached_targets,
+    remove_cached_universes,
+)
+
+
+class TestEnrichmentCache(LoginTestCase, TempDirTestCase):
+    """Tests whether target sets and universes are prepared once and cached."""
+
+    def setUp(self):
+        """Add test datasets and mock redis connection"""
+        super(TestEnrichmentCache, self).setUp()
+        self.app.config["UPLOAD_DIR"] = self.TEMP_PATH
+        target_1 = pd.DataFrame(
+            {
+                0: ["chr1", "chr1", "chr1", "chrX"],
+                1: [0, 0, 100, 0],
+                2: [10, 10, 200, 10],
+            }
+        )
+        target_2 = pd.DataFrame({0: ["chrX"], 1: [0], 2: [10]})
+        self.targets = []
+        for dataset_id, target in [(1, target_1), (2, target_2)]:
+            file_path = os.path.join(self.TEMP_PATH, f"target_{dataset_id}.bed")
+            target.to_csv(file_path, sep="\t", header=False, index=False)
+            self.targets.append(
+                self.create_dataset(
+                    id=dataset_id,
+                    dataset_name="test",
+                    filetype="bedfile",
+                    file_path=file_path,
+                    user_id=1,
+                )
+            )
+        self.collection = Collection(id=1, datasets=self.targets)
+        db.session.add_all([*self.targets, self.collection])
+        db.session.commit()
+        self.chromsizes = pd.Series({"chr1": 1000})
+        self.chromsizes_regions = pd.DataFrame(
+            {"chrom": self.chromsizes.index, "start": 0, "end": self.chromsizes}
+        )
+        self.lock = MagicMock()
+        self.lock.acquire.return_value = True
+        self.app.redis = MagicMock()
+        self.app.redis.lock.return_value = self.lock
+
+    def tearDown(self):
+        remove_cached_targets(1)
+        remove_cached_universes(1)
+        super(TestEnrichmentCache, self).tearDown()
+
+    def test_targets_cleaned(self):
+        """Tests whether targets are restricted to chromosomes and deduplicated"""
+        result = get_targets(self.collection, 1, self.chromsizes_regions)
+        self.assertEqual(len(result), 2)
+        assert_frame_equal(
+            result[0],
+            pd.DataFrame(
+                {"chrom": ["chr1", "chr1"], "start": [0, 100], "end": [10, 200]}
+            ),
+            check_dtype=False,
+        )
+        self.assertEqual(len(result[1]), 0)
+
+    @patch("app.enrichment_cache._prepare_targets")
+    def test_targets_prepared_once(self, mock_prepare):
+        """Tests whether targets are prepared under the lock only once"""
+        mock_prepare.return_value = pd.DataFrame(
+            {"chrom": ["chr1"], "start": [0], "end": [10], "target": [0]}
+        )
+        first = get_targets(self.collection, 1, self.chromsizes_regions)
+        second = get_targets(self.collection, 1, self.chromsizes_regions)
+        mock_prepare.assert_called_once()
+        self.app.redis.lock.assert_called_once()
+        self.lock.release.assert_called_once()
+        for first_target, second_target in zip(first, second):
+            assert_frame_equal(first_target, second_target)
+
+    @patch("app.enrichment_cache._prepare_targets")
+    def test_targets_prepared_again_if_membership_changes(self, mock_prepare):
+        """Tests whether cached targets are not reused if the datasets of the collection change"""
+        mock_prepare.return_value = pd.DataFrame(
+            {"chrom": ["chr1"], "start": [0], "end": [10], "target": [0]}
+        )
+        get_targets(self.collection, 1, self.chromsizes_regions)
+        self.collection.datasets = self.targets[:1]
+        db.session.commit()
+        get_targets(self.collection, 1, self.chromsizes_regions)
+        self.assertEqual(mock_prepare.call_count, 2)
+
+    @patch("app.enrichment_cache._prepare_targets")
+    def test_targets_of_previous_membership_removed(self, mock_prepare):
+        """Tests whether cached targets of a previous membership of the collection are
+        removed when the targets of the current membership are cached"""
+        mock_prepare.return_value = pd.DataFrame(
+            {"chrom": ["chr1"], "start": [0], "end": [10], "target": [0]}
+        )
+        get_targets(self.collection, 1, self.chromsizes_regions)
+        get_targets(self.collection, 2, self.chromsizes_regions)
+        self.collection.datasets = self.targets[:1]
+        db.session.commit()
+        get_targets(self.collection, 1, self.chromsizes_regions)
+        cache_dir = os.path.join(self.TEMP_PATH, "enrichment_cache")
+        for assembly_id in [1, 2]:
+            self.assertEqual(
+                len(
+                    [
+                        file_name
+                        for file_name in os.listdir(cache_dir)
+                        if file_name.startswith(f"targets_1_{assembly_id}_")
+                    ]
+                ),
+                1,
+            )
+        remove_cached_targets(1)
+
+    @patch("app.enrichment_cache._prepare_targets")
+    def test_targets_prepared_without_caching_if_lock_not_acquired(self, mock_prepare):
+        """Tests whether targets are prepared without caching if the lock could not be acquired"""
+        mock_prepare.return_value = pd.DataFrame(
+            {"chrom": ["chr1"], "start": [0], "end": [10], "target": [0]}
+        )
+        self.lock.acquire.return_value = False
+        get_targets(self.collection, 1, self.chromsizes_regions)
+        get_targets(self.collection, 1, self.chromsizes_regions)
+        self.assertEqual(mock_prepare.call_count, 2)
+        self.lock.release.assert_not_called()
+
+    @patch("app.enrichment_cache._prepare_targets")
+    def test_cached_targets_removed(self, mock_prepare):
+        """Tests whether removing cached targets leads to preparing them again"""
+        mock_prepare.return_value = pd.DataFrame(
+            {"chrom": ["chr1"], "start": [0], "end": [10], "target": [0]}
+        )
+        get_targets(self.collection, 1, self.chromsizes_regions)
+        remove_cached_targets(1)
+        get_targets(self.collection, 1, self.chromsizes_regions)
+        self.assertEqual(mock_prepare.call_count, 2)
+
+    @patch("app.enrichment_cache.bf.binnify")
+    def test_universe_prepared_once_per_binsize(self, mock_binnify):
+        """Tests whether universe is binned once per assembly and binsize"""
+        mock_binnify.return_value = pd.DataFrame(
+            {"chrom": ["chr1", "chr1"], "start": [0, 500], "end": [500, 1000]}
+        )
+        first = get_universe(1, self.chromsizes, 500)
+        second = get_universe(1, self.chromsizes, 500)
+        get_universe(1, self.chromsizes, 100)
+        self.assertEqual(mock_binnify.call_count, 2)
+        assert_frame_equal(first, second)
+
+    def test_target_bitsets_prepared_once_per_binsize(self):
+        """Tests whether targets are packed into bitsets over the universe bins once per binsize"""
+        result = get_target_bitsets(
+            self.collection, 1, self.chromsizes_regions, self.chromsizes, 100
+        )
+        expected = np.zeros((2, 10), dtype=bool)
+        expected[0, [0, 1]] = True
+        np.testing.assert_array_equal(np.unpackbits(result, axis=1)[:, :10], expected)
+        with patch("app.enrichment_cache._prepare_target_bitsets") as mock_prepare:
+            mock_prepare.return_value = np.zeros((2, 1), dtype=np.uint8)
+            cached = get_target_bitsets(
+                self.collection, 1, self.chromsizes_regions, self.chromsizes, 100
+            )
+            mock_prepare.assert_not_called()
+            get_target_bitsets(
+                self.collection, 1, self.chromsizes_regions, self.chromsizes, 200
+            )
+            mock_prepare.assert_called_once()
+        np.testing.assert_array_equal(result, cached)
+
+    def test_target_bitsets_of_previous_membership_removed(self):
+        """Tests whether cached target bitsets of a previous membership of the collection
+        are removed when the target bitsets of the current membership are cached"""
+        get_target_bitsets(
+            self.collection, 1, self.chromsizes_regions, self.chromsizes, 100
+        )
+        self.collection.datasets = self.targets[:1]
+        db.session.commit()
+        get_target_bitsets(
+            self.collection, 1, self.chromsizes_regions, self.chromsizes, 100
+        )
+        cache_dir = os.path.join(self.TEMP_PATH, "enrichment_cache")
+        self.assertEqual(
+            len(
+                [
+                    file_name
+                    for file_name in os.listdir(cache_dir)
+                    if file_name.endswith("_100.npy")
+                ]
+            ),
+            1,
+        )
+
+    def test_cached_target_bitsets_removed(self):
+        """Tests whether removing cached targets also removes their bitsets"""
+        get_target_bitsets(
+            self.collection, 1, self.chromsizes_regions, self.chromsizes, 100
+        )
+        remove_cached_targets(1)
+        with patch("app.enrichment_cache._prepare_target_bitsets") as mock_prepare:
+            mock_prepare.return_value = np.zeros((2, 2), dtype=np.uint8)
+            get_target_bitsets(
+                self.collection, 1, self.chromsizes_regions, self.chromsizes, 100
+            )
+            mock_prepare.assert_called_once()
+
+
+if __name__ == "__main__":
+    res = unittest.main(verbosity=3, exit=False)
@@ -0,0 +1,150 @@
+"""Module with the tests for the cluster-wide expected cache."""
+import os
+import unittest
+from unittest.mock import patch, MagicMock
+import pandas as pd
+from pandas.testing import assert_frame_equal
+from tests.test_utils.test_helpers import LoginTestCase, TempDirTestCase
+from redis.exceptions import LockNotOwnedError
+
+# add path to import app
+# import sys
+# sys.path.append("./")
+from app import db
+from app.models import ObsExp
+from app.expected_cache import get_expected, load_expected
+
+
+class TestGetExpected(LoginTestCase, TempDirTestCase):
+    """Tests whether get_expected calculates expected dataframes
+    once per dataset and binsize and caches them."""
+
+    def setUp(self):
+        """Add test dataset and mock redis connection"""
+        super(TestGetExpected, self).setUp()
+        self.cooler = self.create_dataset(
+            id=1,
+            dataset_name="test",
+            filetype="cooler",
+            file_path="testpath",
+            user_id=1,
+            add_and_commit=True,
+        )
+        self.expected = pd.DataFrame(
+            {
+                "region": ["chr1:0-100", "chr1:0-100"],
+                "diag": [0, 1],
+                "balanced.avg": [1.0, 0.5],
+            }
+        )
+        self.lock = MagicMock()
+        self.lock.acquire.return_value = True
+        self.app.redis = MagicMock()
+        self.app.redis.lock.return_value = self.lock
+
+    @patch("app.expected_cache.HT.get_expected")
+    def test_cached_expected_used_without_lock(self, mock_expected):
+        """Tests whether an existing cache entry is returned without taking the lock"""
+        db.session.add(
+            ObsExp(
+                dataset_id=1,
+                binsize=5000000,
+                filepath=os.path.join("./tests/testfiles", "expected.csv"),
+            )
+        )
+        db.session.commit()
+        result = get_expected(self.cooler, "mock_cooler", 5000000, "arms")
+        mock_expected.assert_not_called()
+        self.app.redis.lock.assert_not_called()
+        assert_frame_equal(
+            result, pd.read_csv(os.path.join("./tests/testfiles", "expected.csv"))
+        )
+
+    @patch("app.expected_cache.HT.get_expected")
+    def test_expected_calculated_and_cached(self, mock_expected):
+        """Tests whether expected is calculated under the lock and stored as parquet"""
+        mock_expected.return_value = self.expected
+        result = get_expected(self.cooler, "mock_cooler", 10000, "arms")
+        mock_expected.assert_called_once_with(
+            "mock_cooler", "arms", proc=self.app.config["OBS_EXP_PROCESSES"]
+        )
+        self.app.redis.lock.assert_called_once()
+        self.assertEqual(
+            self.app.redis.lock.call_args[0][0], "hicognition-expected-1-10000"
+        )
+        self.lock.release.assert_called_once()
+        assert_frame_equal(result, self.expected)
+        self.assertEqual(len(ObsExp.query.all()), 1)
+        entry = ObsExp.query.first()
+        self.assertEqual(entry.dataset_id, 1)
+        self.assertEqual(entry.binsize, 10000)
+        self.assertTrue(entry.filepath.endswith(".parquet"))
+        assert_frame_equal(pd.read_parquet(entry.filepath), self.expected)
+
+    @patch("app.expected_cache.HT.get_expected")
+    def test_waiting_worker_uses_result_of_lock_holder(self, mock_expected):
+        """Tests whether a worker that waited for the lock uses the expected
+        that was cached by the worker that held the lock"""
+        file_path = os.path.join(self.TEMP_PATH, "cached_expected.parquet")
+        self.expected.to_parquet(file_path, index=False)
+
+        def add_entry_of_other_worker():
+            db.session.add(ObsExp(dataset_id=1, binsize=10000, filepath=file_path))
+            db.session.commit()
+            return True
+
+        self.lock.acquire.side_effect = add_entry_of_other_worker
+        result = get_expected(self.cooler, "mock_cooler", 10000, "arms")
+        mock_expected.assert_not_called()
+        self.lock.release.assert_called_once()
+        self.assertEqual(len(ObsExp.query.all()), 1)
+        assert_frame_equal(result, self.expected)
+
+    @patch("app.expected_cache.HT.get_expected")
+    def test_session_of_worker_not_committed(self, mock_expected):
+        """Tests whether the cache entry is committed without committing
+        the session of the worker"""
+        mock_expected.return_value = self.expected
+        with patch.object(db.session, "commit") as mock_commit:
+            get_expected(self.cooler, "mock_cooler", 10000, "arms")
+            mock_commit.assert_not_called()
+        self.assertEqual(len(ObsExp.query.all()), 1)
+
+    @patch("app.expected_cache.HT.get_expected")
+    def test_expected_calculated_if_lock_not_acquired(self, mock_expected):
+        """Tests whether expected is calculated without caching if the lock
+        could not be acquired"""
+        mock_expected.return_value = self.expected
+        self.lock.acquire.return_value = False
+        result = get_expected(self.cooler, "mock_cooler", 10000, "arms")
+        mock_expected.assert_called_once()
+        self.lock.release.assert_not_called()
+        self.assertEqual(len(ObsExp.query.all()), 0)
+        assert_frame_equal(result, self.expected)
+
+    @patch("app.expected_cache.HT.get_expected")
+    def test_expired_lock_does_not_fail(self, mock_expected):
+        """Tests whether an expired lock upon release does not discard the result"""
+        mock_expected.return_value = self.expected
+        self.lock.release.side_effect = LockNotOwnedError("expired")
+        result = get_expected(self.cooler, "mock_cooler", 10000, "arms")
+        self.assertEqual(len(ObsExp.query.all()), 1)
+        assert_frame_equal(result, self.expected)
+
+
+class TestLoadExpected(TempDirTestCase):
+    """Tests loading of cached expected files"""
+
+    def test_csv_and_parquet_loaded(self):
+        """Tests whether legacy csv and parquet files give the same result"""
+        expected = pd.read_csv(os.path.join("./tests/testfiles", "expected.csv"))
+        file_path = os.path.join(self.TEMP_PATH, "expected.parquet")
+        expected.to_parquet(file_path, index=False)
+        assert_frame_equal(
+            load_expected(os.path.join("./tests/testfiles", "expected.csv")), expected
+        )
+        assert_frame_equal(load_expected(file_path), expected)
+
+
+if __name__ == "__main__":
+    res = unittest.main(verbosity=3, exit=False)
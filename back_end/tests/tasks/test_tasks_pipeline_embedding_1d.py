@@ -85,7 +85,7 @@ class TestPipelineEmbedding1d(LoginTestCase, TempDirTestCase):
 
     @patch("app.pipeline_steps.set_collection_finished")
     @patch("app.pipeline_steps.set_task_progress")
-    @patch("app.pipeline_steps.stackup_pipeline_step")
+    @patch("app.pipeline_steps.collection_stackup_pipeline_step")
     @patch("app.pipeline_steps.embedding_1d_pipeline_step")
     def test_stackups_triggered_if_they_dont_exist(
         self, mock_embedding, mock_stackup, mock_set_progress, mock_set_finished
@@ -105,12 +105,14 @@ class TestPipelineEmbedding1d(LoginTestCase, TempDirTestCase):
         )
         # trigger embedding
         pipeline_embedding_1d(self.collection_1.id, self.intervals_1.id, 10000)
-        # assert that perform stackup was called with right parameters
-        expected_calls = [
-            (ds_id, 1, 10000) for ds_id in [self.feature_2.id, self.feature_3.id]
-        ]
-        for args in expected_calls:
-            mock_stackup.assert_any_call(*args)
+        # assert that perform stackup was called once with all missing stackups
+        mock_stackup.assert_called_once_with(
+            [self.feature_2.id, self.feature_3.id],
+            1,
+            10000,
+            region_side=None,
+            max_progress=50,
+        )
         # check whether perform embedding is called correctly
         mock_embedding.assert_called_with(
             self.collection_1.id, self.intervals_1.id, 10000
@@ -118,12 +120,13 @@ class TestPipelineEmbedding1d(LoginTestCase, TempDirTestCase):
         # trigger embedding with different binsize -> all stackups should be retriggered
         pipeline_embedding_1d(self.collection_1.id, self.intervals_1.id, 20000)
         # assert that perform stackup was called with right parameters
-        expected_calls = [
-            (ds_id, 1, 20000)
-            for ds_id in [self.feature_1.id, self.feature_2.id, self.feature_3.id]
-        ]
-        for args in expected_calls:
-            mock_stackup.assert_any_call(*args)
+        mock_stackup.assert_called_with(
+            [self.feature_1.id, self.feature_2.id, self.feature_3.id],
+            1,
+            20000,
+            region_side=None,
+            max_progress=50,
+        )
         # check whether perform embedding is called correctly
         mock_embedding.assert_called_with(
             self.collection_1.id, self.intervals_1.id, 20000
@@ -131,7 +134,7 @@ class TestPipelineEmbedding1d(LoginTestCase, TempDirTestCase):
 
     @patch("app.pipeline_steps.set_collection_finished")
     @patch("app.pipeline_steps.set_task_progress")
-    @patch("app.pipeline_steps.stackup_pipeline_step")
+    @patch("app.pipeline_steps.collection_stackup_pipeline_step")
     @patch("app.pipeline_steps.embedding_1d_pipeline_step")
     def test_stackups_triggered_if_they_dont_exist_2d(
         self, mock_embedding, mock_stackup, mock_set_progress, mock_set_finished
@@ -151,19 +154,20 @@ class TestPipelineEmbedding1d(LoginTestCase, TempDirTestCase):
         # trigger embedding
         pipeline_embedding_1d(self.collection_1.id, self.intervals_2d.id, 10000)
         # assert that perform stackup was called with right parameters
-        for side in ["left", "right"]:
-            expected_calls = [
-                ((ds_id, self.intervals_2d.id, 10000), {"region_side":side}) for ds_id in [self.feature_1.id, self.feature_2.id, self.feature_3.id]
-            ]
-            for args,kwargs in expected_calls:
-                mock_stackup.assert_any_call(*args, **kwargs)
-            # check whether perform embedding is called correctly
-            mock_embedding.assert_any_call(
-                self.collection_1.id, self.intervals_2d.id, 10000, region_side=side
+        mock_stackup.assert_called_once_with(
+            [self.feature_1.id, self.feature_2.id, self.feature_3.id],
+            self.intervals_2d.id,
+            10000,
+            region_side=["left", "right"],
+            max_progress=50,
+        )
+        # check whether perform embedding is called once for both sides
+        mock_embedding.assert_called_once_with(
+            self.collection_1.id, self.intervals_2d.id, 10000, region_side=["left", "right"]
         )
 
     @patch("app.pipeline_steps.set_task_progress")
-    @patch("app.pipeline_steps.stackup_pipeline_step")
+    @patch("app.pipeline_steps.collection_stackup_pipeline_step")
     @patch("app.pipeline_steps.embedding_1d_pipeline_step")
     def test_dataset_state_not_changed_if_not_last(
         self, mock_embedding, mock_stackup, mock_progress
@@ -181,7 +185,7 @@ class TestPipelineEmbedding1d(LoginTestCase, TempDirTestCase):
         self.assertEqual(self.bed_file.processing_collections, [self.collection_1])
 
     @patch("app.pipeline_steps.set_task_progress")
-    @patch("app.pipeline_steps.stackup_pipeline_step")
+    @patch("app.pipeline_steps.collection_stackup_pipeline_step")
     @patch("app.pipeline_steps.embedding_1d_pipeline_step")
     def test_dataset_set_finished_if_last(
         self, mock_embedding, mock_stackup, mock_progress
@@ -200,7 +204,7 @@ class TestPipelineEmbedding1d(LoginTestCase, TempDirTestCase):
 
     @patch("app.pipeline_steps.current_app.logger.error")
     @patch("app.pipeline_steps.set_task_progress")
-    @patch("app.pipeline_steps.stackup_pipeline_step")
+    @patch("app.pipeline_steps.collection_stackup_pipeline_step")
     @patch("app.pipeline_steps.embedding_1d_pipeline_step")
     def test_dataset_set_failed_if_failed(
         self, mock_embedding, mock_stackup, mock_progress, mock_log
@@ -441,6 +445,51 @@ class TestEmbedding1DPipelineStep(LoginTestCase, TempDirTestCase):
             self.assertEqual(embedding.intervals_id, self.intervals_2d.id)
             self.assertEqual(embedding.region_side, side)
 
+    @patch("app.pipeline_steps.worker_funcs._do_embedding_1d_fixed_size")
+    def test_database_entries_added_for_both_sides(self, mock_fixed_size):
+        """Tests whether database entries are added for each side if both
+        sides are embedded in a single step"""
+        mock_fixed_size.return_value = {
+            side: {
+                "embedding": np.full((1, 1), 1),
+                "clusters": {
+                    size: {
+                        "cluster_ids": np.full((1, 1), 2),
+                        "average_values": np.full((1, 1), 3),
+                    }
+                    for size in ["small", "large"]
+                },
+                "features": np.full((1, 1), 4),
+            }
+            for side in ["left", "right"]
+        }
+        db.session.add_all(
+            [
+                self.bed_file_2d,
+                self.intervals_2d,
+                self.feature_1,
+                self.feature_2,
+                self.feature_3,
+                self.collection_1,
+            ]
+        )
+        embedding_1d_pipeline_step(
+            self.collection_1.id,
+            self.intervals_2d.id,
+            10000,
+            region_side=["left", "right"],
+        )
+        mock_fixed_size.assert_called_once_with(
+            self.collection_1.id,
+            self.intervals_2d.id,
+            10000,
+            region_side=["left", "right"],
+        )
+        for side in ["left", "right"]:
+            embeddings = EmbeddingIntervalData.query.filter_by(region_side=side).all()
+            self.assertEqual(
+                {"small", "large"}, set([emb.cluster_number for emb in embeddings])
+            )
 
     @patch("app.pipeline_steps.worker_funcs._do_embedding_1d_variable_size")
     @patch("app.pipeline_steps.worker_funcs._do_embedding_1d_fixed_size")
@@ -658,6 +707,92 @@ class TestEmbedding1DWorkerFunctionFixedSize(LoginTestCase, TempDirTestCase):
                 np.array_equal(embedding_results["features"], expected_features)
             )
 
+    def test_features_produced_for_both_sides(self):
+        """Tests whether features of each side are produced from the stackups of
+        that side if both sides are embedded at once"""
+        app_config = self.app.config.copy()
+        app_config["CLUSTER_NUMBER_LARGE"] = 5
+        app_config["CLUSTER_NUMBER_SMALL"] = 2
+        stackups = [
+            IndividualIntervalData(
+                dataset_id=stackup.dataset_id,
+                intervals_id=self.intervals_1.id,
+                binsize=10000,
+                file_path=file_path,
+                region_side=side,
+            )
+            for stackup in [self.ind_data_1, self.ind_data_2, self.ind_data_3]
+            for side, file_path in [
+                ("left", stackup.file_path),
+                ("right", self.ind_data_1.file_path),
+            ]
+        ]
+        with patch("app.pipeline_worker_functions.current_app.config") as mock_config:
+            mock_config.__getitem__.side_effect = app_config.__getitem__
+            db.session.add_all(
+                [
+                    self.bed_file,
+                    self.intervals_1,
+                    self.feature_1,
+                    self.feature_2,
+                    self.feature_3,
+                    self.collection_1,
+                    *stackups,
+                ]
+            )
+            embedding_results = _do_embedding_1d_fixed_size(
+                self.collection_1.id,
+                self.intervals_1.id,
+                10000,
+                region_side=["left", "right"],
+            )
+            self.assertEqual(set(embedding_results.keys()), {"left", "right"})
+            expected_left = np.stack(
+                [
+                    self.test_data_1[:, 1],
+                    self.test_data_2[:, 1],
+                    self.test_data_3[:, 1],
+                ]
+            ).transpose()
+            expected_right = np.stack([self.test_data_1[:, 1]] * 3).transpose()
+            np.testing.assert_array_equal(
+                embedding_results["left"]["features"], expected_left
+            )
+            np.testing.assert_array_equal(
+                embedding_results["right"]["features"], expected_right
+            )
+
+    def test_stackup_summaries_used_if_they_exist(self):
+        """Tests whether summaries written next to the stackups are used instead
+        of reading the full stackups"""
+        app_config = self.app.config.copy()
+        app_config["CLUSTER_NUMBER_LARGE"] = 5
+        app_config["CLUSTER_NUMBER_SMALL"] = 2
+        summary = np.arange(15, dtype=float)
+        np.save(self.ind_data_1.file_path_summary, summary)
+        with patch("app.pipeline_worker_functions.current_app.config") as mock_config:
+            mock_config.__getitem__.side_effect = app_config.__getitem__
+            db.session.add_all(
+                [
+                    self.bed_file,
+                    self.intervals_1,
+                    self.feature_1,
+                    self.feature_2,
+                    self.feature_3,
+                    self.collection_1,
+                    self.ind_data_1,
+                    self.ind_data_2,
+                    self.ind_data_3,
+                ]
+            )
+            embedding_results = _do_embedding_1d_fixed_size(
+                self.collection_1.id, self.intervals_1.id, 10000, region_side=None
+            )
+            np.testing.assert_array_equal(embedding_results["features"][:, 0], summary)
+            np.testing.assert_array_equal(
+                embedding_results["features"][:, 1], self.test_data_2[:, 1]
+            )
+
 
 class TestEmbedding1DWorkerFunctionVariableSize(LoginTestCase, TempDirTestCase):
     """Tests variable size worker function"""
@@ -1,12 +1,17 @@
 """Module with the tests for the 2D-data embedding preprocessing realted tasks."""
+import os
 import unittest
+from unittest.mock import patch
 import numpy as np
 from tests.test_utils.test_helpers import LoginTestCase, TempDirTestCase
 
 # add path to import app
 # import sys
 # sys.path.append("./")
-from app.pipeline_worker_functions import _do_embedding_2d
+from app.pipeline_worker_functions import (
+    _do_embedding_2d,
+    _do_pileup_embedding_streamed,
+)
 
 
 class TestEmbedding2DWorkerFunction(LoginTestCase, TempDirTestCase):
@@ -52,6 +57,100 @@ class TestEmbedding2DWorkerFunction(LoginTestCase, TempDirTestCase):
             embedding_results["clusters"]["small"]["thumbnails"].shape, (10, 10, 10)
         )
 
+    def test_output_empty_if_too_few_regions(self):
+        """tests whether fewer regions than clusters give an empty embedding"""
+        array = np.stack([np.random.normal(size=(10, 10)) for i in range(5)], axis=2)
+        embedding_results = _do_embedding_2d(array)
+        self.assertEqual(embedding_results["embedding"].shape, (5, 2))
+        self.assertTrue(np.all(np.isnan(embedding_results["embedding"])))
+        self.assertTrue(
+            np.all(np.isnan(embedding_results["clusters"]["large"]["cluster_ids"]))
+        )
+
+    @patch("app.pipeline_worker_functions.clustering.CentroidHierarchy.fit")
+    def test_clustering_errors_are_raised(self, mock_fit):
+        """tests whether unexpected errors of the clustering are not hidden
+        by an empty embedding"""
+        mock_fit.side_effect = RuntimeError("clustering failed")
+        array = np.stack([np.random.normal(size=(10, 10)) for i in range(20)], axis=2)
+        with self.assertRaises(RuntimeError):
+            _do_embedding_2d(array)
+
+
+class TestStreamedPileupEmbedding(LoginTestCase, TempDirTestCase):
+    """Tests streamed pileup embedding worker function"""
+
+    def setUp(self):
+        super().setUp()
+        np.random.seed(0)
+        self.array = np.stack(
+            [np.random.normal(size=(10, 10)) for i in range(30)], axis=2
+        )
+        self.array[0, :, 3] = np.nan
+
+    def test_results_equal_to_embedding_of_full_stack(self):
+        """Tests whether streaming over chunks gives the same average
+        and embedding results as processing the full stack"""
+        chunks = [
+            {"ICCF": self.array[..., :12], "Obs/Exp": self.array[..., :12] * 2},
+            {"ICCF": self.array[..., 12:], "Obs/Exp": self.array[..., 12:] * 2},
+        ]
+        results = _do_pileup_embedding_streamed(iter(chunks), ["ICCF", "Obs/Exp"])
+        for pileup_type, factor in [("ICCF", 1), ("Obs/Exp", 2)]:
+            average, embedding_results = results[pileup_type]
+            expected_results = _do_embedding_2d(self.array * factor)
+            self.assertTrue(
+                np.allclose(average, np.nanmean(self.array * factor, axis=2))
+            )
+            self.assertTrue(
+                np.allclose(
+                    embedding_results["embedding"], expected_results["embedding"]
+                )
+            )
+            for size in ["small", "large"]:
+                self.assertTrue(
+                    np.array_equal(
+                        embedding_results["clusters"][size]["cluster_ids"],
+                        expected_results["clusters"][size]["cluster_ids"],
+                    )
+                )
+                self.assertTrue(
+                    np.allclose(
+                        embedding_results["clusters"][size]["thumbnails"],
+                        expected_results["clusters"][size]["thumbnails"],
+                        equal_nan=True,
+                    )
+                )
+
+    def test_empty_results_without_regions(self):
+        """Tests whether region sets without regions give empty results,
+        both without chunks and with chunks without windows"""
+        for chunks, window_shape in [
+            ([], (0, 0)),
+            ([{"ICCF": self.array[..., :0]}], (10, 10)),
+        ]:
+            results = _do_pileup_embedding_streamed(iter(chunks), ["ICCF"])
+            average, embedding_results = results["ICCF"]
+            self.assertEqual(average.shape, window_shape)
+            self.assertTrue(np.all(np.isnan(average)))
+            self.assertEqual(embedding_results["embedding"].shape, (0, 2))
+            for size in ["small", "large"]:
+                self.assertEqual(
+                    embedding_results["clusters"][size]["cluster_ids"].shape, (0,)
+                )
+
+    def test_spilled_windows_removed(self):
+        """Tests whether temporary files with spilled windows are removed"""
+        _do_pileup_embedding_streamed(iter([{"ICCF": self.array}]), ["ICCF"])
+        self.assertEqual(
+            [
+                file_name
+                for file_name in os.listdir(self.app.config["UPLOAD_DIR"])
+                if file_name.endswith("_pileup_stack.tmp")
+            ],
+            [],
+        )
+
 
 if __name__ == "__main__":
     res = unittest.main(verbosity=3, exit=False)
@@ -1,9 +1,11 @@
 """Module with the tests for the pyLOLA calculation realted tasks."""
 import os
 import unittest
-from unittest.mock import patch
+from unittest.mock import patch, MagicMock
 import pandas as pd
 import numpy as np
+import bioframe as bf
+from scipy.stats import fisher_exact
 from tests.test_utils.test_helpers import LoginTestCase, TempDirTestCase
 
 # add path to import app
@@ -19,9 +21,11 @@ from app.models import (
     Task,
 )
 from app.pipeline_steps import enrichment_pipeline_step
+from app.lib import interval_operations
 from app.pipeline_worker_functions import (
     _do_enrichment_calculations_fixed_size,
     _do_enrichment_calculations_variable_size,
+    _dispose_database_connections,
 )
 from app.tasks import pipeline_lola
 
@@ -124,11 +128,9 @@ class TestPipelineLola(LoginTestCase):
         )
         # call pipeline
         pipeline_lola(self.collection.id, self.intervals_2d.id, 10000)
-        calls = [
-            [(self.collection.id, self.intervals_2d.id, 10000), {"region_side":side}] for side in ['left', 'right']
-        ]
-        for args, kwargs in calls:
-            mock_enrichment.assert_any_call(*args, **kwargs)
+        mock_enrichment.assert_called_once_with(
+            self.collection.id, self.intervals_2d.id, 10000, region_side=["left", "right"]
+        )
         # test set task progress
         mock_set_progress.assert_called_with(100)
 
@@ -233,6 +235,9 @@ class EnrichmentSetupClass(LoginTestCase, TempDirTestCase):
         """Add test dataset"""
         # call setUp of LoginTestCase to initialize app
         super().setUp()
+        # mock redis connection for the lock of the enrichment cache
+        self.app.redis = MagicMock()
+        self.app.redis.lock.return_value.acquire.return_value = True
         # add assembly
         self.hg19 = Assembly(
             id=1,
@@ -284,6 +289,40 @@ class TestEnrichmentPipelineStep(EnrichmentSetupClass):
             mock_variable_enrichment.assert_not_called()
             mock_fixed_enrichment.assert_any_call(self.collection_1.id, 100000 ,50000, self.query_dataset_2d.file_path,region_side=side)
 
+    @patch("app.pipeline_steps.worker_funcs._do_enrichment_calculations_fixed_size")
+    def test_both_region_sides_done_in_single_calculation(self, mock_fixed_enrichment):
+        """Tests whether both anchors of 2d intervals are passed to a single enrichment
+        calculation and results are added for each side."""
+        mock_fixed_enrichment.return_value = {
+            "left": np.full((2, 3), 1.0),
+            "right": np.full((2, 3), 2.0),
+        }
+        # add everything needed to database
+        db.session.add_all(self.datasets)
+        db.session.add_all(self.intervals)
+        db.session.add_all(self.collections)
+        db.session.commit()
+        # run enrichment analysis
+        enrichment_pipeline_step(
+            self.collection_1.id,
+            self.query_interval_2d.id,
+            50000,
+            region_side=["left", "right"],
+        )
+        mock_fixed_enrichment.assert_called_once_with(
+            self.collection_1.id,
+            100000,
+            50000,
+            self.query_dataset_2d.file_path,
+            region_side=["left", "right"],
+        )
+        for side, value in [("left", 1.0), ("right", 2.0)]:
+            result = AssociationIntervalData.query.filter_by(region_side=side).one()
+            self.assertEqual(result.intervals_id, self.query_interval_2d.id)
+            np.testing.assert_array_equal(
+                np.load(result.file_path), np.full((2, 3), value)
+            )
+
     @patch("app.pipeline_steps.worker_funcs._do_enrichment_calculations_fixed_size")
     @patch("app.pipeline_steps.worker_funcs._do_enrichment_calculations_variable_size")
     def test_correct_worker_function_called_variable_intervals(
@@ -362,6 +401,51 @@ class TestEnrichmentWorkerFunctionFixedSize(EnrichmentSetupClass):
         )
         self.assertTrue(np.all(np.isclose(result, expected)))
 
+    @patch(
+        "app.pipeline_worker_functions._dispose_database_connections",
+        wraps=_dispose_database_connections,
+    )
+    def test_result_independent_of_process_number(self, mock_dispose):
+        """tests whether result is the same if chunks are distributed over
+        a different number of processes"""
+        db.session.add_all(self.datasets)
+        db.session.add_all(self.intervals)
+        db.session.add_all(self.collections)
+        db.session.commit()
+        results = []
+        for process_number in [1, 3]:
+            self.app.config["ENRICHMENT_PROCESSES"] = process_number
+            results.append(
+                _do_enrichment_calculations_fixed_size(
+                    self.collection_1.id,
+                    self.query_interval.windowsize,
+                    50000,
+                    self.query_interval.source_dataset.file_path,
+                    region_side=None,
+                )
+            )
+        np.testing.assert_array_almost_equal(results[0], results[1])
+        # database connections are not shared with the forked processes
+        self.assertEqual(mock_dispose.call_count, 2)
+
+    @patch("app.pipeline_worker_functions.interval_operations.chunk_intervals")
+    def test_no_query_chunks_return_empty_result(self, mock_chunk_intervals):
+        """tests whether regions without query chunks give an empty result
+        instead of starting an empty process pool"""
+        mock_chunk_intervals.return_value = []
+        db.session.add_all(self.datasets)
+        db.session.add_all(self.intervals)
+        db.session.add_all(self.collections)
+        db.session.commit()
+        result = _do_enrichment_calculations_fixed_size(
+            self.collection_1.id,
+            self.query_interval.windowsize,
+            50000,
+            self.query_interval.source_dataset.file_path,
+            region_side=None,
+        )
+        self.assertEqual(result.shape, (2, 0))
+
     def test_query_in_targets_does_not_crash(self):
         """Tests whether query with duplicates is handled correctly."""
         db.session.add_all(self.datasets)
@@ -393,6 +477,74 @@ class TestEnrichmentWorkerFunctionVariableSize(EnrichmentSetupClass):
             self.collection_2.id, 10, self.tad_interval.source_dataset.file_path, region_side=None
         )
 
+    def test_chunks_outside_of_chromosomes_are_no_queries(self):
+        """Tests whether chunks of regions that extend past the chromosome end are
+        excluded from the queries, but kept in the universe as in LOLA runs."""
+        chrom_end = 171115067  # size of chr6 in hg19
+        regions = pd.DataFrame(
+            {
+                "chrom": ["chr6", "chr6", "chr6"],
+                "start": [1000000, 3000000, chrom_end - 600000],
+                "end": [1600000, 3300000, chrom_end - 10000],
+            }
+        )
+        targets = pd.DataFrame(
+            {
+                "chrom": ["chr6", "chr6", "chr6", "chr6"],
+                "start": [900000, 1300000, chrom_end - 500000, chrom_end - 50000],
+                "end": [1000000, 1400000, chrom_end - 400000, chrom_end - 20000],
+            }
+        )
+        regions_file = os.path.join(self.TEMP_PATH, "regions_at_end.bed")
+        regions.to_csv(regions_file, header=None, sep="\t", index=False)
+        targets_file = os.path.join(self.TEMP_PATH, "targets_at_end.bed")
+        targets.to_csv(targets_file, header=None, sep="\t", index=False)
+        target_dataset = self.create_dataset(
+            id=7,
+            dataset_name="test",
+            user_id=1,
+            file_path=targets_file,
+            filetype="bedfile",
+            assembly=1,
+        )
+        collection = Collection(id=4, datasets=[target_dataset])
+        db.session.add_all([target_dataset, collection])
+        db.session.commit()
+        # run enrichment analysis
+        result = _do_enrichment_calculations_variable_size(
+            collection.id, 10, regions_file, region_side=None
+        )
+        np.testing.assert_allclose(
+            result, self._get_lola_odds_ratios(regions, [targets], 10)
+        )
+
+    def _get_lola_odds_ratios(self, regions, targets, binsize):
+        """Returns odds ratios as calculated with pylola: queries are chunks that overlap
+        chromosomes and the universe is the union of all chunks."""
+        chromsizes_regions = pd.DataFrame(
+            {"chrom": ["chr6"], "start": [0], "end": [171115067]}
+        )
+        queries = interval_operations.chunk_intervals_variable_size(
+            regions, binsize, self.app.config["VARIABLE_SIZE_EXPANSION_FACTOR"]
+        )
+        universe = pd.concat(queries).drop_duplicates().reset_index(drop=True)
+        result = np.empty((len(targets), len(queries)))
+        for query_index, query in enumerate(queries):
+            filtered_query = (
+                bf.count_overlaps(query, chromsizes_regions)
+                .query("count > 0")
+                .drop("count", axis="columns")
+            )
+            in_query = bf.count_overlaps(universe, filtered_query)["count"].values > 0
+            for target_index, target in enumerate(targets):
+                in_target = bf.count_overlaps(universe, target)["count"].values > 0
+                table = [
+                    [np.sum(in_query & in_target), np.sum(~in_query & in_target)],
+                    [np.sum(in_query & ~in_target), np.sum(~in_query & ~in_target)],
+                ]
+                result[target_index, query_index] = fisher_exact(table)[0]
+        return result
+
 
 if __name__ == "__main__":
     res = unittest.main(verbosity=3, exit=False)
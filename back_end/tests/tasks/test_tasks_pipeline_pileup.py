@@ -7,7 +7,7 @@ import pandas as pd
 from pandas.testing import assert_frame_equal
 import numpy as np
 from tests.test_utils.test_helpers import LoginTestCase, TempDirTestCase
-from app.lib.utils import get_optimal_binsize
+from app.lib.utils import get_optimal_binsize, get_pipeline_calls, get_stackup_calls
 
 # add path to import app
 # import sys
@@ -19,6 +19,8 @@ from app.pipeline_steps import pileup_pipeline_step
 from app.pipeline_worker_functions import (
     _do_pileup_fixed_size,
     _do_pileup_variable_size,
+    _iterate_pileup_fixed_size,
+    _iterate_pileup_fixed_size_nested,
 )
 
 
@@ -92,16 +94,29 @@ class TestPipelinePileup(LoginTestCase, TempDirTestCase):
         pipeline_pileup(dataset_id, intervals_id, binsize)
         # construct call arguments, pd.dataframe breaks magicmocks interval methods
         call_args = self.get_call_args_without_index(mock_pileup_pipeline_step, 3)
-        # compare expected call arguments with actual call arguments
-        for pileup_type in pileup_types:
-            # check whether the current combination is in call args list
-            expected_call_args = [dataset_id, intervals_id, binsize, pileup_type]
-            self.assertTrue(expected_call_args in call_args)
-        # check whether number of calls was as expected
-        self.assertEqual(len(call_args), len(pileup_types))
+        # check whether both pileup types are calculated in a single call
+        expected_call_args = [dataset_id, intervals_id, binsize, pileup_types]
+        self.assertEqual(call_args, [expected_call_args])
         # check whether last call to set task progress was 100
         mock_set_progress.assert_called_with(100)
 
+    @patch("app.pipeline_steps.set_task_progress")
+    @patch("app.pipeline_steps.pileup_pipeline_step")
+    def test_pipeline_pileup_passes_nested_intervals(
+        self, mock_pileup_pipeline_step, mock_set_progress
+    ):
+        """Tests whether nested intervals are passed to the pileup step together
+        with the intervals of the largest windowsize."""
+        # add datasets
+        db.session.add_all(
+            [self.coolerfile, self.bedfile, self.intervals1, self.intervals2]
+        )
+        db.session.commit()
+        # launch task
+        pipeline_pileup(2, 2, 10000, nested_intervals_ids=[1])
+        call_args = self.get_call_args_without_index(mock_pileup_pipeline_step, 3)
+        self.assertEqual(call_args, [[2, [2, 1], 10000, ["ICCF", "Obs/Exp"]]])
+
     @patch("app.pipeline_steps.pd.read_csv")
     @patch("app.pipeline_steps.set_task_progress")
     @patch("app.pipeline_steps.pileup_pipeline_step")
@@ -219,15 +234,15 @@ class TestPileupPipelineStep(LoginTestCase, TempDirTestCase):
         db.session.add(self.intervals5)
         db.session.commit()
 
-    @patch("app.pipeline_steps.worker_funcs._do_pileup_fixed_size")
-    @patch("app.pipeline_steps.worker_funcs._do_pileup_variable_size")
+    @patch("app.pipeline_steps.worker_funcs._iterate_pileup_fixed_size")
+    @patch("app.pipeline_steps.worker_funcs._iterate_pileup_variable_size")
     def test_correct_pileup_worker_function_used_point_feature(
         self, mock_pileup_variable_size, mock_pileup_fixed_size
     ):
         """Tests whether correct worker function for pileup is used
         when intervals has fixed windowsizes"""
         # add return values
-        mock_pileup_fixed_size.return_value = np.full((2, 2, 2), np.nan)
+        mock_pileup_fixed_size.return_value = [{"ICCF": np.full((2, 2, 2), np.nan)}]
         # dispatch call
         dataset_id = 1
         intervals_id = 1
@@ -237,15 +252,15 @@ class TestPileupPipelineStep(LoginTestCase, TempDirTestCase):
         mock_pileup_fixed_size.assert_called_once()
         mock_pileup_variable_size.assert_not_called()
 
-    @patch("app.pipeline_steps.worker_funcs._do_pileup_fixed_size")
-    @patch("app.pipeline_steps.worker_funcs._do_pileup_variable_size")
+    @patch("app.pipeline_steps.worker_funcs._iterate_pileup_fixed_size")
+    @patch("app.pipeline_steps.worker_funcs._iterate_pileup_variable_size")
     def test_correct_pileup_worker_function_used_point_feature_2d(
         self, mock_pileup_variable_size, mock_pileup_fixed_size
     ):
         """Tests whether correct worker function for pileup is used
         when intervals has fixed windowsizes and the underlying regions dataset is 2d"""
         # add return values
-        mock_pileup_fixed_size.return_value = np.full((2, 2, 2), np.nan)
+        mock_pileup_fixed_size.return_value = [{"ICCF": np.full((2, 2, 2), np.nan)}]
         # dispatch call
         dataset_id = 3
         intervals_id = 4
@@ -258,15 +273,15 @@ class TestPileupPipelineStep(LoginTestCase, TempDirTestCase):
         mock_pileup_variable_size.assert_not_called()
 
 
-    @patch("app.pipeline_steps.worker_funcs._do_pileup_fixed_size")
-    @patch("app.pipeline_steps.worker_funcs._do_pileup_variable_size")
+    @patch("app.pipeline_steps.worker_funcs._iterate_pileup_fixed_size")
+    @patch("app.pipeline_steps.worker_funcs._iterate_pileup_variable_size")
     def test_correct_pileup_worker_function_used_interval_feature(
         self, mock_pileup_variable_size, mock_pileup_fixed_size
     ):
         """Tests whether correct worker function for pileup is used
         when intervals has variable windowsizes"""
         # add return values
-        mock_pileup_variable_size.return_value = np.full((2, 2, 2), np.nan)
+        mock_pileup_variable_size.return_value = [{"ICCF": np.full((2, 2, 2), np.nan)}]
         # dispatch call
         dataset_id = 1
         intervals_id = 3
@@ -276,15 +291,15 @@ class TestPileupPipelineStep(LoginTestCase, TempDirTestCase):
         mock_pileup_variable_size.assert_called_once()
         mock_pileup_fixed_size.assert_not_called()
 
-    @patch("app.pipeline_steps.worker_funcs._do_pileup_fixed_size")
-    @patch("app.pipeline_steps.worker_funcs._do_pileup_variable_size")
+    @patch("app.pipeline_steps.worker_funcs._iterate_pileup_fixed_size")
+    @patch("app.pipeline_steps.worker_funcs._iterate_pileup_variable_size")
     def test_correct_pileup_worker_function_used_interval_feature_2d(
         self, mock_pileup_variable_size, mock_pileup_fixed_size
     ):
         """Tests whether correct worker function for pileup is used
         when intervals has variable windowsizes and underlying dataset is 2-dimensional"""
         # add return values
-        mock_pileup_variable_size.return_value = np.full((2, 2, 2), np.nan)
+        mock_pileup_variable_size.return_value = [{"ICCF": np.full((2, 2, 2), np.nan)}]
         # dispatch call
         dataset_id = 1
         intervals_id = 5
@@ -300,8 +315,8 @@ class TestPileupPipelineStep(LoginTestCase, TempDirTestCase):
     @patch("app.pipeline_steps.uuid.uuid4")
     @patch("app.pipeline_steps.worker_funcs._add_embedding_2d_to_db")
     @patch("app.pipeline_steps.worker_funcs._add_pileup_db")
-    @patch("app.pipeline_steps.worker_funcs._do_pileup_fixed_size")
-    @patch("app.pipeline_steps.worker_funcs._do_pileup_variable_size")
+    @patch("app.pipeline_steps.worker_funcs._iterate_pileup_fixed_size")
+    @patch("app.pipeline_steps.worker_funcs._iterate_pileup_variable_size")
     def test_adding_to_db_called_correctly(
         self,
         mock_pileup_variable_size,
@@ -312,7 +327,7 @@ class TestPileupPipelineStep(LoginTestCase, TempDirTestCase):
     ):
         """Tests whether function to add result to database is called correctly."""
         # add return values
-        mock_pileup_fixed_size.return_value = np.full((2, 2, 2), np.nan)
+        mock_pileup_fixed_size.return_value = [{"ICCF": np.full((2, 2, 2), np.nan)}]
         # hack in return value of uuid4().hex to be asdf
         uuid4 = MagicMock()
         type(uuid4).hex = PropertyMock(return_value="asdf")
@@ -360,6 +375,103 @@ class TestPileupPipelineStep(LoginTestCase, TempDirTestCase):
             "large",
         )
 
+    @patch("app.pipeline_steps.worker_funcs._add_embedding_2d_to_db")
+    @patch("app.pipeline_steps.worker_funcs._add_pileup_db")
+    @patch("app.pipeline_steps.worker_funcs._iterate_pileup_fixed_size")
+    def test_combined_pileup_types_added_to_db(
+        self, mock_pileup_fixed_size, mock_add_pileup_db, mock_add_embedding_db
+    ):
+        """Tests whether pileup is done once and both pileup types are added to the
+        database if pileup_type is a list."""
+        # add return values
+        mock_pileup_fixed_size.return_value = [
+            {
+                "ICCF": np.full((2, 2, 2), np.nan),
+                "Obs/Exp": np.full((2, 2, 2), np.nan),
+            }
+        ]
+        arms = pd.read_csv(self.app.config["CHROM_ARMS"])
+        pileup_pipeline_step(1, 1, 10000, arms, ["ICCF", "Obs/Exp"])
+        # check whether pileup was done once
+        mock_pileup_fixed_size.assert_called_once()
+        # check whether both types were added to database
+        added_types = [call[0][4] for call in mock_add_pileup_db.call_args_list]
+        self.assertEqual(added_types, ["ICCF", "Obs/Exp"])
+        self.assertEqual(mock_add_embedding_db.call_count, 4)
+
+    @patch("app.pipeline_steps.worker_funcs._add_embedding_2d_to_db")
+    @patch("app.pipeline_steps.worker_funcs._add_pileup_db")
+    @patch("app.pipeline_steps.worker_funcs._iterate_pileup_fixed_size_nested")
+    @patch("app.pipeline_steps.worker_funcs._iterate_pileup_fixed_size")
+    def test_nested_intervals_cropped_from_single_pileup(
+        self,
+        mock_pileup_fixed_size,
+        mock_pileup_nested,
+        mock_add_pileup_db,
+        mock_add_embedding_db,
+    ):
+        """Tests whether pileup is done once for a list of intervals and results are
+        added to the database for each of them."""
+        # add return values
+        mock_pileup_nested.return_value = [
+            {
+                300000: {"ICCF": np.full((60, 60, 2), np.nan)},
+                200000: {"ICCF": np.full((40, 40, 2), np.nan)},
+            }
+        ]
+        arms = pd.read_csv(self.app.config["CHROM_ARMS"])
+        pileup_pipeline_step(
+            1, [self.intervals2.id, self.intervals1.id], 10000, arms, ["ICCF"]
+        )
+        # check whether pileup was done once with all windowsizes
+        mock_pileup_fixed_size.assert_not_called()
+        mock_pileup_nested.assert_called_once()
+        self.assertEqual(mock_pileup_nested.call_args[0][1], [300000, 200000])
+        # check whether results were added for both intervals
+        added = [(call[0][2], call[0][4]) for call in mock_add_pileup_db.call_args_list]
+        self.assertEqual(
+            added, [(self.intervals2.id, "ICCF"), (self.intervals1.id, "ICCF")]
+        )
+        self.assertEqual(mock_add_embedding_db.call_count, 4)
+
+    @patch("app.pipeline_worker_functions._load_regions_fixed_size")
+    @patch("app.pipeline_worker_functions._assign_pileup_windows")
+    @patch("app.pipeline_worker_functions._pileup_regions_fixed_size")
+    def test_nested_windows_cropped_and_unassigned_regions_fetched(
+        self, mock_pileup_regions, mock_assign, mock_load_regions
+    ):
+        """Tests whether smaller windows are cropped from the center of the largest
+        window and regions that can only be assigned at the smaller windowsize are
+        fetched separately."""
+        mock_load_regions.return_value = pd.DataFrame(
+            {"chrom": ["chr1", "chr1"], "pos": [1000000, 2000000]}
+        )
+        largest = np.arange(6 * 6 * 2, dtype=float).reshape(6, 6, 2)
+        largest[..., 1] = np.nan
+        fetched = np.full((2, 2, 1), 5.0)
+        mock_pileup_regions.side_effect = [{"ICCF": largest}, {"ICCF": fetched}]
+        # second region cannot be assigned at the largest windowsize
+        mock_assign.side_effect = [
+            pd.DataFrame({"region": ["chr1:0-100", None]}),
+            pd.DataFrame({"region": ["chr1:0-100", "chr1:0-100"]}),
+        ]
+        chunks = list(
+            _iterate_pileup_fixed_size_nested(
+                "cooler", [30000, 10000], 10000, "path", "arms", ["ICCF"]
+            )
+        )
+        self.assertEqual(len(chunks), 1)
+        self.assertTrue(np.array_equal(chunks[0][30000]["ICCF"], largest, equal_nan=True))
+        self.assertEqual(chunks[0][10000]["ICCF"].shape, (2, 2, 2))
+        self.assertTrue(
+            np.array_equal(chunks[0][10000]["ICCF"][..., 0], largest[2:4, 2:4, 0])
+        )
+        self.assertTrue(np.all(chunks[0][10000]["ICCF"][..., 1] == 5.0))
+        # check whether only the missing region was fetched
+        self.assertEqual(mock_pileup_regions.call_count, 2)
+        self.assertEqual(mock_pileup_regions.call_args[0][1], 10000)
+        self.assertEqual(list(mock_pileup_regions.call_args[0][3].pos), [2000000])
+
 
 class TestPileupWorkerFunctionsFixedSize(LoginTestCase, TempDirTestCase):
     """Test pileup worker functions for fixed sized intervals."""
@@ -458,6 +570,183 @@ class TestPileupWorkerFunctionsFixedSize(LoginTestCase, TempDirTestCase):
         # check whether iccf pileup is not called
         mock_pileup_obs_exp.assert_not_called()
 
+    @patch("app.pipeline_worker_functions.HT.do_pileup_iccf")
+    @patch("app.pipeline_worker_functions.HT.do_pileup_obs_exp")
+    @patch("app.pipeline_worker_functions.HT.get_expected")
+    @patch("app.pipeline_worker_functions.HT.assign_regions")
+    @patch("app.pipeline_worker_functions.cooler.Cooler")
+    @patch("app.pipeline_worker_functions.pd.read_csv")
+    def test_combined_pileup_fetches_windows_once(
+        self,
+        mock_read_csv,
+        mock_cooler,
+        mock_assign_regions,
+        mock_get_expected,
+        mock_pileup_obs_exp,
+        mock_pileup_iccf,
+    ):
+        """Tests whether windows are fetched only once if iccf and obs/exp pileup
+        are requested together and obs/exp is derived from the balanced windows"""
+        test_df_interval = pd.DataFrame(
+            {0: ["chr1", "chr1"], 1: [0, 1000], 2: [1000, 2000]}
+        )
+        mock_read_csv.return_value = test_df_interval
+        mock_cooler.return_value = "mock_cooler"
+        mock_assign_regions.return_value = pd.DataFrame(
+            {
+                "chrom": ["chr1", "chr1"],
+                "start": [0, 0],
+                "end": [20000, 20000],
+                "region": ["chr1:0-125200000", None],
+            }
+        )
+        mock_get_expected.return_value = pd.DataFrame(
+            {
+                "region": ["chr1:0-125200000"] * 2,
+                "diag": [0, 1],
+                "balanced.avg": [2.0, 0.5],
+            }
+        )
+        mock_pileup_iccf.return_value = np.ones((2, 2, 1))
+        # dispatch call
+        arms = pd.read_csv(self.app.config["CHROM_ARMS"])
+        result = _do_pileup_fixed_size(
+            self.cooler,
+            10000,
+            10000,
+            "testpath",
+            arms,
+            ["ICCF", "Obs/Exp"],
+            collapse=False,
+        )
+        # check whether windows were fetched once
+        mock_pileup_iccf.assert_called_once()
+        mock_pileup_obs_exp.assert_not_called()
+        # check results
+        self.assertTrue(np.allclose(result["ICCF"][..., 0], np.ones((2, 2))))
+        self.assertTrue(
+            np.allclose(result["Obs/Exp"][..., 0], np.array([[0.5, 2.0], [2.0, 0.5]]))
+        )
+        self.assertTrue(np.all(np.isnan(result["ICCF"][..., 1])))
+        self.assertTrue(np.all(np.isnan(result["Obs/Exp"][..., 1])))
+
+    def test_combined_pileup_matches_separate_pileups(self):
+        """Tests whether combined iccf and obs/exp pileup returns the same
+        result as separate pileups"""
+        arms = pd.read_csv(self.app.config["CHROM_ARMS"])
+        test_df_interval = pd.DataFrame(
+            {
+                0: ["chr1", "chrASDF", "chr1", "chrASDF"],
+                1: [60000000, 10, 50000000, 100],
+                2: [60000000, 10, 50000000, 150],
+            }
+        )
+        mock_path = os.path.join(self.app.config["UPLOAD_DIR"], "mock_regions.csv")
+        test_df_interval.to_csv(mock_path, index=False, header=None, sep="\t")
+        # dispatch calls
+        combined = _do_pileup_fixed_size(
+            self.cooler,
+            10000000,
+            5000000,
+            mock_path,
+            arms,
+            ["ICCF", "Obs/Exp"],
+            collapse=False,
+        )
+        for pileup_type in ["ICCF", "Obs/Exp"]:
+            separate = _do_pileup_fixed_size(
+                self.cooler,
+                10000000,
+                5000000,
+                mock_path,
+                arms,
+                pileup_type,
+                collapse=False,
+            )
+            self.assertTrue(
+                np.allclose(combined[pileup_type], separate, equal_nan=True)
+            )
+
+    def test_chunked_pileup_matches_full_pileup(self):
+        """Tests whether concatenated chunks of the pileup iterator give the
+        same result as the pileup of all regions"""
+        self.app.config["PILEUP_CHUNK_PIXELS"] = 16
+        arms = pd.read_csv(self.app.config["CHROM_ARMS"])
+        test_df_interval = pd.DataFrame(
+            {
+                0: ["chr1", "chrASDF", "chr1", "chrASDF"],
+                1: [60000000, 10, 50000000, 100],
+                2: [60000000, 10, 50000000, 150],
+            }
+        )
+        mock_path = os.path.join(self.app.config["UPLOAD_DIR"], "mock_regions.csv")
+        test_df_interval.to_csv(mock_path, index=False, header=None, sep="\t")
+        # dispatch calls
+        chunks = list(
+            _iterate_pileup_fixed_size(
+                self.cooler, 10000000, 5000000, mock_path, arms, ["ICCF", "Obs/Exp"]
+            )
+        )
+        full = _do_pileup_fixed_size(
+            self.cooler,
+            10000000,
+            5000000,
+            mock_path,
+            arms,
+            ["ICCF", "Obs/Exp"],
+            collapse=False,
+        )
+        self.assertEqual(len(chunks), 4)
+        for pileup_type in ["ICCF", "Obs/Exp"]:
+            concatenated = np.concatenate(
+                [chunk[pileup_type] for chunk in chunks], axis=2
+            )
+            self.assertTrue(
+                np.allclose(concatenated, full[pileup_type], equal_nan=True)
+            )
+
+    def test_nested_pileup_matches_pileup_of_smaller_window(self):
+        """Tests whether windows cropped from the pileup of the largest windowsize
+        give the same result as the pileup at the smaller windowsize"""
+        arms = pd.read_csv(self.app.config["CHROM_ARMS"])
+        test_df_interval = pd.DataFrame(
+            {
+                0: ["chr1", "chrASDF", "chr1", "chrASDF"],
+                1: [60000000, 10, 50000000, 100],
+                2: [60000000, 10, 50000000, 150],
+            }
+        )
+        mock_path = os.path.join(self.app.config["UPLOAD_DIR"], "mock_regions.csv")
+        test_df_interval.to_csv(mock_path, index=False, header=None, sep="\t")
+        # dispatch calls
+        chunks = list(
+            _iterate_pileup_fixed_size_nested(
+                self.cooler,
+                [10000000, 5000000],
+                5000000,
+                mock_path,
+                arms,
+                ["ICCF", "Obs/Exp"],
+            )
+        )
+        for window_size in [10000000, 5000000]:
+            full = _do_pileup_fixed_size(
+                self.cooler,
+                window_size,
+                5000000,
+                mock_path,
+                arms,
+                ["ICCF", "Obs/Exp"],
+                collapse=False,
+            )
+            for pileup_type in ["ICCF", "Obs/Exp"]:
+                concatenated = np.concatenate(
+                    [chunk[window_size][pileup_type] for chunk in chunks], axis=2
+                )
+                self.assertTrue(
+                    np.allclose(concatenated, full[pileup_type], equal_nan=True)
+                )
+
     def test_regions_with_bad_chromosomes_filled_with_nan(self):
         """Checks whether regions with bad chromosomes are filled with nans"""
         arms = pd.read_csv(self.app.config["CHROM_ARMS"])
@@ -590,7 +879,8 @@ class TestPileupWorkerFunctionsFixedSize(LoginTestCase, TempDirTestCase):
         self.assertEqual(dataset.binsize, 5000000)
         # load datset
         expected = pd.read_csv(os.path.join("./tests/testfiles", "expected.csv"))
-        calculated = pd.read_csv(dataset.filepath)
+        self.assertTrue(dataset.filepath.endswith(".parquet"))
+        calculated = pd.read_parquet(dataset.filepath)
         assert_frame_equal(expected, calculated)
 
 
@@ -842,7 +1132,8 @@ class TestPileupWorkerFunctionsVariableSize(LoginTestCase, TempDirTestCase):
         self.assertEqual(dataset.binsize, 5000000)
         # load dataset
         expected = pd.read_csv(os.path.join("./tests/testfiles", "expected.csv"))
-        calculated = pd.read_csv(dataset.filepath)
+        self.assertTrue(dataset.filepath.endswith(".parquet"))
+        calculated = pd.read_parquet(dataset.filepath)
         assert_frame_equal(expected, calculated)
 
 
@@ -935,5 +1226,79 @@ class TestGetOptimalBinsize(LoginTestCase):
         )
 
 
+class TestGetPipelineCalls(unittest.TestCase):
+    """Tests get_pipeline_calls helper function"""
+
+    def setUp(self):
+        self.preprocessing_map = {
+            10000: {"cooler": [1000], "bigwig": [100]},
+            50000: {"cooler": [1000, 5000], "bigwig": [500]},
+            100000: {"cooler": [1000, 3000], "bigwig": [1000]},
+            "variable": {"cooler": [1, 2], "bigwig": [1]},
+        }
+        self.intervals = [
+            (1, 4, 10000),
+            (2, 4, 50000),
+            (3, 4, 100000),
+            (4, 4, None),
+            (5, 5, 10000),
+        ]
+
+    def test_one_call_per_interval_and_binsize(self):
+        """Tests whether every interval is processed separately without nesting"""
+        calls = get_pipeline_calls(self.intervals, self.preprocessing_map, "bigwig")
+        self.assertEqual(
+            calls, [(1, 100, []), (2, 500, []), (3, 1000, []), (4, 1, []), (5, 100, [])]
+        )
+
+    def test_nested_windows_grouped_per_region_dataset_and_binsize(self):
+        """Tests whether smaller windowsizes are nested into the largest one. Windowsizes
+        that are not divisible by binsize and variable intervals are not nested."""
+        calls = get_pipeline_calls(
+            self.intervals, self.preprocessing_map, "cooler", nest_windows=True
+        )
+        self.assertEqual(
+            sorted(calls),
+            sorted(
+                [
+                    (3, 1000, [2, 1]),
+                    (2, 5000, []),
+                    (3, 3000, []),
+                    (4, 1, []),
+                    (4, 2, []),
+                    (5, 1000, []),
+                ]
+            ),
+        )
+
+
+class TestGetStackupCalls(unittest.TestCase):
+    """Tests get_stackup_calls helper function"""
+
+    def test_stackups_grouped_by_finest_binsize(self):
+        """Tests whether coarser binsizes and smaller windowsizes are derived from
+        the stackup at the finest binsize of the largest windowsize"""
+        preprocessing_map = {
+            1000: {"bigwig": [100, 500]},
+            2000: {"bigwig": [100, 200, 300]},
+            50000: {"bigwig": [500, 1000, 3000]},
+            "variable": {"bigwig": [1, 2, 5]},
+        }
+        intervals = [(1, 4, 1000), (2, 4, 2000), (3, 4, 50000), (4, 4, None)]
+        calls = get_stackup_calls(intervals, preprocessing_map)
+        self.assertEqual(
+            sorted(calls),
+            sorted(
+                [
+                    (2, 100, [(1, 100), (1, 500), (2, 200)]),
+                    (2, 300, []),
+                    (3, 3000, []),
+                    (3, 500, [(3, 1000)]),
+                    (4, 1, [(4, 2), (4, 5)]),
+                ]
+            ),
+        )
+
+
 if __name__ == "__main__":
     res = unittest.main(verbosity=3, exit=False)
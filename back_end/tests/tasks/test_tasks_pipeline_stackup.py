@@ -1,22 +1,31 @@
 """Module with the tests for the stackup creation realted tasks."""
+import os
+import gzip
+import json
 import unittest
-from unittest.mock import patch
+from unittest.mock import patch, MagicMock
 import pandas as pd
 import numpy as np
+import bbi
+import pyBigWig
 from tests.test_utils.test_helpers import LoginTestCase, TempDirTestCase
 from app.lib import interval_operations
 
 # add path to import app
 # import sys
 # sys.path.append("./")
-from app import db
-from app.models import Dataset, Intervals, Assembly, Task
+from app import db, response_payloads
+from app.models import Dataset, Intervals, Assembly, Task, IndividualIntervalData
 from app.tasks import pipeline_stackup
-from app.pipeline_steps import stackup_pipeline_step
+from app.pipeline_steps import stackup_pipeline_step, collection_stackup_pipeline_step
 
 from app.pipeline_worker_functions import (
     _do_stackup_fixed_size,
     _do_stackup_variable_size,
+    _average_stackup,
+    _can_derive_stackup,
+    _derive_stackup,
+    _dispose_database_connections,
 )
 
 
@@ -86,10 +95,28 @@ class TestPipelineStackup(LoginTestCase):
         # call pipeline
         pipeline_stackup(2, 3, 10000)
         # check whether processing has finished
-        self.assertEqual(2, mock_stackup.call_count)
-        self.assertEqual(mock_stackup.call_args_list[0][1]['region_side'], 'left')
-        self.assertEqual(mock_stackup.call_args_list[1][1]['region_side'], 'right')
+        self.assertEqual(1, mock_stackup.call_count)
+        self.assertEqual(mock_stackup.call_args[1]['region_side'], ['left', 'right'])
+
 
+    @patch("app.pipeline_steps.set_task_progress")
+    @patch("app.pipeline_steps.stackup_pipeline_step")
+    def test_derived_stackups_passed_to_stackup_step(
+        self, mock_stackup, mock_set_progress
+    ):
+        """tests whether stackups to derive are passed to the stackup step
+        that processes both region sides."""
+        db.session.add_all([self.bedfile2d, self.bigwigfile, self.intervals3])
+        # call pipeline
+        pipeline_stackup(2, 3, 10000, derived_stackups=[(3, 20000), (4, 10000)])
+        # check whether both sides were called with the stackups to derive
+        mock_stackup.assert_called_once_with(
+            2,
+            3,
+            10000,
+            region_side=["left", "right"],
+            derived_stackups=[(3, 20000), (4, 10000)],
+        )
 
     @patch("app.pipeline_steps.set_task_progress")
     @patch("app.pipeline_steps.stackup_pipeline_step")
@@ -192,12 +219,14 @@ class TestStackupPipelineStep(LoginTestCase, TempDirTestCase):
             }
         )
         mock_read_csv.return_value = test_df_interval
+        mock_fixed_size.return_value = np.full((2, 40), np.nan)
+        mock_variable_size.return_value = np.full((2, 40), np.nan)
         with patch("app.pipeline_steps.np.load") as mock_load:
             mock_load.return_value = np.array([0, 1])
             stackup_pipeline_step(self.dataset.id, self.intervals1.id, 10000)
         # check whether correct functions were called
         mock_variable_size.assert_not_called()
-        mock_fixed_size.assert_called()
+        mock_fixed_size.assert_called_once()
 
     @patch("app.pipeline_steps.worker_funcs._do_stackup_fixed_size")
     @patch("app.pipeline_steps.worker_funcs._do_stackup_variable_size")
@@ -215,14 +244,399 @@ class TestStackupPipelineStep(LoginTestCase, TempDirTestCase):
             }
         )
         mock_read_csv.return_value = test_df_interval
+        mock_fixed_size.return_value = np.full((2, 40), np.nan)
+        mock_variable_size.return_value = np.full((2, 40), np.nan)
         with patch("app.pipeline_steps.np.load") as mock_load:
             mock_load.return_value = np.array([0, 1])
             stackup_pipeline_step(self.dataset.id, self.intervals2.id, 10000)
         # check whether correct functions were called
-        mock_variable_size.assert_called()
+        mock_variable_size.assert_called_once()
         mock_fixed_size.assert_not_called()
 
 
+    @patch("app.pipeline_steps.worker_funcs._add_line_db")
+    @patch("app.pipeline_steps.worker_funcs._add_stackup_db")
+    def test_full_stackup_written_to_memory_mapped_file(
+        self, mock_add_stackup_db, mock_add_line_db
+    ):
+        """tests whether the full stackup is written to a .npy file that
+        can be memory-mapped and the line average is derived from it."""
+        self.app.config["STACKUP_CHUNK_SIZE"] = 1
+        regions = pd.DataFrame(
+            {
+                0: ["chr1", "chrT", "chr1"],
+                1: [100000, 50000, 500000],
+                2: [200000, 50000, 600000],
+            }
+        )
+        bed_path = os.path.join(self.TEMP_PATH, "regions.bed")
+        regions.to_csv(bed_path, sep="\t", header=False, index=False)
+        index_path = os.path.join(self.TEMP_PATH, "regions_indices.npy")
+        np.save(index_path, np.array([0, 1]))
+        self.dataset.file_path = bed_path
+        self.intervals1.windowsize = 50000
+        self.intervals1.file_path_sub_sample_index = index_path
+        db.session.commit()
+        stackup_pipeline_step(self.dataset2.id, self.intervals1.id, 50000)
+        # check stored files
+        file_path, file_path_small = mock_add_stackup_db.call_args[0][:2]
+        full = np.load(file_path, mmap_mode="r")
+        expected = np.array([[5.0, 0.0], [np.nan, np.nan], [6.0, 0.0]])
+        np.testing.assert_array_almost_equal(full, expected)
+        np.testing.assert_array_almost_equal(np.load(file_path_small), expected[:2])
+        line = np.load(mock_add_line_db.call_args[0][0])
+        np.testing.assert_array_almost_equal(line, np.array([5.5, 0.0]))
+        # precompressed payload of the downsampled stackup
+        payload = json.loads(
+            gzip.decompress(response_payloads.read_payload(file_path_small))
+        )
+        self.assertEqual(payload["shape"], [2, 2])
+        np.testing.assert_array_almost_equal(
+            np.array(payload["data"], dtype=float), expected[:2].flatten()
+        )
+        # summary for 1d-embeddings is the center column
+        summary = np.load(file_path.replace(".npy", "_summary.npy"))
+        np.testing.assert_array_almost_equal(summary, expected[:, 1])
+
+    @patch("app.pipeline_steps.worker_funcs._add_line_db")
+    @patch("app.pipeline_steps.worker_funcs._add_stackup_db")
+    @patch("app.pipeline_steps.worker_funcs._do_stackup_fixed_size")
+    @patch("app.pipeline_steps.pd.read_csv")
+    def test_downsampled_stackup_indexed_from_full_stackup(
+        self, mock_read_csv, mock_fixed_size, mock_add_stackup_db, mock_add_line_db
+    ):
+        """tests whether the downsampled stackup consists of the rows of the full
+        stackup at the sub sample index in the order of the index."""
+        mock_read_csv.return_value = pd.DataFrame(
+            {0: ["chr1"] * 3, 1: [100000, 500000, 900000], 2: [200000, 600000, 1000000]}
+        )
+        full_stackup = np.arange(120, dtype=float).reshape(3, 40)
+        mock_fixed_size.return_value = full_stackup
+        with patch("app.pipeline_steps.np.load") as mock_load:
+            mock_load.return_value = np.array([2, 0])
+            stackup_pipeline_step(self.dataset.id, self.intervals1.id, 10000)
+        mock_fixed_size.assert_called_once()
+        file_path_small = mock_add_stackup_db.call_args[0][1]
+        np.testing.assert_array_almost_equal(
+            np.load(file_path_small), full_stackup[[2, 0]]
+        )
+
+
+    @patch("app.pipeline_steps.worker_funcs._add_line_db")
+    @patch("app.pipeline_steps.worker_funcs._add_stackup_db")
+    @patch("app.pipeline_steps.worker_funcs._do_stackup_fixed_size")
+    @patch("app.pipeline_steps.pd.read_csv")
+    def test_derived_stackups_cropped_and_binned_from_single_stackup(
+        self, mock_read_csv, mock_fixed_size, mock_add_stackup_db, mock_add_line_db
+    ):
+        """tests whether stackup is done once and the stackups of smaller windowsizes
+        and coarser binsizes are derived from it in a single transaction."""
+        intervals3 = Intervals(name="testRegion3", dataset_id=1, windowsize=100000)
+        db.session.add(intervals3)
+        db.session.commit()
+        mock_read_csv.return_value = pd.DataFrame(
+            {0: ["chr1", "chr1"], 1: [100000, 500000], 2: [200000, 600000]}
+        )
+        full_stackup = np.arange(80, dtype=float).reshape(2, 40)
+        mock_fixed_size.return_value = full_stackup
+        with patch("app.pipeline_steps.np.load") as mock_load, patch(
+            "app.pipeline_steps.db.session.commit"
+        ) as mock_commit:
+            mock_load.return_value = np.array([1])
+            stackup_pipeline_step(
+                self.dataset2.id,
+                self.intervals1.id,
+                10000,
+                derived_stackups=[(intervals3.id, 10000), (self.intervals1.id, 20000)],
+            )
+        # check whether stackup was done once at the largest windowsize
+        mock_fixed_size.assert_called_once()
+        self.assertEqual(mock_fixed_size.call_args[0][2], 200000)
+        mock_commit.assert_called_once()
+        # check whether results were added for all combinations
+        added = [call[0][2:4] for call in mock_add_stackup_db.call_args_list]
+        self.assertEqual(
+            added,
+            [
+                (10000, self.intervals1.id),
+                (10000, intervals3.id),
+                (20000, self.intervals1.id),
+            ],
+        )
+        cropped_path, cropped_path_small = mock_add_stackup_db.call_args_list[1][0][:2]
+        np.testing.assert_array_almost_equal(
+            np.load(cropped_path), full_stackup[:, 10:30]
+        )
+        np.testing.assert_array_almost_equal(
+            np.load(cropped_path_small), full_stackup[[1], 10:30]
+        )
+        binned_path = mock_add_stackup_db.call_args_list[2][0][0]
+        np.testing.assert_array_almost_equal(
+            np.load(binned_path), full_stackup.reshape(2, 20, 2).mean(axis=2)
+        )
+        self.assertEqual(mock_add_line_db.call_count, 3)
+
+    @patch("app.pipeline_steps.worker_funcs._add_line_db")
+    @patch("app.pipeline_steps.worker_funcs._add_stackup_db")
+    @patch("app.pipeline_steps.worker_funcs._do_stackup_fixed_size")
+    @patch("app.pipeline_steps.pd.read_csv")
+    def test_stackups_that_cannot_be_derived_done_separately(
+        self, mock_read_csv, mock_fixed_size, mock_add_stackup_db, mock_add_line_db
+    ):
+        """tests whether stackups that cannot be derived are done separately."""
+        mock_read_csv.return_value = pd.DataFrame(
+            {0: ["chr1", "chr1"], 1: [100000, 500000], 2: [200000, 600000]}
+        )
+        mock_fixed_size.side_effect = [
+            np.full((2, 40), np.nan),
+            np.full((2, 26), np.nan),
+        ]
+        with patch("app.pipeline_steps.np.load") as mock_load:
+            mock_load.return_value = np.array([1])
+            stackup_pipeline_step(
+                self.dataset2.id,
+                self.intervals1.id,
+                10000,
+                derived_stackups=[(self.intervals1.id, 15000)],
+            )
+        self.assertEqual(
+            [call[0][3] for call in mock_fixed_size.call_args_list], [10000, 15000]
+        )
+        self.assertEqual(mock_add_stackup_db.call_count, 2)
+
+    @patch("app.pipeline_steps.worker_funcs._add_line_db")
+    @patch("app.pipeline_steps.worker_funcs._add_stackup_db")
+    @patch("app.pipeline_steps.worker_funcs._do_stackup_fixed_size")
+    @patch("app.pipeline_steps.pd.read_csv")
+    def test_both_region_sides_done_in_single_stackup(
+        self, mock_read_csv, mock_fixed_size, mock_add_stackup_db, mock_add_line_db
+    ):
+        """tests whether both anchors of 2d regions are processed by a single call to
+        the worker function and results are added for each side."""
+        mock_read_csv.return_value = pd.DataFrame(
+            {
+                0: ["chr1", "chr1"],
+                1: [100000, 500000],
+                2: [200000, 600000],
+                3: ["chr1", "chr1"],
+                4: [700000, 900000],
+                5: [800000, 1000000],
+            }
+        )
+        mock_fixed_size.return_value = [np.full((2, 40), 1.0), np.full((2, 40), 2.0)]
+        with patch("app.pipeline_steps.np.load") as mock_load:
+            mock_load.return_value = np.array([1])
+            stackup_pipeline_step(
+                self.dataset2.id,
+                self.intervals1.id,
+                10000,
+                region_side=["left", "right"],
+                derived_stackups=[(self.intervals1.id, 20000)],
+            )
+        mock_fixed_size.assert_called_once()
+        self.assertEqual(mock_fixed_size.call_args[0][4], ["left", "right"])
+        self.assertEqual(len(mock_fixed_size.call_args[1]["output_path"]), 2)
+        # full and derived stackups are added for both sides
+        self.assertEqual(
+            [call[0][5] for call in mock_add_stackup_db.call_args_list],
+            ["left", "left", "right", "right"],
+        )
+        self.assertEqual(mock_add_line_db.call_count, 4)
+        # derived stackups are binned from the stackup of their side
+        derived_right = np.load(mock_add_stackup_db.call_args_list[3][0][0])
+        np.testing.assert_array_almost_equal(derived_right, np.full((2, 20), 2.0))
+
+
+class TestCollectionStackupPipelineStep(LoginTestCase, TempDirTestCase):
+    """Tests for the stackup pipeline step of multiple bigwig datasets"""
+
+    def setUp(self):
+        """Add test datasets"""
+        super().setUp()
+        regions = pd.DataFrame(
+            {
+                0: ["chr1", "chrT", "chr1"],
+                1: [100000, 50000, 500000],
+                2: [200000, 50000, 600000],
+                3: ["chr1", "chr1", "chr1"],
+                4: [500000, 100000, 300000],
+                5: [600000, 200000, 400000],
+            }
+        )
+        bed_path = os.path.join(self.TEMP_PATH, "regions.bedpe")
+        regions.to_csv(bed_path, sep="\t", header=False, index=False)
+        index_path = os.path.join(self.TEMP_PATH, "regions_indices.npy")
+        np.save(index_path, np.array([2, 0]))
+        self.bedfile = self.create_dataset(
+            id=1,
+            dataset_name="test",
+            file_path=bed_path,
+            filetype="bedfile",
+            user_id=1,
+        )
+        self.bigwigs = [
+            self.create_dataset(
+                id=dataset_id,
+                dataset_name=f"test{dataset_id}",
+                file_path="./tests/testfiles/test.bw",
+                filetype="bigwig",
+                user_id=1,
+            )
+            for dataset_id in [2, 3, 4]
+        ]
+        self.intervals = Intervals(
+            id=1,
+            dataset_id=1,
+            windowsize=50000,
+            file_path_sub_sample_index=index_path,
+        )
+        db.session.add_all([self.bedfile, *self.bigwigs, self.intervals])
+        db.session.commit()
+
+    @patch(
+        "app.pipeline_steps.worker_funcs._dispose_database_connections",
+        wraps=_dispose_database_connections,
+    )
+    @patch("app.pipeline_steps.set_task_progress")
+    def test_stackups_equal_to_single_stackups(self, mock_set_progress, mock_dispose):
+        """tests whether stackups of all datasets are added and equal to the
+        stackup of a single dataset."""
+        self.app.config["STACKUP_PROCESSES"] = 2
+        collection_stackup_pipeline_step([2, 3, 4], 1, 50000, max_progress=90)
+        # database connections are not shared with the forked processes
+        mock_dispose.assert_called_once()
+        expected = np.array([[5.0, 0.0], [np.nan, np.nan], [6.0, 0.0]])
+        stackups = IndividualIntervalData.query.all()
+        self.assertEqual(sorted(stackup.dataset_id for stackup in stackups), [2, 3, 4])
+        for stackup in stackups:
+            self.assertEqual(stackup.binsize, 50000)
+            self.assertIsNone(stackup.region_side)
+            np.testing.assert_array_almost_equal(np.load(stackup.file_path), expected)
+            np.testing.assert_array_almost_equal(
+                np.load(stackup.file_path_small), expected[[2, 0]]
+            )
+        # progress is reported per finished dataset
+        self.assertEqual(
+            [call[0][0] for call in mock_set_progress.call_args_list], [30, 60, 90]
+        )
+
+    @patch("app.pipeline_steps.set_task_progress")
+    def test_both_region_sides_added(self, mock_set_progress):
+        """tests whether stackups of both anchors of 2d regions are added
+        for all datasets."""
+        collection_stackup_pipeline_step(
+            [2, 3], 1, 50000, region_side=["left", "right"]
+        )
+        regions = pd.read_csv(self.bedfile.file_path, sep="\t", header=None)
+        for side in ["left", "right"]:
+            stackups = IndividualIntervalData.query.filter_by(region_side=side).all()
+            self.assertEqual(sorted(stackup.dataset_id for stackup in stackups), [2, 3])
+            expected = _do_stackup_fixed_size(
+                "./tests/testfiles/test.bw", regions, 50000, 50000, region_side=side
+            )
+            for stackup in stackups:
+                np.testing.assert_array_almost_equal(
+                    np.load(stackup.file_path), expected
+                )
+
+
+class TestDisposeDatabaseConnections(LoginTestCase):
+    """Tests discarding database connections before forking processes"""
+
+    @patch("app.pipeline_worker_functions.db")
+    def test_pooled_connections_disposed(self, mock_db):
+        """Tests whether connections of a connection pool are disposed"""
+        mock_db.engine.pool = MagicMock()
+        _dispose_database_connections()
+        mock_db.engine.dispose.assert_called_once()
+
+    @patch.object(db.engine, "dispose")
+    def test_static_pool_kept(self, mock_dispose):
+        """Tests whether the single connection of the in-memory test database
+        is kept"""
+        _dispose_database_connections()
+        mock_dispose.assert_not_called()
+
+
+class TestDeriveStackup(LoginTestCase, TempDirTestCase):
+    """Tests deriving stackups of smaller windowsizes and coarser binsizes"""
+
+    def test_window_cropped_and_bins_averaged(self):
+        """Tests whether the centered window is cropped and neighbouring bins
+        are averaged ignoring nans"""
+        stackup = np.array(
+            [
+                [0.0, 1.0, 2.0, 3.0, 4.0, 5.0, 6.0, 7.0],
+                [0.0, 1.0, np.nan, 3.0, np.nan, np.nan, 6.0, 7.0],
+            ]
+        )
+        result = _derive_stackup(stackup, 4000, 1000, 2000, 2000)
+        expected = np.array([[2.5, 4.5], [3.0, np.nan]])
+        np.testing.assert_array_almost_equal(result, expected)
+
+    def test_derived_stackup_approximates_stackup_at_target_binsize(self):
+        """Tests whether the derived stackup is equal to the stackup at the target
+        binsize except for blocks with partially covered bins, which are weighted
+        equally instead of by their coverage"""
+        bigwig_path = os.path.join(self.TEMP_PATH, "partially_covered.bw")
+        bigwig = pyBigWig.open(bigwig_path, "w")
+        bigwig.addHeader([("chr1", 10000)])
+        bigwig.addEntries(
+            ["chr1", "chr1", "chr1", "chr1"],
+            [1000, 3000, 4000, 7000],
+            ends=[3000, 3500, 5000, 8000],
+            values=[1.0, 2.0, 4.0, 3.0],
+        )
+        bigwig.close()
+        regions = pd.DataFrame({0: ["chr1"], 1: [4000], 2: [6000]})
+        stackup = _do_stackup_fixed_size(bigwig_path, regions, 4000, 1000)
+        expected = _do_stackup_fixed_size(bigwig_path, regions, 4000, 2000)
+        result = _derive_stackup(stackup, 4000, 1000, 4000, 2000)
+        # fully covered, uncovered and partially covered blocks of fully covered bins
+        np.testing.assert_array_almost_equal(
+            result[:, [0, 2, 3]], expected[:, [0, 2, 3]]
+        )
+        np.testing.assert_array_almost_equal(expected[0], [1.0, 10 / 3, np.nan, 3.0])
+        # block with a half covered bin
+        self.assertAlmostEqual(result[0, 1], 3.0)
+
+    def test_output_path_gives_same_result_as_in_memory(self):
+        """Tests whether writing the derived stackup to a memory-mapped file in
+        chunks gives the same result as the in-memory stackup"""
+        self.app.config["STACKUP_CHUNK_SIZE"] = 2
+        stackup = np.random.normal(size=(5, 40))
+        stackup[stackup > 1] = np.nan
+        output_path = os.path.join(self.TEMP_PATH, "derived.npy")
+        expected = _derive_stackup(stackup, 200000, 10000, 100000, 20000)
+        result = _derive_stackup(
+            stackup, 200000, 10000, 100000, 20000, output_path=output_path
+        )
+        self.assertEqual(expected.shape, (5, 10))
+        np.testing.assert_array_almost_equal(result, expected)
+        np.testing.assert_array_almost_equal(np.load(output_path), expected)
+
+    def test_variable_size_bins_averaged(self):
+        """Tests whether relative binsizes of variable size stackups are
+        derived by averaging neighbouring bins"""
+        stackup = np.random.normal(size=(3, 140))
+        result = _derive_stackup(stackup, None, 1, None, 5)
+        self.assertEqual(result.shape, (3, 28))
+        np.testing.assert_array_almost_equal(
+            result, stackup.reshape(3, 28, 5).mean(axis=2)
+        )
+
+    def test_derivable_stackups(self):
+        """Tests which window and binsize combinations can be derived"""
+        self.assertTrue(_can_derive_stackup(None, 1, None, 5))
+        self.assertFalse(_can_derive_stackup(None, 2, None, 5))
+        self.assertFalse(_can_derive_stackup(200000, 10000, None, 5))
+        self.assertTrue(_can_derive_stackup(200000, 10000, 100000, 20000))
+        self.assertTrue(_can_derive_stackup(200000, 10000, 200000, 10000))
+        self.assertFalse(_can_derive_stackup(100000, 10000, 200000, 10000))
+        self.assertFalse(_can_derive_stackup(200000, 10000, 100000, 15000))
+        self.assertFalse(_can_derive_stackup(200000, 10000, 50000, 20000))
+
+
 class TestStackupWorkerFunctionFixedSize(LoginTestCase, TempDirTestCase):
     """Tests worker function for stackup with fixed size"""
 
@@ -344,6 +758,77 @@ class TestStackupWorkerFunctionFixedSize(LoginTestCase, TempDirTestCase):
         np.testing.assert_array_almost_equal(result, expected_dataset)
 
 
+    def test_output_path_gives_same_result_as_in_memory(self):
+        """Tests whether writing the stackup to a memory-mapped file in chunks
+        gives the same result as the in-memory stackup"""
+        self.app.config["STACKUP_CHUNK_SIZE"] = 3
+        regions = pd.DataFrame(
+            {
+                "chrom": ["chr1", "chrT", "chr1", "chrU", "chr1"],
+                "start": [100000, 50000, 500000, 1234, 300000],
+                "end": [200000, 50000, 600000, 5678, 400000],
+            }
+        )
+        output_path = os.path.join(self.TEMP_PATH, "stackup.npy")
+        expected = _do_stackup_fixed_size(
+            self.dataset2.file_path, regions, 50000, 50000
+        )
+        result = _do_stackup_fixed_size(
+            self.dataset2.file_path, regions, 50000, 50000, output_path=output_path
+        )
+        self.assertIsInstance(result, np.memmap)
+        np.testing.assert_array_almost_equal(result, expected)
+        np.testing.assert_array_almost_equal(np.load(output_path), expected)
+
+    def test_both_region_sides_stacked_in_single_pass(self):
+        """Tests whether stacking up both anchors of 2d regions at once gives the
+        same result as stacking up each anchor separately"""
+        self.app.config["STACKUP_CHUNK_SIZE"] = 10
+        regions = pd.DataFrame(
+            {
+                0: ["chr1", "chrT", "chr1"],
+                1: [100000, 50000, 500000],
+                2: [200000, 50000, 600000],
+                3: ["chr1", "chr1", "chrU"],
+                4: [500000, 300000, 1234],
+                5: [600000, 400000, 5678],
+            }
+        )
+        output_paths = [
+            os.path.join(self.TEMP_PATH, f"stackup_{side}.npy")
+            for side in ["left", "right"]
+        ]
+        stackup = bbi.stackup
+        with patch("app.pipeline_worker_functions.bbi.stackup") as mock_stackup:
+            mock_stackup.side_effect = stackup
+            result = _do_stackup_fixed_size(
+                self.dataset2.file_path,
+                regions,
+                50000,
+                50000,
+                region_side=["left", "right"],
+                output_path=output_paths,
+            )
+            self.assertEqual(mock_stackup.call_count, 1)
+        for side, side_result, output_path in zip(
+            ["left", "right"], result, output_paths
+        ):
+            expected = _do_stackup_fixed_size(
+                self.dataset2.file_path, regions, 50000, 50000, region_side=side
+            )
+            np.testing.assert_array_almost_equal(side_result, expected)
+            np.testing.assert_array_almost_equal(np.load(output_path), expected)
+
+    def test_average_stackup_equal_to_nanmean(self):
+        """Tests whether chunked average of stackup is equal to nanmean"""
+        self.app.config["STACKUP_CHUNK_SIZE"] = 2
+        stackup = np.array(
+            [[1.0, np.nan], [3.0, np.nan], [np.nan, np.nan], [2.0, 4.0], [0.0, 1.0]]
+        )
+        result = _average_stackup(stackup)
+        np.testing.assert_array_almost_equal(result, np.array([1.5, 2.5]))
+
+
 class TestStackupWorkerFunctionVariableSize(LoginTestCase, TempDirTestCase):
     """Tests worker function for stackup with variable size"""
 